@@ -57,7 +57,7 @@ class RegisterForm(forms.ModelForm):
         email = (self.cleaned_data.get("email") or "").strip()
         if not email:
             raise ValidationError("Email is required.")
-        if User.objects.filter(email__iexact=email).exists():
+        if User.objects.with_email(email).exists():
             raise ValidationError("An account with this email already exists.")
         return email
 
@@ -207,7 +207,7 @@ class ProfileUpdateForm(forms.ModelForm):
 
     def clean_email(self):
         email = self.cleaned_data.get("email")
-        if email and User.objects.filter(email__iexact=email).exclude(pk=self.instance.pk).exists():
+        if email and User.objects.with_email(email).exclude(pk=self.instance.pk).exists():
             raise ValidationError("This email is already in use.")
         return email
 
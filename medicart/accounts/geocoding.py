@@ -0,0 +1,408 @@
+# accounts/geocoding.py
+import csv
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodingError(Exception):
+    """The geocoder could not answer right now; the job should be retried."""
+
+
+_PUNCTUATION_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize_address(address):
+    """
+    Fold case, compatibility forms, punctuation and whitespace, and glue
+    runs of initials back together ("M.G. Road" -> "mg road").
+    """
+    text = unicodedata.normalize("NFKC", address or "").casefold()
+    tokens = []
+    in_initials = False
+    for token in _PUNCTUATION_RE.sub(" ", text).split():
+        is_initial = len(token) == 1 and token.isalpha()
+        if is_initial and in_initials:
+            tokens[-1] += token
+        else:
+            tokens.append(token)
+        in_initials = is_initial
+    return " ".join(tokens)
+
+
+def address_key(address):
+    return hashlib.sha256(normalize_address(address).encode()).hexdigest()
+
+
+# -------------------- backends --------------------
+class NominatimGeocoder:
+    """Public OpenStreetMap Nominatim service (network access required)."""
+
+    def __init__(self, user_agent="medicart_app", timeout=10):
+        from geopy.geocoders import Nominatim  # type: ignore
+        self._client = Nominatim(user_agent=user_agent)
+        self.timeout = timeout
+
+    def geocode(self, address):
+        """Return (latitude, longitude), or None when the address is unknown."""
+        from geopy.exc import GeocoderServiceError, GeocoderTimedOut  # type: ignore
+        try:
+            location = self._client.geocode(address, timeout=self.timeout)
+        except (GeocoderTimedOut, GeocoderServiceError) as exc:
+            raise GeocodingError(str(exc)) from exc
+        if location is None:
+            return None
+        return location.latitude, location.longitude
+
+
+GAZETTEER_KINDS = {"street": 3, "postcode": 2, "locality": 1}
+
+
+class Gazetteer:
+    """
+    Place names from a local CSV, indexed for in-process lookups.
+
+    CSV columns: ``name,kind,latitude,longitude[,parent]`` where kind is
+    street, postcode or locality and parent is the enclosing locality
+    (used to tell apart streets that share a name). Coordinates live in
+    flat ``array('d')`` columns; the only dict maps normalized names to
+    row numbers.
+    """
+
+    MAX_NGRAM = 5
+
+    def __init__(self, rows=()):
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.kinds = array("b")
+        self.parents = []
+        self.index = {}
+        for row in rows:
+            self.add(*row)
+
+    def add(self, name, kind, latitude, longitude, parent=""):
+        key = normalize_address(name)
+        if not key:
+            return
+        self.index.setdefault(key, []).append(len(self.kinds))
+        self.latitudes.append(float(latitude))
+        self.longitudes.append(float(longitude))
+        self.kinds.append(GAZETTEER_KINDS.get((kind or "").strip().lower(), 1))
+        self.parents.append(sys.intern(normalize_address(parent)))
+
+    @classmethod
+    def from_csv(cls, path):
+        gazetteer = cls()
+        with open(path, newline="", encoding="utf-8") as handle:
+            for record in csv.DictReader(handle):
+                gazetteer.add(
+                    record["name"], record.get("kind"), record["latitude"], record["longitude"],
+                    record.get("parent") or "",
+                )
+        return gazetteer
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def lookup(self, address):
+        """
+        Best match for ``address``: the most specific kind wins, then the
+        longest matching phrase, then a matching parent locality.
+        """
+        normalized = normalize_address(address)
+        tokens = normalized.split()
+        padded = f" {normalized} "
+        best, best_score = None, None
+        for size in range(min(self.MAX_NGRAM, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                for row in self.index.get(" ".join(tokens[start:start + size]), ()):
+                    parent = self.parents[row]
+                    score = (self.kinds[row], size, bool(parent) and f" {parent} " in padded)
+                    if best_score is None or score > best_score:
+                        best, best_score = row, score
+        if best is None:
+            return None
+        return self.latitudes[best], self.longitudes[best]
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path):
+    """Parse a gazetteer file once per process."""
+    if not path or not os.path.exists(path):
+        logger.warning("Gazetteer file %s not found; offline geocoding disabled.", path)
+        return Gazetteer()
+    return Gazetteer.from_csv(path)
+
+
+class GazetteerGeocoder:
+    """Offline backend: resolves addresses from ``GEOCODER_GAZETTEER_PATH``."""
+
+    local = True  # answers in-process, cheap enough to call inline
+
+    def __init__(self, path=None):
+        path = path or getattr(settings, "GEOCODER_GAZETTEER_PATH", None)
+        self.gazetteer = load_gazetteer(str(path) if path else None)
+
+    def geocode(self, address):
+        return self.gazetteer.lookup(address)
+
+
+class ChainGeocoder:
+    """Ask each backend in turn until one knows the address."""
+
+    def __init__(self, backends):
+        self.backends = backends
+        self.local = all(getattr(backend, "local", False) for backend in backends)
+
+    def geocode(self, address):
+        error = None
+        for backend in self.backends:
+            try:
+                coords = backend.geocode(address)
+            except GeocodingError as exc:
+                error = exc
+                continue
+            if coords is not None:
+                return coords
+        if error is not None:
+            raise error
+        return None
+
+
+def get_geocoder():
+    """
+    Instantiate ``settings.GEOCODER_BACKEND``, chained with
+    ``settings.GEOCODER_FALLBACK`` when one is configured.
+    """
+    primary = import_string(getattr(settings, "GEOCODER_BACKEND", "accounts.geocoding.NominatimGeocoder"))()
+    fallback = getattr(settings, "GEOCODER_FALLBACK", None)
+    if not fallback:
+        return primary
+    return ChainGeocoder([primary, import_string(fallback)()])
+
+
+def get_local_geocoder():
+    """The primary backend if it answers in-process, else None."""
+    backend = import_string(getattr(settings, "GEOCODER_BACKEND", "accounts.geocoding.NominatimGeocoder"))
+    return backend() if getattr(backend, "local", False) else None
+
+
+# -------------------- cache --------------------
+MISS = object()
+
+
+class GeocodeCache:
+    """
+    Address -> coordinates cache: an in-process LRU in front of the
+    GeocodeCacheEntry table. "Not found" answers are cached too, but only
+    for ``GEOCODE_NEGATIVE_TTL`` seconds.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (coords or None, expires_at or None)
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "negative_hits": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, coords, expires_at):
+        maxsize = self.maxsize or getattr(settings, "GEOCODE_CACHE_SIZE", 10000)
+        with self._lock:
+            self._memory[key] = (coords, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > maxsize:
+                self._memory.popitem(last=False)
+
+    def get(self, address):
+        """Cached coords, None for a cached "not found", or ``MISS``."""
+        from .models import GeocodeCacheEntry
+
+        key = address_key(address)
+        now = timezone.now()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] is None or entry[1] > now:
+                    self._memory.move_to_end(key)
+                else:
+                    del self._memory[key]
+                    entry = None
+        if entry is not None:
+            self._count("memory_hits" if entry[0] is not None else "negative_hits")
+            return entry[0]
+
+        row = (
+            GeocodeCacheEntry.objects.filter(key=key)
+            .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+            .values_list("latitude", "longitude", "expires_at")
+            .first()
+        )
+        if row is None:
+            self._count("misses")
+            return MISS
+        latitude, longitude, expires_at = row
+        coords = (latitude, longitude) if latitude is not None else None
+        self._remember(key, coords, expires_at)
+        self._count("db_hits" if coords is not None else "negative_hits")
+        return coords
+
+    def set(self, address, coords):
+        from .models import GeocodeCacheEntry
+
+        key = address_key(address)
+        expires_at = None
+        if coords is None:
+            expires_at = timezone.now() + timedelta(seconds=getattr(settings, "GEOCODE_NEGATIVE_TTL", 86400))
+        latitude, longitude = coords if coords is not None else (None, None)
+        GeocodeCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                "address": normalize_address(address),
+                "latitude": latitude,
+                "longitude": longitude,
+                "expires_at": expires_at,
+            },
+        )
+        self._remember(key, coords, expires_at)
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+
+geocode_cache = GeocodeCache()
+
+
+# -------------------- job queue --------------------
+def enqueue_geocode(obj, address):
+    """
+    Queue a job that fills ``obj.latitude`` / ``obj.longitude`` from ``address``.
+
+    The job row is written in the caller's transaction, so it only becomes
+    visible to the worker if the caller commits. A pending job for the same
+    object is reused, and an address that is already being looked up or has
+    already failed is not queued again. Addresses found in the geocode
+    cache or in an offline gazetteer are applied straight away and need no
+    job; only misses wait for the worker (and any network fallback).
+    """
+    from .models import GeocodeJob
+
+    if not address:
+        return None
+    coords = geocode_cache.get(address)
+    if coords is None:
+        return None  # cached "not found"
+    if coords is MISS:
+        # An offline gazetteer answers in microseconds: no need for a job.
+        local = get_local_geocoder()
+        if local is not None:
+            coords = local.geocode(address) or MISS
+    if coords is not MISS:
+        obj.latitude, obj.longitude = coords
+        type(obj).objects.filter(pk=obj.pk).update(latitude=coords[0], longitude=coords[1])
+        return None
+    content_type = ContentType.objects.get_for_model(obj)
+    job = GeocodeJob.objects.filter(content_type=content_type, object_id=obj.pk).order_by("-id").first()
+    if job is not None:
+        if job.status == GeocodeJob.PENDING:
+            if job.address != address:
+                job.address = address
+                job.save(update_fields=["address"])
+            return job
+        if job.address == address and job.status != GeocodeJob.DONE:
+            return job
+    return GeocodeJob.objects.create(content_type=content_type, object_id=obj.pk, address=address)
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2*base, 4*base, ... capped at one day."""
+    base = getattr(settings, "GEOCODE_RETRY_BASE_SECONDS", 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 86400))
+
+
+def claim_jobs(limit):
+    """
+    Lease up to ``limit`` due jobs to this worker and return them.
+
+    A claimed job is marked running with ``run_after`` pushed out by
+    ``GEOCODE_LEASE_SECONDS``; if the worker dies, the lease expires and the
+    job becomes due again.
+    """
+    from .models import GeocodeJob
+
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=getattr(settings, "GEOCODE_LEASE_SECONDS", 300))
+    due = Q(status__in=[GeocodeJob.PENDING, GeocodeJob.RUNNING], run_after__lte=now)
+    candidates = list(
+        GeocodeJob.objects.filter(due).order_by("run_after", "id").values_list("id", flat=True)[:limit]
+    )
+    # Only the worker whose UPDATE still sees the job as due owns it.
+    claimed = [
+        job_id for job_id in candidates
+        if GeocodeJob.objects.filter(due, id=job_id).update(status=GeocodeJob.RUNNING, run_after=lease_until)
+    ]
+    return list(GeocodeJob.objects.filter(id__in=claimed).select_related("content_type"))
+
+
+def run_job(job, geocoder):
+    """Geocode one claimed job and write the coordinates onto its target."""
+    from .models import GeocodeJob
+
+    job.attempts += 1
+    try:
+        coords = geocode_cache.get(job.address)
+        if coords is MISS:
+            coords = geocoder.geocode(job.address)
+            geocode_cache.set(job.address, coords)
+    except GeocodingError as exc:
+        job.last_error = str(exc)[:255]
+        max_attempts = getattr(settings, "GEOCODE_MAX_ATTEMPTS", 5)
+        if job.attempts >= max_attempts:
+            job.status = GeocodeJob.FAILED
+        else:
+            job.status = GeocodeJob.PENDING
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+        job.save(update_fields=["attempts", "last_error", "status", "run_after"])
+        return False
+
+    if coords is None:
+        job.status = GeocodeJob.NOT_FOUND
+    else:
+        job.status = GeocodeJob.DONE
+        latitude, longitude = coords
+        # update() rather than save(): must not re-enqueue or fire save logic.
+        job.content_type.model_class().objects.filter(pk=job.object_id).update(
+            latitude=latitude, longitude=longitude
+        )
+    job.last_error = ""
+    job.save(update_fields=["attempts", "last_error", "status"])
+    return coords is not None
+
+
+def process_jobs(limit=50, geocoder=None):
+    """Run one batch of due jobs; returns how many were processed."""
+    jobs = claim_jobs(limit)
+    if jobs:
+        geocoder = geocoder or get_geocoder()
+        for job in jobs:
+            run_job(job, geocoder)
+    return len(jobs)
@@ -0,0 +1,107 @@
+# accounts/mail.py
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(subject, message, recipient_list, from_email=None):
+    """
+    Drop-in for ``send_mail`` that only writes an outbox row.
+
+    Call it inside the transaction that produced the email: the message is
+    sent (by ``send_outbox``) only if that transaction commits.
+    """
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to="\n".join(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2*base, 4*base, ... capped at one hour."""
+    base = getattr(settings, "EMAIL_OUTBOX_RETRY_BASE_SECONDS", 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def claim_emails(limit):
+    """Lease up to ``limit`` due emails to this worker (same scheme as the geocoding queue)."""
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=getattr(settings, "EMAIL_OUTBOX_LEASE_SECONDS", 300))
+    due = Q(status__in=[OutboxEmail.PENDING, OutboxEmail.SENDING], run_after__lte=now)
+    candidates = list(
+        OutboxEmail.objects.filter(due).order_by("run_after", "id").values_list("id", flat=True)[:limit]
+    )
+    claimed = [
+        email_id for email_id in candidates
+        if OutboxEmail.objects.filter(due, id=email_id).update(status=OutboxEmail.SENDING, run_after=lease_until)
+    ]
+    return list(OutboxEmail.objects.filter(id__in=claimed).order_by("id"))
+
+
+def send_email(email, connection):
+    """Send one claimed email over ``connection`` and record the outcome."""
+    email.attempts += 1
+    try:
+        EmailMessage(
+            email.subject, email.body, email.from_email, email.recipients(), connection=connection
+        ).send()
+    except Exception as exc:  # SMTP and socket errors alike
+        logger.warning("Outbox email %s failed (attempt %s): %s", email.pk, email.attempts, exc)
+        # Drop the connection: the next send reconnects instead of reusing a broken one
+        connection.close()
+        email.last_error = str(exc)[:255]
+        if email.attempts >= getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 5):
+            email.status = OutboxEmail.FAILED
+        else:
+            email.status = OutboxEmail.PENDING
+            email.run_after = timezone.now() + retry_delay(email.attempts)
+        email.save(update_fields=["attempts", "status", "last_error", "run_after"])
+        return False
+
+    email.status = OutboxEmail.SENT
+    email.sent_at = timezone.now()
+    email.body = ""
+    email.last_error = ""
+    email.save(update_fields=["attempts", "status", "sent_at", "body", "last_error"])
+    return True
+
+
+def drain_outbox(limit=50, connection=None):
+    """
+    Send one batch of due emails over a single SMTP connection.
+
+    Returns ``(sent, failed)`` counts.
+    """
+    emails = claim_emails(limit)
+    if not emails:
+        return 0, 0
+    connection = connection or get_connection()
+    sent = failed = 0
+    try:
+        for email in emails:
+            # No-op while the connection is up; reconnects after a failed send
+            # (a connection opened by send() itself would be closed after it)
+            connection.open()
+            if send_email(email, connection):
+                sent += 1
+            else:
+                failed += 1
+    except Exception as exc:  # could not connect at all: put the batch back
+        logger.warning("Outbox connection failed: %s", exc)
+        OutboxEmail.objects.filter(
+            id__in=[email.id for email in emails], status=OutboxEmail.SENDING
+        ).update(status=OutboxEmail.PENDING, run_after=timezone.now() + retry_delay(1), last_error=str(exc)[:255])
+        failed = len(emails) - sent
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.geocoding import geocode_cache, get_geocoder, process_jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued geocoding jobs (user and order addresses)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=50, help="Jobs claimed per batch.")
+        parser.add_argument("--sleep", type=float, default=5, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Process one batch and exit.")
+
+    def handle(self, *args, **options):
+        geocoder = get_geocoder()
+        while True:
+            processed = process_jobs(limit=options["batch"], geocoder=geocoder)
+            if processed:
+                stats = ", ".join(f"{name}={count}" for name, count in geocode_cache.stats.items())
+                self.stdout.write(f"Processed {processed} geocoding job(s). Cache: {stats}")
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["sleep"])
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.mail import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued transactional email from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=50, help="Emails sent per SMTP connection.")
+        parser.add_argument("--sleep", type=float, default=5, help="Seconds to wait when the outbox is empty.")
+        parser.add_argument("--once", action="store_true", help="Send one batch and exit.")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_outbox(limit=options["batch"])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} email(s), {failed} failed.")
+            if options["once"]:
+                break
+            if not (sent or failed):
+                time.sleep(options["sleep"])
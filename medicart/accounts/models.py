@@ -1,7 +1,14 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+
+class UserManager(BaseUserManager):
+    def with_email(self, email):
+        """Case-insensitive email match, served by the lower(email) index."""
+        return self.annotate(email_lower=Lower("email")).filter(email_lower=(email or "").lower())
 
 
 class User(AbstractUser):
@@ -16,6 +23,12 @@ class User(AbstractUser):
     approved = models.BooleanField(default=False)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    location_updated_at = models.DateTimeField(null=True, blank=True)  # last live GPS fix (riders)
+
+    objects = UserManager()
+
+    class Meta(AbstractUser.Meta):
+        indexes = [models.Index(Lower("email"), name="accounts_user_email_lower_idx")]
 
     def save(self, *args, **kwargs):
         # Ensure staff/superuser are admin and approved
@@ -28,20 +41,16 @@ class User(AbstractUser):
             elif self.role == "pharmacist":
                 self.approved = False
 
-        # Auto-geocode only if address provided and coords are missing
-        if self.address and (self.latitude is None or self.longitude is None):
-            try:
-                geolocator = Nominatim(user_agent="medicart_app")
-                location = geolocator.geocode(self.address, timeout=10)
-                if location:
-                    self.latitude = location.latitude
-                    self.longitude = location.longitude
-            except (GeocoderTimedOut, GeocoderServiceError):
-                # keep existing behavior: don't block save on geocode failure
-                print("⚠️ Geocoding service error — could not fetch coordinates")
-
         super().save(*args, **kwargs)
 
+        # Auto-geocode only if address provided and coords are missing.
+        # Done by the geocode worker so a slow geocoder never blocks the save.
+        update_fields = kwargs.get("update_fields")
+        address_saved = update_fields is None or "address" in update_fields
+        if address_saved and self.address and (self.latitude is None or self.longitude is None):
+            from .geocoding import enqueue_geocode
+            enqueue_geocode(self, self.address)
+
     def is_patient(self):
         return self.role == "patient"
 
@@ -50,3 +59,88 @@ class User(AbstractUser):
 
     def is_delivery(self):
         return self.role == "delivery"
+
+
+
+class GeocodeJob(models.Model):
+    """Queued address lookup for any model with latitude/longitude fields."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    NOT_FOUND = "not_found"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (NOT_FOUND, "Not found"),
+        (FAILED, "Failed"),
+    )
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+    address = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        return f"Geocode {self.content_type.model} #{self.object_id} ({self.status})"
+
+
+class GeocodeCacheEntry(models.Model):
+    """Persistent geocoding answer for one normalized address."""
+
+    key = models.CharField(max_length=64, unique=True)  # sha256 of the normalized address
+    address = models.TextField()
+    latitude = models.FloatField(null=True, blank=True)   # null = address not found
+    longitude = models.FloatField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)  # only set for "not found"
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.address
+
+
+class OutboxEmail(models.Model):
+    """
+    Transactional email written in the caller's transaction and sent later
+    by ``manage.py send_outbox``.
+    """
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()  # cleared once sent: bodies may carry codes or passwords
+    from_email = models.CharField(max_length=254)
+    to = models.TextField(help_text="Recipients, one per line")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def recipients(self):
+        return [address for address in self.to.splitlines() if address]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to.replace(chr(10), ', ')} ({self.status})"
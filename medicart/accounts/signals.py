@@ -0,0 +1,45 @@
+# accounts/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from deliveries.models import Delivery
+from orders.models import Order
+from prescriptions.models import Prescription
+from shop.models import Stock
+
+from .stats import invalidate_stats, stats_key
+
+# Dashboard stats are dropped once the write commits, so a concurrent
+# dashboard load cannot re-cache the old numbers.
+
+
+def invalidate_on_commit(*keys):
+    transaction.on_commit(lambda: invalidate_stats(*keys))
+
+
+@receiver([post_save, post_delete], sender=Order)
+def order_changed(sender, instance, **kwargs):
+    invalidate_on_commit(
+        stats_key("patient", instance.patient_id),
+        stats_key("pharmacy", instance.pharmacy_id),
+        stats_key("global", "admin"),
+    )
+
+
+@receiver([post_save, post_delete], sender=Stock)
+def stock_changed(sender, instance, **kwargs):
+    invalidate_on_commit(stats_key("pharmacy", instance.pharmacy_id))
+
+
+@receiver([post_save, post_delete], sender=Prescription)
+def prescription_changed(sender, instance, **kwargs):
+    invalidate_on_commit(
+        stats_key("patient", instance.patient_id),
+        stats_key("global", "prescriptions"),
+    )
+
+
+@receiver([post_save, post_delete], sender=Delivery)
+def delivery_changed(sender, instance, **kwargs):
+    invalidate_on_commit(stats_key("delivery", instance.assigned_to_id))
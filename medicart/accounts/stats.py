@@ -0,0 +1,154 @@
+# accounts/stats.py
+"""
+Dashboard numbers, one conditional-aggregate query per table.
+
+Each function returns a plain dict that the dashboard views merge into the
+template context. Results are kept in Django's cache for DASHBOARD_STATS_TTL
+seconds per scope (one patient, pharmacy or rider, or global) and dropped
+early by the model signals in ``accounts.signals``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from deliveries.models import Delivery
+from orders.models import DailySales, Order
+from orders.sales import sales_totals
+from prescriptions.models import Prescription
+from shop.models import Category, Stock
+from shop.utils import local_day_start
+
+LOW_STOCK_QUANTITY = 10
+STATS_CACHE_PREFIX = "dashboard-stats"
+
+
+def stats_key(scope, ident):
+    return f"{STATS_CACHE_PREFIX}:{scope}:{ident}"
+
+
+def _bump(counter, delta=1):
+    key = stats_key("counter", counter)
+    try:
+        cache.incr(key, delta)
+    except ValueError:  # first use, or evicted
+        cache.set(key, delta, None)
+
+
+def cached_stats(scope, ident, compute):
+    """Return ``compute()`` from the cache, computing and storing it on a miss."""
+    key = stats_key(scope, ident)
+    stats = cache.get(key)
+    if stats is None:
+        _bump("misses")
+        stats = compute()
+        cache.set(key, stats, getattr(settings, "DASHBOARD_STATS_TTL", 60))
+    else:
+        _bump("hits")
+    return stats
+
+
+def invalidate_stats(*keys):
+    cache.delete_many(keys)
+    _bump("invalidations", len(keys))
+
+
+def cache_counters():
+    """Hit/miss/invalidation counts since the cache was last cleared."""
+    counters = cache.get_many([stats_key("counter", name) for name in ("hits", "misses", "invalidations")])
+    hits, misses, invalidations = (
+        counters.get(stats_key("counter", name), 0) for name in ("hits", "misses", "invalidations")
+    )
+    return {
+        "hits": hits,
+        "misses": misses,
+        "invalidations": invalidations,
+        "hit_rate": round(hits / (hits + misses) * 100, 1) if hits + misses else 0,
+    }
+
+
+def month_days(day=None):
+    """Half-open [first of month, first of next month) as local dates."""
+    day = day or timezone.localdate()
+    first = day.replace(day=1)
+    return first, (first + timedelta(days=32)).replace(day=1)
+
+
+def today_range():
+    """Half-open [today 00:00, tomorrow 00:00) in the current time zone."""
+    today = timezone.localdate()
+    return local_day_start(today), local_day_start(today, days=1)
+
+
+def patient_stats(user):
+    return cached_stats("patient", user.pk, lambda: {
+        "active_orders": Order.objects.filter(
+            patient=user, status__in=["pending", "processing"]
+        ).count(),
+        "recent_prescriptions": Prescription.objects.filter(patient=user).count(),
+    })
+
+
+def admin_stats():
+    return cached_stats("global", "admin", _admin_stats)
+
+
+def _admin_stats():
+    User = get_user_model()
+    stats = User.objects.aggregate(
+        total_users=Count("id", filter=Q(is_superuser=False)),
+        total_pharmacies=Count("id", filter=Q(role="pharmacist")),
+    )
+    stats["total_orders"] = Order.objects.count()
+    stats["total_categories"] = Category.objects.count()
+    month_start, month_end = month_days()
+    year_start = month_start.replace(month=1)
+    sales = DailySales.objects.filter(day__gte=year_start, day__lt=year_start.replace(year=year_start.year + 1)).aggregate(
+        monthly_sales=Sum("revenue", filter=Q(day__gte=month_start, day__lt=month_end)),
+        yearly_sales=Sum("revenue"),
+    )
+    stats.update({name: value or 0 for name, value in sales.items()})
+    return stats
+
+
+def pharmacist_stats(user):
+    return {
+        **cached_stats("pharmacy", user.pk, lambda: _pharmacy_stats(user)),
+        **cached_stats("global", "prescriptions", lambda: {
+            "pending_prescriptions": Prescription.objects.filter(verified=False).count(),
+        }),
+    }
+
+
+def _pharmacy_stats(user):
+    stats = {
+        "pending_orders": Order.objects.filter(pharmacy=user, status="pending").count(),
+        "monthly_sales": sales_totals(*month_days(), pharmacy=user)["revenue"],
+    }
+    stats["low_stock_items"] = Stock.objects.filter(
+        pharmacy=user, quantity__lt=LOW_STOCK_QUANTITY
+    ).count()
+    return stats
+
+
+def delivery_stats(user):
+    return cached_stats("delivery", user.pk, lambda: _delivery_stats(user))
+
+
+def _delivery_stats(user):
+    today_start, today_end = today_range()
+    delivered = Q(status="delivered")
+    stats = Delivery.objects.filter(assigned_to=user).aggregate(
+        pending_deliveries=Count("id", filter=Q(status="pending")),
+        completed_today=Count(
+            "id", filter=delivered & Q(delivered_at__gte=today_start, delivered_at__lt=today_end)
+        ),
+        total_completed=Count("id", filter=delivered),
+        on_time_deliveries=Count("id", filter=delivered & Q(delivered_at__lte=F("expected_delivery_time"))),
+    )
+    total = stats["total_completed"]
+    stats["on_time_rate"] = round(stats["on_time_deliveries"] / total * 100, 2) if total else 0
+    return stats
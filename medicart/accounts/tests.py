@@ -1,3 +1,359 @@
-from django.test import TestCase
+import os
+import socketserver
+import tempfile
+import threading
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
 # Create your tests here.
+from django.utils import timezone
+
+from shop.tests import QueryPlanMixin
+from .mail import drain_outbox, queue_email
+from .geocoding import (
+    MISS, ChainGeocoder, Gazetteer, GazetteerGeocoder, GeocodingError, geocode_cache, load_gazetteer,
+    normalize_address, process_jobs,
+)
+from .models import GeocodeCacheEntry, GeocodeJob, OutboxEmail, User
+from .stats import cache_counters
+
+
+class FakeGeocoder:
+    """Offline stand-in: answers from a dict, or fails on demand."""
+
+    places = {"MG Road, Kochi": (9.97, 76.28)}
+    fail = False
+
+    def geocode(self, address):
+        if self.fail:
+            raise GeocodingError("service unavailable")
+        return self.places.get(address)
+
+
+@override_settings(
+    GEOCODER_BACKEND="accounts.tests.FakeGeocoder", GEOCODER_FALLBACK=None, GEOCODE_RETRY_BASE_SECONDS=60
+)
+class GeocodeJobTests(TestCase):
+    def setUp(self):
+        geocode_cache.clear_memory()
+
+    def test_user_save_queues_job_instead_of_geocoding(self):
+        user = User.objects.create_user(username="pat", role="patient", address="MG Road, Kochi")
+        self.assertIsNone(user.latitude)
+        job = GeocodeJob.objects.get()
+        self.assertEqual((job.object_id, job.status), (user.pk, GeocodeJob.PENDING))
+
+        self.assertEqual(process_jobs(), 1)
+
+        user.refresh_from_db()
+        self.assertEqual((user.latitude, user.longitude), (9.97, 76.28))
+        self.assertEqual(GeocodeJob.objects.get().status, GeocodeJob.DONE)
+
+    def test_repeated_saves_reuse_pending_job(self):
+        user = User.objects.create_user(username="pat", role="patient", address="MG Road, Kochi")
+        user.save()
+        user.save(update_fields=["last_login"])
+        self.assertEqual(GeocodeJob.objects.count(), 1)
+
+    def test_unknown_address_is_not_found(self):
+        User.objects.create_user(username="pat", role="patient", address="Nowhere")
+        process_jobs()
+        self.assertEqual(GeocodeJob.objects.get().status, GeocodeJob.NOT_FOUND)
+
+    def test_failure_is_retried_with_backoff(self):
+        User.objects.create_user(username="pat", role="patient", address="MG Road, Kochi")
+        failing = FakeGeocoder()
+        failing.fail = True
+
+        before = timezone.now()
+        process_jobs(geocoder=failing)
+        job = GeocodeJob.objects.get()
+        self.assertEqual((job.status, job.attempts), (GeocodeJob.PENDING, 1))
+        self.assertGreaterEqual(job.run_after, before + timezone.timedelta(seconds=60))
+
+        # Not due yet, so the next batch leaves it alone.
+        self.assertEqual(process_jobs(geocoder=failing), 0)
+
+        GeocodeJob.objects.update(run_after=timezone.now())
+        process_jobs(geocoder=failing)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertGreaterEqual(job.run_after, timezone.now() + timezone.timedelta(seconds=110))
+
+    @override_settings(GEOCODE_MAX_ATTEMPTS=1)
+    def test_gives_up_after_max_attempts(self):
+        User.objects.create_user(username="pat", role="patient", address="MG Road, Kochi")
+        failing = FakeGeocoder()
+        failing.fail = True
+        process_jobs(geocoder=failing)
+        self.assertEqual(GeocodeJob.objects.get().status, GeocodeJob.FAILED)
+
+
+@override_settings(GEOCODER_BACKEND="accounts.tests.FakeGeocoder", GEOCODER_FALLBACK=None)
+class GeocodeCacheTests(TestCase):
+    def setUp(self):
+        geocode_cache.clear_memory()
+
+    def test_normalize_address(self):
+        self.assertEqual(normalize_address("  MG  Road,\nKOCHI. "), "mg road kochi")
+
+    def test_cached_address_skips_queue(self):
+        geocode_cache.set("mg road kochi", (9.97, 76.28))
+        user = User.objects.create_user(username="pat", role="patient", address="MG Road,  Kochi")
+        self.assertFalse(GeocodeJob.objects.exists())
+        self.assertEqual((user.latitude, user.longitude), (9.97, 76.28))
+        user.refresh_from_db()
+        self.assertEqual((user.latitude, user.longitude), (9.97, 76.28))
+
+    def test_worker_fills_cache_from_database(self):
+        User.objects.create_user(username="pat", role="patient", address="MG Road, Kochi")
+        process_jobs()
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 1)
+
+        geocode_cache.clear_memory()
+        hits = geocode_cache.stats["db_hits"]
+        self.assertEqual(geocode_cache.get("mg road, kochi"), (9.97, 76.28))
+        self.assertEqual(geocode_cache.stats["db_hits"], hits + 1)
+
+    def test_not_found_is_cached_until_ttl(self):
+        geocode_cache.set("Nowhere", None)
+        self.assertIsNone(geocode_cache.get("nowhere"))
+
+        GeocodeCacheEntry.objects.update(expires_at=timezone.now() - timezone.timedelta(seconds=1))
+        geocode_cache.clear_memory()
+        self.assertIs(geocode_cache.get("nowhere"), MISS)
+
+
+GAZETTEER_CSV = """name,kind,latitude,longitude,parent
+Kochi,locality,9.9312,76.2673,
+Thrissur,locality,10.5276,76.2144,
+682016,postcode,9.9700,76.2850,Kochi
+MG Road,street,9.9725,76.2810,Kochi
+MG Road,street,10.5200,76.2100,Thrissur
+"""
+
+
+class GazetteerTests(TestCase):
+    def setUp(self):
+        geocode_cache.clear_memory()
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as csv_file:
+            csv_file.write(GAZETTEER_CSV)
+        self.addCleanup(os.remove, self.path)
+        self.addCleanup(load_gazetteer.cache_clear)
+
+    def test_most_specific_match_wins(self):
+        gazetteer = Gazetteer.from_csv(self.path)
+        self.assertEqual(len(gazetteer), 5)
+        self.assertEqual(gazetteer.lookup("12, M.G. Road, Thrissur"), (10.52, 76.21))
+        self.assertEqual(gazetteer.lookup("Flat 3, MG Road, Kochi 682016"), (9.9725, 76.281))
+        self.assertEqual(gazetteer.lookup("Near bus stand, 682016"), (9.97, 76.285))
+        self.assertEqual(gazetteer.lookup("Kochi"), (9.9312, 76.2673))
+        self.assertIsNone(gazetteer.lookup("Bengaluru"))
+
+    def test_chain_falls_back_when_gazetteer_misses(self):
+        chain = ChainGeocoder([GazetteerGeocoder(self.path), FakeGeocoder()])
+        self.assertEqual(chain.geocode("Kochi"), (9.9312, 76.2673))
+        self.assertEqual(chain.geocode("MG Road, Kochi"), (9.9725, 76.281))
+        self.assertIsNone(chain.geocode("Bengaluru"))
+
+    def test_offline_backend_geocodes_inline(self):
+        with override_settings(
+            GEOCODER_BACKEND="accounts.geocoding.GazetteerGeocoder",
+            GEOCODER_GAZETTEER_PATH=self.path,
+            GEOCODER_FALLBACK=None,
+        ):
+            user = User.objects.create_user(username="pat", role="patient", address="MG Road, Kochi")
+        self.assertEqual((user.latitude, user.longitude), (9.9725, 76.281))
+        self.assertFalse(GeocodeJob.objects.exists())
+
+
+class UserEmailLookupTests(QueryPlanMixin, TestCase):
+    def test_with_email_is_case_insensitive_and_indexed(self):
+        user = User.objects.create_user(username="pat", password="pass", email="Pat@Example.com")
+        self.assertEqual(User.objects.with_email("pat@EXAMPLE.com").get(), user)
+        self.assertUsesIndex(User.objects.with_email("pat@example.com"), "accounts_user_email_lower_idx")
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        from deliveries.models import Delivery
+        from orders.models import Order
+        from shop.models import Medicine, Stock
+
+        self.pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.rider = User.objects.create_user(username="rider", password="pass", role="delivery")
+        self.admin = User.objects.create_superuser(username="admin", password="pass")
+        now = timezone.now()
+        for status, amount in (("pending", 10), ("delivered", 25), ("delivered", 5)):
+            order = Order.objects.create(
+                patient=self.patient, pharmacy=self.pharmacist, status=status, total_amount=amount,
+                payment_status="paid" if status == "delivered" else "pending",
+            )
+            if status == "delivered":
+                Delivery.objects.create(
+                    order=order, assigned_to=self.rider, status="delivered",
+                    delivered_at=now, expected_delivery_time=now + timezone.timedelta(hours=1),
+                )
+        medicine = Medicine.objects.create(name="Paracetamol", pharmacy=self.pharmacist)
+        Stock.objects.create(medicine=medicine, pharmacy=self.pharmacist, quantity=3)
+
+    def dashboard(self, user, queries):
+        self.client.force_login(user)
+        with self.assertNumQueries(queries):
+            response = self.client.get("/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def test_each_dashboard_is_a_few_queries(self):
+        # Two queries for the session and user, the rest are stats
+        context = self.dashboard(self.patient, 4)
+        self.assertEqual(context["active_orders"], 1)
+
+        context = self.dashboard(self.admin, 6)
+        self.assertEqual((context["total_users"], context["total_pharmacies"], context["total_orders"]), (3, 1, 3))
+        self.assertEqual((context["monthly_sales"], context["yearly_sales"]), (30, 30))
+
+        context = self.dashboard(self.pharmacist, 6)
+        self.assertEqual(context["pending_orders"], 1)
+        self.assertEqual(context["monthly_sales"], 30)
+        self.assertEqual(context["low_stock_items"], 1)
+
+        context = self.dashboard(self.rider, 5)
+        self.assertEqual((context["completed_today"], context["on_time_rate"]), (2, 100.0))
+
+    def test_stats_are_cached_until_an_order_changes(self):
+        from orders.models import Order
+
+        self.dashboard(self.patient, 4)
+        context = self.dashboard(self.patient, 2)  # session + user only
+        self.assertEqual(context["active_orders"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+        context = self.dashboard(self.patient, 4)
+        self.assertEqual(context["active_orders"], 2)
+
+        self.assertEqual(cache_counters(), {"hits": 1, "misses": 2, "invalidations": 3, "hit_rate": 33.3})
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: no TLS, no auth."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost SMTP stand-in")
+        sender, recipients = None, []
+        for raw in self.rfile:
+            command = raw.decode().strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                sender = command.split(":", 1)[1].strip()
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip())
+                self.reply("250 OK")
+            elif verb == "DATA":
+                if server.reject_data:
+                    server.reject_data -= 1
+                    self.reply("451 Try again later")
+                    continue
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b"".join(iter(self.rfile.readline, b".\r\n"))
+                server.messages.append((sender, recipients, data.decode()))
+                sender, recipients = None, []
+                self.reply("250 Queued")
+            elif verb in ("RSET", "NOOP"):
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.reject_data = 0  # answer the next N DATA commands with 451
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        override = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1", EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_USE_TLS=False, EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="",
+            DEFAULT_FROM_EMAIL="pharmacy@example.com",
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_mark_picked_queues_instead_of_sending(self):
+        from deliveries.models import Delivery
+        from orders.models import Order
+
+        patient = User.objects.create_user(username="pat", password="pass", role="patient", email="pat@example.com")
+        rider = User.objects.create_user(username="rider", password="pass", role="delivery")
+        delivery = Delivery.objects.create(order=Order.objects.create(patient=patient), assigned_to=rider)
+        self.client.force_login(rider)
+        self.client.get(f"/deliveries/{delivery.pk}/picked/")
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual(self.smtp.connections, 0)
+        self.assertEqual(email.recipients(), ["pat@example.com"])
+
+        self.assertEqual(drain_outbox(), (1, 0))
+        delivery.refresh_from_db()
+        sender, recipients, data = self.smtp.messages[0]
+        self.assertEqual(recipients, ["<pat@example.com>"])
+        self.assertIn(delivery.verification_code, data)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.body), (OutboxEmail.SENT, ""))
+
+    def test_batch_reuses_one_connection_and_retries_failures(self):
+        for n in range(3):
+            queue_email(f"Message {n}", "Hello", [f"user{n}@example.com"])
+        self.smtp.reject_data = 1
+
+        self.assertEqual(drain_outbox(), (2, 1))
+        self.assertEqual(len(self.smtp.messages), 2)
+        retry = OutboxEmail.objects.get(status=OutboxEmail.PENDING)
+        self.assertEqual(retry.attempts, 1)
+        self.assertIn("451", retry.last_error)
+        self.assertGreater(retry.run_after, timezone.now())
+        self.assertEqual(drain_outbox(), (0, 0))  # backing off
+
+        OutboxEmail.objects.filter(pk=retry.pk).update(run_after=timezone.now())
+        self.assertEqual(drain_outbox(), (1, 0))
+        # One connection per batch, plus a reconnect after the failed message
+        self.assertEqual(self.smtp.connections, 3)
+
+    def test_unreachable_server_puts_the_batch_back(self):
+        queue_email("Hello", "Hello", ["user@example.com"])
+        self.smtp.shutdown()
+        self.smtp.server_close()
+
+        self.assertEqual(drain_outbox(), (0, 1))
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 0))
+        self.assertGreater(email.run_after, timezone.now())
@@ -1,4 +1,3 @@
-from datetime import datetime, time
 from typing import OrderedDict
 from django.http import HttpResponseForbidden
 from django.shortcuts import render, redirect, get_object_or_404
@@ -12,13 +11,8 @@ from deliveries.models import Delivery
 
 from .forms import RegisterForm, LoginForm, CustomPasswordResetForm, CustomSetPasswordForm, ProfileUpdateForm
 from django.contrib.auth import get_user_model
-from shop.models import Category
-from orders.models import Order
 from django.utils import timezone
-from prescriptions.models import Prescription
-from django.db.models import Sum, F
-from django.utils.timezone import now
-from shop.models import Stock
+from .stats import admin_stats, cache_counters, delivery_stats, patient_stats, pharmacist_stats, today_range
 
 
 User = get_user_model()
@@ -83,125 +77,41 @@ def dashboard_view(request):
 
     # ---------- Patient Dashboard ----------
     if user.is_patient():
-        # Active orders: pending or processing
-        active_orders = Order.objects.filter(
-            patient=user,
-            status__in=['pending', 'processing']
-        ).count()
-
-
-        # Recent prescriptions
-        recent_prescriptions = Prescription.objects.filter(
-            patient=user
-        ).count()
-    
-
-        # Update context with stats
-        context.update({
-            "active_orders": active_orders,
-            "recent_prescriptions": recent_prescriptions,
-        })
-
+        context.update(patient_stats(user))
         template_name = "patient_dashboard.html"
 
     # ---------- Superuser/Admin Dashboard ----------
     elif user.is_superuser:
-        total_users = User.objects.filter(is_superuser=False).count()
-        total_pharmacies = User.objects.filter(role='pharmacist').count()
-        total_orders = Order.objects.count()
-        total_categories = Category.objects.count()
-        system_alerts = 1  # placeholder, implement as needed
-
-
-        context.update({
-            "total_users": total_users,
-            "total_pharmacies": total_pharmacies,
-            "total_orders": total_orders,
-            "system_alerts": system_alerts,
-            "total_categories": total_categories,
-        })
-
-         
+        context.update(admin_stats())
+        context["system_alerts"] = 1  # placeholder, implement as needed
+        context["stats_cache"] = cache_counters()
         template_name = "admin_dashboard.html"
 
     # ---------- Pharmacist Dashboard ----------
     elif user.is_pharmacist():
-
-        # 1. Pending Orders
-        pending_orders = Order.objects.filter(pharmacy=request.user,status="pending").count()
-
-        # 2. Pending Prescriptions
-        pending_prescriptions = Prescription.objects.filter(verified=False).count()
-
-        # 3. Low Stock Items (adjust threshold as needed)
-        low_stock_items = Stock.objects.filter(quantity__lt=10).count()
-
-        # 4. Monthly Sales (sum of completed orders this month)
-        today = now().date()
-        monthly_sales = (
-            Order.objects.filter(
-                status="completed",
-                created_at__year=today.year,
-                created_at__month=today.month,
-            ).aggregate(total=Sum("total_amount"))["total"] or 0
-        )
-
-        context.update({
-            "pending_orders": pending_orders,
-            "pending_prescriptions": pending_prescriptions,
-            "low_stock_items": low_stock_items,
-            "monthly_sales": monthly_sales,
-        })
-
-        # Example: you can add pharmacist-specific stats here
+        context.update(pharmacist_stats(user))
         template_name = "pharmacist_dashboard.html"
 
     # ---------- Delivery Staff Dashboard ----------
     elif user.is_delivery():
-        today = timezone.localdate()
-        start_of_day = timezone.make_aware(datetime.combine(today, time.min))
-        end_of_day = timezone.make_aware(datetime.combine(today, time.max))
-
         # Latest delivery
         latest_delivery = Delivery.objects.filter(
             assigned_to=user
         ).exclude(status="delivered").order_by("-id").first()
 
-        # Pending deliveries
-        pending_deliveries = Delivery.objects.filter(
-            assigned_to=user,
-            status="pending"
-        ).count()
-
-        # Completed deliveries today (use range)
+        # Completed deliveries today (half-open local day)
+        start_of_day, end_of_day = today_range()
         completed_today_qs = Delivery.objects.filter(
             assigned_to=user,
             status="delivered",
-            delivered_at__range=(start_of_day, end_of_day)
-        )
-        completed_today = completed_today_qs.count()
-
-        # On-time rate
-        total_completed = Delivery.objects.filter(
-            assigned_to=user,
-            status="delivered"
-        ).count()
-
-        on_time_deliveries = Delivery.objects.filter(
-            assigned_to=user,
-            status="delivered",
-            delivered_at__lte=F("expected_delivery_time")
-        ).count() if total_completed else 0
+            delivered_at__gte=start_of_day,
+            delivered_at__lt=end_of_day,
+        ).select_related("assigned_to", "order__patient")
 
-        on_time_rate = round((on_time_deliveries / total_completed) * 100, 2) if total_completed else 0
-        
-        
         context = {
             "latest_delivery": latest_delivery,
-            "pending_deliveries": pending_deliveries,
-            "completed_today": completed_today,
             "deliveries": completed_today_qs,  # Pass actual deliveries to modal
-            "on_time_rate": on_time_rate,
+            **delivery_stats(user),
         }
 
         template_name = "delivery_dashboard.html"
@@ -218,10 +128,7 @@ def is_admin(user):
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
-    total_users = User.objects.filter(is_superuser=False).count()
-    total_pharmacists = User.objects.filter(role='pharmacist').count()
-    total_orders = Order.objects.count()
-    total_categories = Category.objects.count()
+    stats = admin_stats()
 
     # Example dummy recent activities
     recent_activities = [
@@ -230,10 +137,10 @@ def admin_dashboard(request):
     ]
 
     context = {
-        "total_users": total_users,
-        "total_pharmacists": total_pharmacists,
-        "total_orders": total_orders,
-        "total_categories": total_categories,
+        "total_users": stats["total_users"],
+        "total_pharmacists": stats["total_pharmacies"],
+        "total_orders": stats["total_orders"],
+        "total_categories": stats["total_categories"],
         "system_alerts": 1,   # change if you want dynamic alerts
         "recent_activities": recent_activities,
 
@@ -289,7 +196,7 @@ def check_email_view(request):
             return render(request, "password_reset.html", {"form": CustomPasswordResetForm()})
 
         try:
-            user = User.objects.get(email=email)
+            user = User.objects.with_email(email).get()
             # ✅ Store email temporarily in session so we can use it in reset_password_view
             request.session["reset_email"] = email  
             return redirect("password_reset_confirm")  # redirect to reset password page
@@ -313,7 +220,7 @@ def reset_password_view(request):
         return redirect("password_reset")
 
     try:
-        user = User.objects.get(email=email)
+        user = User.objects.with_email(email).get()
     except User.DoesNotExist:
         messages.error(request, "Something went wrong. Please try again.")
         return redirect("password_reset")
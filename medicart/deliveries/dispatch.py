@@ -0,0 +1,184 @@
+# deliveries/dispatch.py
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.195  # along a meridian
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """
+    Points bucketed into roughly square cells of ``cell_km``.
+
+    Longitude cells are widened by 1/cos(latitude) at the mean latitude of
+    the points, so near that latitude a cell is ``cell_km`` both ways; a
+    lookup walks rings of cells outwards from the query point and stops as
+    soon as everything closer than the ring has been seen.
+    """
+
+    def __init__(self, points, cell_km=2.0):
+        self.cell_km = cell_km
+        points = list(points)  # (key, lat, lon)
+        mean_lat = sum(lat for _, lat, _ in points) / len(points) if points else 0.0
+        self.lat_step = cell_km / KM_PER_DEGREE
+        self.lon_step = self.lat_step / max(math.cos(math.radians(mean_lat)), 0.05)
+        self.cells = defaultdict(list)
+        for key, lat, lon in points:
+            self.cells[self.cell(lat, lon)].append((key, lat, lon))
+        self.size = len(points)
+
+    def cell(self, lat, lon):
+        return math.floor(lat / self.lat_step), math.floor(lon / self.lon_step)
+
+    def _ring(self, row, col, radius):
+        if radius == 0:
+            yield row, col
+            return
+        for c in range(col - radius, col + radius + 1):
+            yield row - radius, c
+            yield row + radius, c
+        for r in range(row - radius + 1, row + radius):
+            yield r, col - radius
+            yield r, col + radius
+
+    def nearby(self, lat, lon, limit=20, max_km=None):
+        """
+        Up to ``limit`` ``(distance_km, key)`` pairs nearest to (lat, lon),
+        closest first, optionally only within ``max_km``.
+        """
+        row, col = self.cell(lat, lon)
+        found = []
+        seen = 0
+        radius = 0
+        while seen < self.size:
+            for cell in self._ring(row, col, radius):
+                for key, plat, plon in self.cells.get(cell, ()):
+                    seen += 1
+                    distance = haversine_km(lat, lon, plat, plon)
+                    if max_km is None or distance <= max_km:
+                        found.append((distance, key))
+            # Every point within ``covered`` km lies in the rings walked so far
+            covered = radius * self.cell_km * 0.99
+            if max_km is not None and covered >= max_km:
+                break
+            if len(found) >= limit and sorted(found)[limit - 1][0] <= covered:
+                break
+            radius += 1
+        found.sort()
+        return found[:limit]
+
+
+class RiderIndex:
+    """
+    Grid of active delivery riders by their saved location.
+
+    Built lazily and rebuilt every ``DISPATCH_INDEX_REFRESH`` seconds, like
+    the medicine autocomplete index, so rankings never scan every rider.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.grid = None
+        self.built_at = 0.0
+
+    def build(self):
+        from accounts.models import User
+
+        riders = User.objects.filter(
+            role="delivery", is_active=True, latitude__isnull=False, longitude__isnull=False
+        ).values_list("id", "latitude", "longitude")
+        grid = GridIndex(riders, cell_km=getattr(settings, "DISPATCH_GRID_CELL_KM", 2.0))
+        with self._lock:
+            self.grid = grid
+            self.built_at = time.monotonic()
+        return grid
+
+    def invalidate(self):
+        self.grid = None
+
+    def get(self):
+        refresh = getattr(settings, "DISPATCH_INDEX_REFRESH", 60)
+        grid = self.grid
+        if grid is None or time.monotonic() - self.built_at > refresh:
+            grid = self.build()
+        return grid
+
+
+rider_index = RiderIndex()
+
+
+def rider_history(rider_ids):
+    """Open load and on-time record per rider, in one query."""
+    from accounts.models import User
+
+    delivered = Q(assigned_deliveries__status="delivered")
+    rows = User.objects.filter(id__in=rider_ids).annotate(
+        open_load=Count("assigned_deliveries", filter=~delivered),
+        delivered=Count("assigned_deliveries", filter=delivered),
+        on_time=Count(
+            "assigned_deliveries",
+            filter=delivered & Q(assigned_deliveries__delivered_at__lte=F("assigned_deliveries__expected_delivery_time")),
+        ),
+    )
+    return {rider.id: rider for rider in rows}
+
+
+def rank_riders(pharmacy, limit=5):
+    """
+    Best riders for an order from ``pharmacy``, best first.
+
+    Each candidate is a dict with the rider, distance_km (None when the
+    pharmacy has no location), open_load, on_time_rate and score, where
+
+        score = km * distance + open_delivery * open_load + late * (1 - on_time_rate)
+
+    with the weights from ``DISPATCH_WEIGHTS``. The on-time rate is smoothed
+    ((on_time + 1) / (delivered + 2)) so new riders start at 50%.
+    """
+    weights = {"km": 1.0, "open_delivery": 2.0, "late": 5.0, **getattr(settings, "DISPATCH_WEIGHTS", {})}
+    pool = getattr(settings, "DISPATCH_CANDIDATES", 50)
+    max_km = getattr(settings, "DISPATCH_MAX_KM", 15)
+
+    if pharmacy is not None and pharmacy.latitude is not None and pharmacy.longitude is not None:
+        nearby = rider_index.get().nearby(pharmacy.latitude, pharmacy.longitude, limit=pool, max_km=max_km)
+    else:
+        from accounts.models import User
+
+        nearby = [
+            (None, rider_id) for rider_id in
+            User.objects.filter(role="delivery", is_active=True).values_list("id", flat=True)[:pool]
+        ]
+
+    history = rider_history([rider_id for _, rider_id in nearby])
+    candidates = []
+    for distance, rider_id in nearby:
+        rider = history.get(rider_id)
+        if rider is None or not rider.is_active:  # deactivated since the index was built
+            continue
+        on_time_rate = (rider.on_time + 1) / (rider.delivered + 2)
+        score = (
+            weights["km"] * (distance or 0)
+            + weights["open_delivery"] * rider.open_load
+            + weights["late"] * (1 - on_time_rate)
+        )
+        candidates.append({
+            "rider": rider,
+            "distance_km": round(distance, 2) if distance is not None else None,
+            "open_load": rider.open_load,
+            "on_time_rate": round(on_time_rate * 100, 1),
+            "score": round(score, 3),
+        })
+    candidates.sort(key=lambda candidate: (candidate["score"], candidate["rider"].id))
+    return candidates[:limit]
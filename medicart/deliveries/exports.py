@@ -0,0 +1,7 @@
+# deliveries/exports.py
+"""Columns of the delivery export, shared by the export view and report jobs."""
+
+DELIVERY_EXPORT_FIELDS = (
+    "id", "order__order_number", "order__patient__username", "order__pharmacy__pharmacy_name",
+    "assigned_to__username", "status", "picked_at", "delivered_at", "expected_delivery_time", "distance",
+)
@@ -0,0 +1,155 @@
+# deliveries/live.py
+"""
+Live rider locations.
+
+Riders post GPS fixes to ``location_ingest``; each fix is fanned out at once
+to everyone watching one of the rider's deliveries (``location_stream``,
+Server-Sent Events) through the in-process ``hub``, and buffered in
+``fixes`` so the database only sees one batched write every
+LOCATION_FLUSH_SECONDS. The hub lives in one process: run a single ASGI
+worker per set of riders and watchers (or put a broker behind
+``LocationHub.publish`` when scaling out).
+"""
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+
+class LocationHub:
+    """
+    Rider id -> subscriber queues. Each watcher gets a small queue; when a
+    slow watcher's queue is full the oldest fix is dropped, since only the
+    newest position matters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)  # rider id -> {(loop, queue)}
+
+    def subscribe(self, rider_id):
+        queue = asyncio.Queue(maxsize=getattr(settings, "LOCATION_SUBSCRIBER_QUEUE", 16))
+        with self._lock:
+            self._subscribers[rider_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, rider_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(rider_id, set())
+            subscribers.discard(next((entry for entry in subscribers if entry[1] is queue), None))
+            if not subscribers:
+                self._subscribers.pop(rider_id, None)
+
+    def watchers(self, rider_id):
+        with self._lock:
+            return len(self._subscribers.get(rider_id, ()))
+
+    @staticmethod
+    def _offer(queue, fix):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(fix)
+
+    def publish(self, rider_id, fix):
+        """Hand ``fix`` to every watcher of ``rider_id``; safe from any thread or loop."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(rider_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, fix)
+            except RuntimeError:  # that watcher's loop has closed
+                self.unsubscribe(rider_id, queue)
+
+
+hub = LocationHub()
+
+
+class FixBuffer:
+    """
+    Fixes received since the last flush, per rider. ``flush`` writes each
+    rider's newest fix to User.latitude/longitude in one bulk update and
+    appends the rest to the traces of deliveries on board.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(list)  # rider id -> [fix, ...]
+        self.flushed_at = time.monotonic()
+
+    def add(self, rider_id, fixes):
+        limit = getattr(settings, "LOCATION_BUFFER_MAX_FIXES", 600)
+        with self._lock:
+            pending = self._pending[rider_id]
+            pending.extend(fixes)
+            del pending[:-limit]
+
+    def latest(self, rider_id):
+        with self._lock:
+            pending = self._pending.get(rider_id)
+            return pending[-1] if pending else None
+
+    def due(self):
+        return time.monotonic() - self.flushed_at >= getattr(settings, "LOCATION_FLUSH_SECONDS", 5)
+
+    def take(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(list)
+            self.flushed_at = time.monotonic()
+        return pending
+
+    def flush(self):
+        """Persist buffered fixes; returns how many riders were written."""
+        from accounts.models import User
+
+        from .traces import record_traces
+
+        pending = self.take()
+        riders = []
+        for rider_id, rider_fixes in pending.items():
+            newest = max(rider_fixes, key=lambda fix: fix["ts"])
+            riders.append(User(
+                pk=rider_id,
+                latitude=newest["lat"],
+                longitude=newest["lon"],
+                location_updated_at=datetime.fromtimestamp(newest["ts"], tz=dt_timezone.utc),
+            ))
+        User.objects.bulk_update(riders, ["latitude", "longitude", "location_updated_at"], batch_size=500)
+        record_traces(pending)
+        return len(riders)
+
+
+fixes = FixBuffer()
+
+
+def parse_fixes(payload):
+    """
+    Validate ``{"lat", "lon", "ts"?, "speed"?}`` or ``{"fixes": [...]}``;
+    returns fixes sorted by time. ``ts`` is Unix seconds and defaults to now.
+    Raises ValueError on a bad fix.
+    """
+    items = payload.get("fixes", [payload]) if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError("Expected a fix or a list of fixes.")
+    if len(items) > getattr(settings, "LOCATION_MAX_BATCH", 500):
+        raise ValueError("Too many fixes in one request.")
+    now = timezone.now().timestamp()
+    parsed = []
+    for item in items:
+        try:
+            lat, lon = float(item["lat"]), float(item["lon"])
+            ts = float(item.get("ts", now))
+            speed = item.get("speed")
+            speed = float(speed) if speed is not None else None
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError("Each fix needs numeric lat and lon.")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("Coordinates out of range.")
+        if ts > now + 60:
+            raise ValueError("Fix timestamp is in the future.")
+        parsed.append({"lat": lat, "lon": lon, "ts": ts, "speed": speed})
+    parsed.sort(key=lambda fix: fix["ts"])
+    return parsed
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from deliveries.routing import RoadGraph
+
+
+class Command(BaseCommand):
+    help = "Compile an OpenStreetMap XML extract into the road graph used by track_route"
+
+    def add_arguments(self, parser):
+        parser.add_argument("osm_file", help="OSM XML extract (e.g. from osmium or Overpass)")
+        parser.add_argument("--out", default=None, help="Output path (default: ROAD_GRAPH_PATH)")
+
+    def handle(self, *args, **options):
+        out = options["out"] or settings.ROAD_GRAPH_PATH
+        graph = RoadGraph.from_osm(options["osm_file"])
+        graph.save(out)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {out}: {len(graph)} nodes, {len(graph.targets)} road segments."
+        ))
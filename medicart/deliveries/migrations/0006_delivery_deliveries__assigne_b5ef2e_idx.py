@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0005_delivery_verification_code'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['assigned_to', 'status', 'delivered_at'], name='deliveries__assigne_b5ef2e_idx'),
+        ),
+    ]
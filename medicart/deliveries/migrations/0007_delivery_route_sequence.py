@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0006_delivery_deliveries__assigne_b5ef2e_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='route_sequence',
+            field=models.PositiveIntegerField(blank=True, help_text="Stop number in the rider's planned route", null=True),
+        ),
+    ]
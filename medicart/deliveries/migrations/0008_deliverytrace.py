@@ -0,0 +1,23 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0007_delivery_route_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryTrace',
+            fields=[
+                ('delivery', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trace', serialize=False, to='deliveries.delivery')),
+                ('data', models.BinaryField(default=bytes)),
+                ('points', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
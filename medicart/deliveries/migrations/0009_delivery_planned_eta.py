@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-17 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0008_deliverytrace'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='planned_eta',
+            field=models.DateTimeField(blank=True, help_text='Arrival time estimated by the route planner', null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.25 on 2026-10-17 13:19
+
+from django.db import migrations, models
+
+
+def fill_last_fix(apps, schema_editor):
+    from deliveries.traces import decode_fixed
+
+    DeliveryTrace = apps.get_model("deliveries", "DeliveryTrace")
+    for trace in DeliveryTrace.objects.exclude(points=0).iterator():
+        lats, lons, times = decode_fixed(trace.data)
+        if times:
+            trace.last_lat, trace.last_lon, trace.last_ts = lats[-1], lons[-1], times[-1]
+            trace.save(update_fields=["last_lat", "last_lon", "last_ts"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliveries', '0009_delivery_planned_eta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverytrace',
+            name='last_lat',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='deliverytrace',
+            name='last_lon',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='deliverytrace',
+            name='last_ts',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_last_fix, migrations.RunPython.noop),
+    ]
@@ -19,6 +19,11 @@ class Delivery(models.Model):
     distance = models.FloatField(default=0, help_text="Distance traveled in km")
     expected_delivery_time = models.DateTimeField(null=True, blank=True, help_text="Planned delivery time")
     verification_code = models.CharField(max_length=6, blank=True, null=True)  # ✅ NEW FIELD
+    route_sequence = models.PositiveIntegerField(null=True, blank=True, help_text="Stop number in the rider's planned route")
+    planned_eta = models.DateTimeField(null=True, blank=True, help_text="Arrival time estimated by the route planner")
+
+    class Meta:
+        indexes = [models.Index(fields=["assigned_to", "status", "delivered_at"])]  # rider dashboard
 
     def generate_verification_code(self):
         """Generate a random 6-digit code"""
@@ -28,3 +33,21 @@ class Delivery(models.Model):
 
     def __str__(self):
         return f"Delivery for order {self.order.id}"
+
+
+class DeliveryTrace(models.Model):
+    """
+    GPS path of a delivery while the parcel is on board, as one
+    delta-encoded blob (see ``deliveries.traces``) instead of a row per fix.
+    """
+    delivery = models.OneToOneField(Delivery, on_delete=models.CASCADE, primary_key=True, related_name="trace")
+    data = models.BinaryField(default=bytes)
+    points = models.PositiveIntegerField(default=0)
+    # Last fix in fixed point, so new fixes are encoded without decoding ``data``
+    last_lat = models.BigIntegerField(default=0)
+    last_lon = models.BigIntegerField(default=0)
+    last_ts = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Trace for delivery {self.delivery_id} ({self.points} points)"
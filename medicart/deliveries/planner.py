@@ -0,0 +1,129 @@
+# deliveries/planner.py
+"""
+Multi-stop route planning for a rider's open deliveries.
+
+The rider first collects from every pharmacy that still has parcels waiting
+(status "assigned"), then drops everything off; that keeps each pickup ahead
+of its drop without a constrained solver. Both legs are ordered with
+nearest-neighbour and then improved with 2-opt over a haversine distance
+matrix.
+
+Each planned stop gets a ``planned_eta``; ``expected_delivery_time`` is the
+time promised to the customer (the on-time deadline) and is left alone.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .dispatch import haversine_km
+from .models import Delivery
+
+
+def distance_matrix(points):
+    """Pairwise great-circle distances (km) between (lat, lon) points, as nested lists."""
+    return [[haversine_km(*p, *q) for q in points] for p in points]
+
+
+def path_length(path, matrix):
+    return sum(matrix[a][b] for a, b in zip(path, path[1:]))
+
+
+def nearest_neighbour(start, stops, matrix):
+    """Visit ``stops`` (matrix indices) greedily from ``start``; returns the visiting order."""
+    remaining = set(stops)
+    order = []
+    current = start
+    while remaining:
+        current = min(remaining, key=lambda stop: (matrix[current][stop], stop))
+        remaining.remove(current)
+        order.append(current)
+    return order
+
+
+def two_opt(start, order, matrix):
+    """
+    Improve an open path ``start -> order...`` by reversing segments while
+    that shortens it. The start is fixed and the path does not return.
+    """
+    path = [start] + list(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(path) - 1):
+            for j in range(i + 1, len(path)):
+                a, b = path[i - 1], path[i]
+                c = path[j]
+                d = path[j + 1] if j + 1 < len(path) else None
+                before = matrix[a][b] + (matrix[c][d] if d is not None else 0)
+                after = matrix[a][c] + (matrix[b][d] if d is not None else 0)
+                if after < before - 1e-9:
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    improved = True
+    return path[1:]
+
+
+def solve(start, stops, matrix):
+    return two_opt(start, nearest_neighbour(start, stops, matrix), matrix)
+
+
+def coords(user_or_order):
+    if user_or_order is None or user_or_order.latitude is None or user_or_order.longitude is None:
+        return None
+    return user_or_order.latitude, user_or_order.longitude
+
+
+def plan_route(rider, start_time=None):
+    """
+    Order ``rider``'s open deliveries and store each one's ``route_sequence``
+    and ``planned_eta``; returns the planned deliveries in order.
+
+    Travel time uses DELIVERY_AVERAGE_SPEED_KMH and every stop costs
+    DELIVERY_STOP_MINUTES. Deliveries without drop coordinates are left
+    unplanned (``route_sequence`` cleared).
+    """
+    speed = getattr(settings, "DELIVERY_AVERAGE_SPEED_KMH", 25)
+    stop_time = timedelta(minutes=getattr(settings, "DELIVERY_STOP_MINUTES", 5))
+    start_time = start_time or timezone.now()
+
+    deliveries = list(
+        Delivery.objects.filter(assigned_to=rider)
+        .exclude(status="delivered")
+        .select_related("order", "order__pharmacy")
+    )
+    routable = [delivery for delivery in deliveries if coords(delivery.order)]
+
+    # Matrix nodes: [start, pickups..., drops...]
+    pickups = {}
+    for delivery in routable:
+        pharmacy = delivery.order.pharmacy
+        if delivery.status == "assigned" and coords(pharmacy) and pharmacy.pk not in pickups:
+            pickups[pharmacy.pk] = coords(pharmacy)
+    first_pickup = next(iter(pickups.values()), None)
+    start = coords(rider) or first_pickup or (coords(routable[0].order) if routable else None)
+    points = [start] + list(pickups.values()) + [coords(delivery.order) for delivery in routable]
+    matrix = distance_matrix(points) if routable else []
+
+    pickup_nodes = range(1, 1 + len(pickups))
+    drop_nodes = range(1 + len(pickups), len(points))
+    pickup_order = solve(0, pickup_nodes, matrix)
+    drop_order = solve(pickup_order[-1] if pickup_order else 0, drop_nodes, matrix)
+
+    position, elapsed = 0, timedelta()
+    for node in pickup_order:
+        elapsed += timedelta(hours=matrix[position][node] / speed) + stop_time
+        position = node
+    for sequence, node in enumerate(drop_order, start=1):
+        elapsed += timedelta(hours=matrix[position][node] / speed) + stop_time
+        position = node
+        delivery = routable[node - drop_nodes.start]
+        delivery.route_sequence = sequence
+        delivery.planned_eta = start_time + elapsed
+
+    planned = {delivery.pk for delivery in routable}
+    for delivery in deliveries:
+        if delivery.pk not in planned:
+            delivery.route_sequence = None
+    Delivery.objects.bulk_update(deliveries, ["route_sequence", "planned_eta"])
+    return sorted(routable, key=lambda delivery: delivery.route_sequence)
+
@@ -0,0 +1,267 @@
+# deliveries/routing.py
+"""
+Offline road routing for ``track_route``.
+
+``manage.py build_road_graph extract.osm`` compiles an OpenStreetMap XML
+extract into a compact graph file (ROAD_GRAPH_PATH): node coordinates plus
+a CSR adjacency (offsets/targets/lengths/speeds in flat ``array``s). Routes
+are found with A* using the great-circle distance as heuristic, simplified
+with Douglas-Peucker and cached per (pickup cell, drop cell) pair. Without a
+graph, or when a point is too far from any road, the straight line is used.
+"""
+import heapq
+import math
+import os
+import pickle
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .dispatch import KM_PER_DEGREE, GridIndex, haversine_km
+
+GRAPH_VERSION = 1
+
+# km/h by OSM highway type; ways with other highway values are skipped
+ROAD_SPEEDS = {
+    "motorway": 80, "motorway_link": 50, "trunk": 60, "trunk_link": 40,
+    "primary": 45, "primary_link": 35, "secondary": 40, "secondary_link": 30,
+    "tertiary": 35, "tertiary_link": 25, "unclassified": 30, "residential": 25,
+    "living_street": 10, "service": 15, "road": 25,
+}
+
+
+# -------------------- polyline simplification --------------------
+def _offset_km(point, origin):
+    """(x, y) km of ``point`` from ``origin`` on a local flat projection."""
+    return (
+        (point[1] - origin[1]) * KM_PER_DEGREE * math.cos(math.radians(origin[0])),
+        (point[0] - origin[0]) * KM_PER_DEGREE,
+    )
+
+
+def _segment_distance_km(point, start, end):
+    px, py = _offset_km(point, start)
+    ex, ey = _offset_km(end, start)
+    length_sq = ex * ex + ey * ey
+    t = max(0.0, min(1.0, (px * ex + py * ey) / length_sq)) if length_sq else 0.0
+    return math.hypot(px - t * ex, py - t * ey)
+
+
+def simplify(points, tolerance_km):
+    """Douglas-Peucker: drop points closer than ``tolerance_km`` to the simplified line."""
+    points = list(points)
+    if len(points) < 3:
+        return points
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        furthest, distance = None, tolerance_km
+        for i in range(first + 1, last):
+            d = _segment_distance_km(points[i], points[first], points[last])
+            if d > distance:
+                furthest, distance = i, d
+        if furthest is not None:
+            keep[furthest] = True
+            stack.extend([(first, furthest), (furthest, last)])
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+# -------------------- graph --------------------
+class RoadGraph:
+    """Directed road graph in compressed sparse row form."""
+
+    def __init__(self, lat, lon, offsets, targets, lengths, speeds):
+        self.lat, self.lon = lat, lon
+        self.offsets, self.targets = offsets, targets
+        self.lengths, self.speeds = lengths, speeds
+        self._grid = None
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_osm(cls, path):
+        """Read the drivable ways of an OSM XML extract."""
+        coords, ways = {}, []
+        for _, element in ET.iterparse(path, events=("end",)):
+            if element.tag == "node":
+                coords[element.get("id")] = (float(element.get("lat")), float(element.get("lon")))
+                element.clear()
+            elif element.tag == "way":
+                tags = {tag.get("k"): tag.get("v") for tag in element.findall("tag")}
+                speed = ROAD_SPEEDS.get(tags.get("highway"))
+                if speed:
+                    refs = [nd.get("ref") for nd in element.findall("nd")]
+                    oneway = tags.get("oneway", "no")
+                    if tags.get("junction") == "roundabout" or tags.get("highway") == "motorway":
+                        oneway = tags.get("oneway", "yes")
+                    if oneway == "-1":
+                        refs.reverse()
+                    maxspeed = tags.get("maxspeed", "")
+                    if maxspeed.isdigit() and int(maxspeed) > 0:
+                        speed = int(maxspeed)
+                    ways.append((refs, speed, oneway in ("yes", "true", "1", "-1")))
+                element.clear()
+
+        index, lat, lon = {}, array("d"), array("d")
+        edges = []  # (from, to, km, km/h)
+        for refs, speed, oneway in ways:
+            refs = [ref for ref in refs if ref in coords]
+            for a, b in zip(refs, refs[1:]):
+                for ref in (a, b):
+                    if ref not in index:
+                        index[ref] = len(lat)
+                        lat.append(coords[ref][0])
+                        lon.append(coords[ref][1])
+                km = haversine_km(*coords[a], *coords[b])
+                edges.append((index[a], index[b], km, speed))
+                if not oneway:
+                    edges.append((index[b], index[a], km, speed))
+
+        edges.sort()
+        offsets = array("l", [0] * (len(lat) + 1))
+        for source, *_ in edges:
+            offsets[source + 1] += 1
+        for i in range(len(lat)):
+            offsets[i + 1] += offsets[i]
+        return cls(
+            lat, lon, offsets,
+            array("l", (edge[1] for edge in edges)),
+            array("f", (edge[2] for edge in edges)),
+            array("B", (min(edge[3], 255) for edge in edges)),
+        )
+
+    def save(self, path):
+        state = {
+            "version": GRAPH_VERSION,
+            **{name: getattr(self, name) for name in ("lat", "lon", "offsets", "targets", "lengths", "speeds")},
+        }
+        with open(path, "wb") as fh:
+            pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as fh:
+            state = pickle.load(fh)  # written by build_road_graph, never user-supplied
+        if state.pop("version", None) != GRAPH_VERSION:
+            raise ValueError(f"{path} was built by another version; run build_road_graph again")
+        return cls(**state)
+
+    def nearest_node(self, lat, lon, max_km):
+        if self._grid is None:
+            self._grid = GridIndex(zip(range(len(self)), self.lat, self.lon), cell_km=0.5)
+        found = self._grid.nearby(lat, lon, limit=1, max_km=max_km)
+        return found[0][1] if found else None
+
+    def astar(self, source, target):
+        """Shortest path (by length) from ``source`` to ``target`` as node ids, or None."""
+        lat, lon = self.lat, self.lon
+        goal = (lat[target], lon[target])
+        best = {source: 0.0}
+        came_from = {}
+        frontier = [(haversine_km(lat[source], lon[source], *goal), 0.0, source)]
+        while frontier:
+            _, cost, node = heapq.heappop(frontier)
+            if node == target:
+                path = [node]
+                while node in came_from:
+                    node = came_from[node]
+                    path.append(node)
+                return path[::-1]
+            if cost > best.get(node, math.inf):
+                continue  # stale queue entry
+            for edge in range(self.offsets[node], self.offsets[node + 1]):
+                neighbour = self.targets[edge]
+                new_cost = cost + self.lengths[edge]
+                if new_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = new_cost
+                    came_from[neighbour] = node
+                    estimate = new_cost + haversine_km(lat[neighbour], lon[neighbour], *goal)
+                    heapq.heappush(frontier, (estimate, new_cost, neighbour))
+        return None
+
+    def edge(self, a, b):
+        for edge in range(self.offsets[a], self.offsets[a + 1]):
+            if self.targets[edge] == b:
+                return edge
+        raise KeyError((a, b))
+
+
+class GraphLoader:
+    """Loads ROAD_GRAPH_PATH once per process (again if the setting changes)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.path = None
+        self.graph = None
+
+    def get(self):
+        path = getattr(settings, "ROAD_GRAPH_PATH", None)
+        with self._lock:
+            if path != self.path:
+                self.path = path
+                self.graph = RoadGraph.load(path) if path and os.path.exists(path) else None
+            return self.graph
+
+
+road_graph = GraphLoader()
+
+
+# -------------------- routes --------------------
+def route_cache_key(pickup, drop):
+    step = getattr(settings, "ROUTE_CACHE_CELL_KM", 0.25) / KM_PER_DEGREE
+    cells = [math.floor(value / step) for value in (*pickup, *drop)]
+    return "road-route:" + ":".join(map(str, cells))
+
+
+def straight_route(pickup, drop):
+    distance = haversine_km(*pickup, *drop)
+    speed = getattr(settings, "DELIVERY_AVERAGE_SPEED_KMH", 25)
+    return {
+        "path": [list(pickup), list(drop)],
+        "distance_km": round(distance, 2),
+        "eta_minutes": round(distance / speed * 60),
+        "source": "straight",
+    }
+
+
+def road_route(graph, pickup, drop):
+    snap = getattr(settings, "ROUTE_SNAP_MAX_KM", 1.0)
+    source = graph.nearest_node(*pickup, max_km=snap)
+    target = graph.nearest_node(*drop, max_km=snap)
+    if source is None or target is None:
+        return None
+    nodes = graph.astar(source, target)
+    if nodes is None:
+        return None
+
+    distance = hours = 0.0
+    for a, b in zip(nodes, nodes[1:]):
+        edge = graph.edge(a, b)
+        distance += graph.lengths[edge]
+        hours += graph.lengths[edge] / max(graph.speeds[edge], 1)  # never divide by a zero speed
+    path = [[graph.lat[node], graph.lon[node]] for node in nodes]
+    return {
+        "path": simplify(path, getattr(settings, "ROUTE_SIMPLIFY_KM", 0.01)),
+        "distance_km": round(distance, 2),
+        "eta_minutes": round(hours * 60),
+        "source": "road",
+    }
+
+
+def find_route(pickup, drop):
+    """Road route (or straight line) between two (lat, lon) points, cached per cell pair."""
+    graph = road_graph.get()
+    if graph is None:
+        return straight_route(pickup, drop)
+    key = route_cache_key(pickup, drop)
+    route = cache.get(key)
+    if route is None:
+        route = road_route(graph, pickup, drop) or straight_route(pickup, drop)
+        cache.set(key, route, getattr(settings, "ROUTE_CACHE_TTL", 86400))
+    return route
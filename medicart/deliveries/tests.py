@@ -1,3 +1,495 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import random
+import tempfile
+from array import array
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
 # Create your tests here.
+from accounts.models import User
+from orders.models import Order
+from shop.tests import ListQueryCountMixin, QueryPlanMixin
+from .dispatch import GridIndex, haversine_km, rank_riders, rider_index
+from .live import fixes, hub
+from .models import Delivery, DeliveryTrace
+from .planner import distance_matrix, nearest_neighbour, path_length, plan_route, two_opt
+from .routing import RoadGraph, find_route, road_route, route_cache_key, simplify
+from .traces import decode, encode, path_distance_km, record_traces
+
+
+class DeliveryQueryCountTests(ListQueryCountMixin, TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.rider = User.objects.create_user(username="rider", password="pass", role="delivery")
+
+    def add_deliveries(self, count):
+        for _ in range(count):
+            order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+            Delivery.objects.create(order=order, assigned_to=self.rider)
+
+    def test_delivery_list_as_rider(self):
+        self.client.force_login(self.rider)
+        self.assertListQueries("/deliveries/", self.add_deliveries, 3)
+
+    def test_delivery_list_as_pharmacist(self):
+        self.client.force_login(self.pharmacist)
+        self.assertListQueries("/deliveries/", self.add_deliveries, 4)
+
+
+class DeliveryQueryPlanTests(QueryPlanMixin, TestCase):
+    def test_rider_dashboard_filter(self):
+        rider = User.objects.create_user(username="rider", password="pass", role="delivery")
+        now = timezone.now()
+        self.assertUsesIndex(
+            Delivery.objects.filter(assigned_to=rider, status="delivered", delivered_at__range=(now, now)),
+            "deliveries__assigne_b5ef2e_idx",
+        )
+
+
+class RiderDispatchTests(TestCase):
+    def setUp(self):
+        rider_index.invalidate()
+        self.pharmacist = User.objects.create_user(
+            username="pharma", password="pass", role="pharmacist", latitude=9.93, longitude=76.26
+        )
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+
+    def rider(self, name, km_north):
+        return User.objects.create_user(
+            username=name, password="pass", role="delivery",
+            latitude=9.93 + km_north / 111.195, longitude=76.26,
+        )
+
+    def test_grid_matches_brute_force(self):
+        rng = random.Random(7)
+        points = [(i, 9.5 + rng.random(), 76 + rng.random()) for i in range(500)]
+        grid = GridIndex(points, cell_km=2.0)
+        for _ in range(20):
+            lat, lon = 9.5 + rng.random(), 76 + rng.random()
+            expected = sorted((haversine_km(lat, lon, plat, plon), key) for key, plat, plon in points)
+            self.assertEqual(grid.nearby(lat, lon, limit=5), expected[:5])
+            within = [pair for pair in expected if pair[0] <= 10]
+            self.assertEqual(grid.nearby(lat, lon, limit=500, max_km=10), within)
+
+    def test_nearest_idle_rider_ranks_first(self):
+        near = self.rider("near", 1)
+        far = self.rider("far", 5)
+        self.rider("too_far", 40)
+        ranked = rank_riders(self.pharmacist)
+        self.assertEqual([candidate["rider"] for candidate in ranked], [near, far])
+        self.assertAlmostEqual(ranked[0]["distance_km"], 1, places=1)
+
+    def test_open_load_and_lateness_count_against_a_rider(self):
+        busy = self.rider("busy", 1)
+        free = self.rider("free", 2)
+        for _ in range(2):
+            order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+            Delivery.objects.create(order=order, assigned_to=busy)
+        ranked = rank_riders(self.pharmacist)
+        self.assertEqual(ranked[0]["rider"], free)
+        self.assertEqual(ranked[1]["open_load"], 2)
+
+        now = timezone.now()
+        late = self.rider("late", 0.5)
+        for _ in range(3):
+            order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+            Delivery.objects.create(
+                order=order, assigned_to=late, status="delivered",
+                delivered_at=now, expected_delivery_time=now - timedelta(hours=1),
+            )
+        rider_index.invalidate()
+        self.assertEqual(rank_riders(self.pharmacist)[0]["rider"], free)
+
+    def test_auto_assign_view(self):
+        rider = self.rider("near", 1)
+        order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+        self.client.force_login(self.pharmacist)
+        response = self.client.post(f"/deliveries/assign/{order.id}/auto/")
+        self.assertRedirects(response, "/deliveries/unassigned-orders/", fetch_redirect_response=False)
+        delivery = Delivery.objects.get(order=order)
+        self.assertEqual((delivery.assigned_to, delivery.status), (rider, "assigned"))
+
+    def test_auto_assign_twice_keeps_the_first_rider(self):
+        first = self.rider("first", 2)
+        order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+        self.client.force_login(self.pharmacist)
+        self.client.post(f"/deliveries/assign/{order.id}/auto/")
+
+        self.rider("closer", 0.5)
+        rider_index.invalidate()
+        response = self.client.post(f"/deliveries/assign/{order.id}/auto/", follow=True)
+        self.assertContains(response, "already assigned")
+        delivery = Delivery.objects.get(order=order)
+        self.assertEqual((delivery.assigned_to, delivery.status), (first, "assigned"))
+
+        Delivery.objects.filter(pk=delivery.pk).update(status="picked")
+        self.client.post(f"/deliveries/assign/{order.id}/auto/")
+        delivery.refresh_from_db()
+        self.assertEqual((delivery.assigned_to, delivery.status), (first, "picked"))
+
+    def test_auto_assign_without_riders(self):
+        order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+        self.client.force_login(self.pharmacist)
+        self.client.post(f"/deliveries/assign/{order.id}/auto/")
+        self.assertFalse(Delivery.objects.filter(order=order).exists())
+
+
+class RoutePlannerTests(TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(
+            username="pharma", password="pass", role="pharmacist", latitude=10.0, longitude=76.0
+        )
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.rider = User.objects.create_user(
+            username="rider", password="pass", role="delivery", latitude=10.0, longitude=75.99
+        )
+
+    def deliver_to(self, km_east, status="assigned"):
+        order = Order.objects.create(
+            patient=self.patient, pharmacy=self.pharmacist, latitude=10.0, longitude=76.0 + km_east / 109.5
+        )
+        return Delivery.objects.create(order=order, assigned_to=self.rider, status=status)
+
+    def test_two_opt_never_lengthens_the_path(self):
+        rng = random.Random(3)
+        points = [(10 + rng.random() / 10, 76 + rng.random() / 10) for _ in range(12)]
+        matrix = distance_matrix(points)
+        greedy = nearest_neighbour(0, range(1, 12), matrix)
+        improved = two_opt(0, greedy, matrix)
+        self.assertEqual(sorted(improved), list(range(1, 12)))
+        self.assertLessEqual(path_length([0] + improved, matrix), path_length([0] + greedy, matrix))
+
+    def test_crossed_path_is_uncrossed(self):
+        points = [(0, 0), (0, 0.01), (0, 0.03), (0, 0.02)]
+        matrix = distance_matrix(points)
+        self.assertEqual(two_opt(0, [2, 1, 3], matrix), [1, 3, 2])
+
+    def test_plan_orders_drops_and_sets_eta(self):
+        far = self.deliver_to(6)
+        near = self.deliver_to(1)
+        middle = self.deliver_to(3, status="picked")
+        done = self.deliver_to(2, status="delivered")
+        start = timezone.now()
+
+        route = plan_route(self.rider, start_time=start)
+
+        self.assertEqual(route, [near, middle, far])
+        for delivery in (near, middle, far, done):
+            delivery.refresh_from_db()
+        self.assertEqual([near.route_sequence, middle.route_sequence, far.route_sequence], [1, 2, 3])
+        self.assertIsNone(done.route_sequence)
+        # ~1.1 km to the pharmacy + 1 km at 25 km/h, plus a pickup stop and a drop stop
+        self.assertAlmostEqual((near.planned_eta - start).total_seconds() / 60, 15.0, delta=0.2)
+        self.assertLess(near.planned_eta, middle.planned_eta)
+        self.assertLess(middle.planned_eta, far.planned_eta)
+
+    def test_plan_keeps_the_promised_time(self):
+        promised = timezone.now() - timedelta(hours=1)
+        delivery = self.deliver_to(1)
+        Delivery.objects.filter(pk=delivery.pk).update(expected_delivery_time=promised)
+
+        plan_route(self.rider)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.expected_delivery_time, promised)
+        self.assertGreater(delivery.planned_eta, promised)
+
+    def test_assignment_replans_route(self):
+        order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist, latitude=10.0, longitude=76.01)
+        self.client.force_login(self.pharmacist)
+        Delivery.objects.create(order=Order.objects.create(patient=self.patient, pharmacy=self.pharmacist), assigned_to=self.rider)
+        self.client.post(f"/deliveries/assign/{order.id}/", {"assigned_to": self.rider.id})
+        self.assertEqual(Delivery.objects.get(order=order).route_sequence, 1)
+
+    def test_plan_my_route_view(self):
+        self.deliver_to(1)
+        self.client.force_login(self.rider)
+        response = self.client.post("/deliveries/plan-route/")
+        self.assertRedirects(response, "/deliveries/", fetch_redirect_response=False)
+        self.assertEqual(Delivery.objects.get().route_sequence, 1)
+
+
+TEST_OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="10.00" lon="76.00"/>
+  <node id="2" lat="10.00" lon="76.01"/>
+  <node id="3" lat="10.01" lon="76.00"/>
+  <node id="4" lat="10.01" lon="76.01"/>
+  <way id="10"><nd ref="1"/><nd ref="3"/><nd ref="4"/><nd ref="2"/><tag k="highway" v="residential"/></way>
+  <way id="11"><nd ref="2"/><nd ref="1"/><tag k="highway" v="primary"/><tag k="oneway" v="yes"/></way>
+  <way id="12"><nd ref="1"/><nd ref="2"/><tag k="highway" v="footway"/></way>
+</osm>
+"""
+
+
+class RoadRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        osm = os.path.join(tmp.name, "extract.osm")
+        with open(osm, "w") as fh:
+            fh.write(TEST_OSM)
+        self.graph_path = os.path.join(tmp.name, "roads.graph")
+        call_command("build_road_graph", osm, out=self.graph_path, stdout=io.StringIO())
+        settings_override = override_settings(ROAD_GRAPH_PATH=self.graph_path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_graph_is_compact_and_skips_footways(self):
+        graph = RoadGraph.load(self.graph_path)
+        self.assertEqual(len(graph), 4)
+        # three two-way residential segments + one oneway primary
+        self.assertEqual(len(graph.targets), 7)
+        self.assertEqual(graph.offsets[-1], len(graph.targets))
+
+    def test_oneway_forces_a_detour(self):
+        there = find_route((10.0, 76.0), (10.0, 76.01))
+        back = find_route((10.0, 76.01), (10.0, 76.0))
+        self.assertEqual((there["source"], back["source"]), ("road", "road"))
+        self.assertEqual(there["path"], [[10.0, 76.0], [10.01, 76.0], [10.01, 76.01], [10.0, 76.01]])
+        self.assertAlmostEqual(there["distance_km"], 3.3, delta=0.05)
+        self.assertAlmostEqual(back["distance_km"], 1.1, delta=0.05)
+        self.assertEqual(back["eta_minutes"], 1)  # 1.1 km at 45 km/h
+
+    def test_zero_maxspeed_keeps_the_road_default(self):
+        osm = os.path.join(os.path.dirname(self.graph_path), "zero.osm")
+        with open(osm, "w") as fh:
+            fh.write(TEST_OSM.replace('<tag k="oneway" v="yes"/>', '<tag k="oneway" v="yes"/><tag k="maxspeed" v="0"/>'))
+        graph = RoadGraph.from_osm(osm)
+        self.assertEqual(min(graph.speeds), 25)
+        self.assertEqual(max(graph.speeds), 45)
+
+        graph.speeds = array("B", [0] * len(graph.targets))  # a graph file built before the fix
+        self.assertEqual(road_route(graph, (10.0, 76.01), (10.0, 76.0))["source"], "road")
+
+    def test_routes_are_cached_per_cell_pair(self):
+        route = find_route((10.0, 76.0), (10.0, 76.01))
+        self.assertEqual(cache.get(route_cache_key((10.0, 76.0), (10.0, 76.01))), route)
+        self.assertEqual(find_route((10.0001, 76.0001), (10.0, 76.0101)), route)
+
+    def test_far_from_roads_falls_back_to_straight_line(self):
+        route = find_route((12.0, 77.0), (10.0, 76.0))
+        self.assertEqual(route["source"], "straight")
+        self.assertEqual(route["path"], [[12.0, 77.0], [10.0, 76.0]])
+
+    def test_missing_graph_falls_back_to_straight_line(self):
+        with override_settings(ROAD_GRAPH_PATH=self.graph_path + ".missing"):
+            self.assertEqual(find_route((10.0, 76.0), (10.0, 76.01))["source"], "straight")
+
+    def test_simplify_drops_collinear_points(self):
+        line = [(10.0, 76.0 + i / 1000) for i in range(10)] + [(10.01, 76.009)]
+        self.assertEqual(simplify(line, 0.01), [line[0], line[9], line[10]])
+
+    def test_track_route_shows_road_distance(self):
+        pharmacist = User.objects.create_user(
+            username="pharma", password="pass", role="pharmacist", latitude=10.0, longitude=76.0
+        )
+        patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        order = Order.objects.create(patient=patient, pharmacy=pharmacist, latitude=10.0, longitude=76.01)
+        delivery = Delivery.objects.create(order=order)
+        self.client.force_login(patient)
+        response = self.client.get(f"/deliveries/deliveries/{delivery.id}/track/")
+        self.assertEqual(response.context["route"]["source"], "road")
+        self.assertContains(response, "3.3")
+        self.assertContains(response, "const pharmacy = [10.0, 76.0];")
+
+    def test_track_route_without_pharmacy_location(self):
+        pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        order = Order.objects.create(patient=patient, pharmacy=pharmacist, latitude=10.0, longitude=76.01)
+        delivery = Delivery.objects.create(order=order)
+        self.client.force_login(patient)
+        response = self.client.get(f"/deliveries/deliveries/{delivery.id}/track/")
+        self.assertRedirects(response, reverse("dashboard"), fetch_redirect_response=False)
+
+
+class LiveLocationTests(TestCase):
+    def setUp(self):
+        fixes.take()
+        self.pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.rider = User.objects.create_user(username="rider", password="pass", role="delivery")
+        order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+        self.delivery = Delivery.objects.create(order=order, assigned_to=self.rider)
+        self.rider_client = AsyncClient()
+        self.rider_client.force_login(self.rider)
+
+    def post_fix(self, payload):
+        return self.client.post("/deliveries/location/", json.dumps(payload), content_type="application/json")
+
+    def test_ingest_validation(self):
+        self.client.force_login(self.patient)
+        self.assertEqual(self.post_fix({"lat": 10, "lon": 76}).status_code, 403)
+        self.client.force_login(self.rider)
+        self.assertEqual(self.client.get("/deliveries/location/").status_code, 405)
+        self.assertEqual(self.client.post("/deliveries/location/", "{", content_type="application/json").status_code, 400)
+        self.assertEqual(self.post_fix({"lat": 95, "lon": 76}).status_code, 400)
+        self.assertEqual(self.post_fix({"fixes": []}).status_code, 400)
+        self.assertEqual(self.post_fix({"fixes": [{"lat": 10, "lon": 76}, {"lat": 10.1, "lon": 76}]}).json(), {"accepted": 2})
+
+    @override_settings(LOCATION_FLUSH_SECONDS=3600)
+    def test_fixes_are_persisted_in_batches(self):
+        self.client.force_login(self.rider)
+        now = timezone.now().timestamp()
+        for i in range(3):
+            self.assertEqual(self.post_fix({"lat": 10 + i / 100, "lon": 76, "ts": now + i}).status_code, 202)
+        self.rider.refresh_from_db()
+        self.assertIsNone(self.rider.latitude)
+
+        with self.assertNumQueries(2):  # rider positions + deliveries on board
+            self.assertEqual(fixes.flush(), 1)
+        self.rider.refresh_from_db()
+        self.assertEqual((self.rider.latitude, self.rider.longitude), (10.02, 76))
+        self.assertAlmostEqual(self.rider.location_updated_at.timestamp(), now + 2, places=3)
+
+    @override_settings(LOCATION_FLUSH_SECONDS=0)
+    def test_due_flush_happens_on_ingest(self):
+        self.client.force_login(self.rider)
+        self.post_fix({"lat": 10, "lon": 76})
+        self.rider.refresh_from_db()
+        self.assertEqual(self.rider.latitude, 10)
+
+    def test_stream_is_limited_to_the_orders_people(self):
+        stranger = User.objects.create_user(username="other", password="pass", role="patient")
+        self.client.force_login(stranger)
+        self.assertEqual(self.client.get(f"/deliveries/deliveries/{self.delivery.id}/live/").status_code, 403)
+
+    def test_delivered_orders_cannot_be_watched(self):
+        Delivery.objects.filter(pk=self.delivery.pk).update(status="delivered")
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(f"/deliveries/deliveries/{self.delivery.id}/live/").status_code, 403)
+
+    @override_settings(LOCATION_SSE_KEEPALIVE=0.05, LOCATION_SSE_MAX_SECONDS=5)
+    async def test_stream_ends_when_the_delivery_is_delivered(self):
+        watcher = AsyncClient()
+        await sync_to_async(watcher.force_login)(self.patient)
+        response = await watcher.get(f"/deliveries/deliveries/{self.delivery.id}/live/")
+        stream = response.streaming_content.__aiter__()
+        self.assertEqual(await stream.__anext__(), b"retry: 3000\n\n")
+        self.assertEqual(await stream.__anext__(), b": keepalive\n\n")
+
+        await Delivery.objects.filter(pk=self.delivery.pk).aupdate(status="delivered")
+        events = [event async for event in stream]
+        self.assertEqual(events[-1], b"event: end\ndata: {}\n\n")
+        self.assertEqual(hub.watchers(self.rider.pk), 0)
+
+    @override_settings(LOCATION_SSE_MAX_SECONDS=5, LOCATION_FLUSH_SECONDS=3600)
+    async def test_stream_pushes_rider_fixes(self):
+        watcher = AsyncClient()
+        await sync_to_async(watcher.force_login)(self.patient)
+        response = await watcher.get(f"/deliveries/deliveries/{self.delivery.id}/live/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content.__aiter__()
+        self.assertEqual(await stream.__anext__(), b"retry: 3000\n\n")
+
+        next_event = asyncio.ensure_future(stream.__anext__())
+        while not hub.watchers(self.rider.pk):
+            await asyncio.sleep(0.01)
+        response = await self.rider_client.post(
+            "/deliveries/location/", {"lat": 9.98, "lon": 76.28, "ts": 1700000000}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 202)
+
+        event = (await asyncio.wait_for(next_event, timeout=2)).decode()
+        self.assertTrue(event.startswith("event: location\n"))
+        self.assertEqual(json.loads(event.split("data: ", 1)[1]), {"lat": 9.98, "lon": 76.28, "ts": 1700000000, "speed": None})
+        await stream.aclose()
+
+
+class DeliveryTraceTests(TestCase):
+    def setUp(self):
+        fixes.take()
+        pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.rider = User.objects.create_user(username="rider", password="pass", role="delivery")
+        self.delivery = Delivery.objects.create(
+            order=Order.objects.create(patient=patient, pharmacy=pharmacist),
+            assigned_to=self.rider, status="picked", picked_at=timezone.now() - timedelta(minutes=30),
+            verification_code="123456",
+        )
+        self.start = self.delivery.picked_at.timestamp()
+
+    def fixes_east(self, count, start_km=0, after=0, every=2):
+        """One fix every ``every`` seconds from ``after`` s past pickup, moving ~10 m east each time."""
+        return [
+            {"lat": 10.0, "lon": 76.0 + (start_km + i * 0.01) / 109.5, "ts": self.start + 1 + after + i * every, "speed": None}
+            for i in range(count)
+        ]
+
+    def test_round_trip_is_exact_to_a_metre_and_compact(self):
+        rng = random.Random(5)
+        lats = [10 + rng.random() / 100 for _ in range(500)]
+        lons = [76 + rng.random() / 100 for _ in range(500)]
+        times = [1_700_000_000 + i * 3 for i in range(500)]
+        blob = bytes([1]) + encode(lats, lons, times)
+        decoded = decode(blob)
+        self.assertEqual(list(decoded[2]), times)
+        for original, restored in ((lats, decoded[0]), (lons, decoded[1])):
+            self.assertTrue(all(abs(a - b) <= 0.5e-5 for a, b in zip(original, restored)))
+        self.assertLess(len(blob), 500 * 9)
+
+    def test_flushes_append_to_the_trace(self):
+        before_pickup = {"lat": 11.0, "lon": 77.0, "ts": self.start - 60, "speed": None}
+        record_traces({self.rider.pk: [before_pickup] + self.fixes_east(50)})
+        record_traces({self.rider.pk: self.fixes_east(50, start_km=0.5, after=100)})
+        trace = DeliveryTrace.objects.get(delivery=self.delivery)
+        self.assertEqual(trace.points, 100)
+        self.assertLess(len(trace.data), 100 * 6)
+        lats, lons, times = decode(trace.data)
+        self.assertEqual(list(times), sorted(times))
+        self.assertAlmostEqual(lons[-1], 76.0 + 0.99 / 109.5, places=5)
+
+    def test_flush_appends_without_reading_the_blob(self):
+        first, second = self.fixes_east(30), self.fixes_east(30, start_km=0.3, after=60)
+        record_traces({self.rider.pk: first})
+        with CaptureQueriesContext(connection) as queries:
+            record_traces({self.rider.pk: second})
+        self.assertFalse(any(
+            '"data"' in query["sql"] for query in queries.captured_queries if query["sql"].startswith("SELECT")
+        ))
+
+        trace = DeliveryTrace.objects.get(delivery=self.delivery)
+        both = first + second
+        expected = bytes([1]) + encode([f["lat"] for f in both], [f["lon"] for f in both], [f["ts"] for f in both])
+        self.assertEqual(bytes(trace.data), expected)
+        self.assertEqual((trace.points, trace.last_ts), (60, int(second[-1]["ts"])))
+
+    def test_only_picked_deliveries_are_traced(self):
+        self.delivery.status = "assigned"
+        self.delivery.save()
+        record_traces({self.rider.pk: self.fixes_east(5)})
+        self.assertFalse(DeliveryTrace.objects.exists())
+
+    def test_jitter_does_not_add_distance(self):
+        path = [[10.0, 76.0 + i / 10950] for i in range(101)]  # 1 km in 10 m steps
+        wobbly = [[lat + (0.00002 if i % 2 else -0.00002), lon] for i, (lat, lon) in enumerate(path)]
+        self.assertAlmostEqual(path_distance_km(wobbly), 1.0, delta=0.02)
+
+    def test_verify_code_sets_distance_from_trace(self):
+        self.client.force_login(self.rider)
+        fixes.add(self.rider.pk, self.fixes_east(201))  # 2 km, still buffered
+        self.client.post(f"/deliveries/verify/{self.delivery.id}/", {"verification_code": "123456"})
+        self.delivery.refresh_from_db()
+        self.assertEqual(self.delivery.status, "delivered")
+        self.assertAlmostEqual(self.delivery.distance, 2.0, delta=0.03)
+
+    def test_track_route_draws_simplified_trace(self):
+        record_traces({self.rider.pk: self.fixes_east(101)})
+        pharmacy, order = self.delivery.order.pharmacy, self.delivery.order
+        User.objects.filter(pk=pharmacy.pk).update(latitude=10.0, longitude=76.0)
+        Order.objects.filter(pk=order.pk).update(latitude=10.0, longitude=76.01)
+        self.client.force_login(self.rider)
+        response = self.client.get(f"/deliveries/deliveries/{self.delivery.id}/track/")
+        self.assertEqual(len(response.context["trace"]), 2)  # a straight run needs only its ends
@@ -0,0 +1,173 @@
+# deliveries/traces.py
+"""
+Compact GPS traces for deliveries.
+
+A trace is one ``DeliveryTrace.data`` blob: a version byte followed by one
+record per fix, each being the zigzag-varint deltas of latitude and
+longitude (fixed point, 1e-5 degree ~ 1.1 m) and time (whole seconds) from
+the previous fix. A fix that moved a few metres a few seconds later costs
+3-6 bytes instead of a row. The last fix is also kept in fixed point on the
+trace, so new fixes are encoded against it and appended in the database
+(``data || new bytes``) without reading or rewriting the existing blob.
+
+Fixes reach a trace through ``deliveries.live.FixBuffer.flush``; only fixes
+taken while the parcel is on board (status "picked", after ``picked_at``)
+are kept.
+"""
+from array import array
+
+from django.conf import settings
+from django.db.models import BinaryField, F, Func, Value
+from django.utils import timezone
+
+from .dispatch import haversine_km
+from .models import Delivery, DeliveryTrace
+from .routing import simplify
+
+FORMAT_VERSION = 1
+SCALE = 100_000  # fixed-point degrees
+
+
+def _write_varint(out, value):
+    value = value << 1 if value >= 0 else ((-value) << 1) - 1  # zigzag
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode(lats, lons, times, previous=(0, 0, 0)):
+    """Record bytes for the fixes, as deltas from ``previous`` (fixed-point lat, lon, ts)."""
+    out = bytearray()
+    last_lat, last_lon, last_ts = previous
+    for lat, lon, ts in zip(lats, lons, times):
+        lat, lon, ts = round(lat * SCALE), round(lon * SCALE), int(ts)
+        _write_varint(out, lat - last_lat)
+        _write_varint(out, lon - last_lon)
+        _write_varint(out, ts - last_ts)
+        last_lat, last_lon, last_ts = lat, lon, ts
+    return bytes(out)
+
+
+def decode_fixed(data):
+    """Fixed-point (lat, lon, ts) arrays from a trace blob."""
+    lats, lons, times = array("q"), array("q"), array("q")
+    if not data:
+        return lats, lons, times
+    data = bytes(data)
+    if data[0] != FORMAT_VERSION:
+        raise ValueError(f"Unknown trace format {data[0]}")
+    columns = (lats, lons, times)
+    totals = [0, 0, 0]
+    column = value = shift = 0
+    for byte in data[1:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        totals[column] += (value >> 1) ^ -(value & 1)
+        columns[column].append(totals[column])
+        column = (column + 1) % 3
+        value = shift = 0
+    return lats, lons, times
+
+
+def decode(data):
+    """(lat, lon, ts) arrays (degrees and Unix seconds) from a trace blob."""
+    lats, lons, times = decode_fixed(data)
+    return array("d", (v / SCALE for v in lats)), array("d", (v / SCALE for v in lons)), times
+
+
+class AppendBytes(Func):
+    """``data || suffix`` for a binary column."""
+
+    arg_joiner = " || "
+    template = "(%(expressions)s)"
+    output_field = BinaryField()
+
+    def __init__(self, field, suffix):
+        super().__init__(field, Value(suffix, output_field=BinaryField()))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite concatenates blobs as text; cast the bytes back
+        return self.as_sql(compiler, connection, template="CAST((%(expressions)s) AS BLOB)", **extra_context)
+
+
+def append_fixes(trace, new_fixes):
+    """
+    Append fixes (dicts from ``parse_fixes``) to ``trace``; returns how many
+    were kept. For a saved trace ``data`` becomes an expression that appends
+    in the database, so save it with ``update()``/``bulk_update()``.
+    """
+    previous = (trace.last_lat, trace.last_lon, trace.last_ts) if trace.points else (0, 0, 0)
+    kept = sorted(
+        (fix for fix in new_fixes if fix["ts"] >= previous[2]),  # drop late stragglers
+        key=lambda fix: fix["ts"],
+    )
+    if not kept:
+        return 0
+    body = encode([f["lat"] for f in kept], [f["lon"] for f in kept], [f["ts"] for f in kept], previous)
+    if trace._state.adding:
+        trace.data = bytes([FORMAT_VERSION]) + body
+    else:
+        trace.data = AppendBytes(F("data"), body)
+    last = kept[-1]
+    trace.last_lat, trace.last_lon, trace.last_ts = round(last["lat"] * SCALE), round(last["lon"] * SCALE), int(last["ts"])
+    trace.points += len(kept)
+    return len(kept)
+
+
+def record_traces(pending):
+    """Add buffered fixes (rider id -> fixes) to the traces of the riders' picked deliveries."""
+    if not pending:
+        return 0
+    deliveries = list(
+        Delivery.objects.filter(assigned_to_id__in=list(pending), status="picked")
+        .only("id", "assigned_to_id", "picked_at")
+    )
+    traces = DeliveryTrace.objects.defer("data").in_bulk([delivery.pk for delivery in deliveries])
+    created, updated = [], []
+    now = timezone.now()
+    for delivery in deliveries:
+        since = delivery.picked_at.timestamp() if delivery.picked_at else 0
+        on_board = [fix for fix in pending[delivery.assigned_to_id] if fix["ts"] >= since]
+        trace = traces.get(delivery.pk) or DeliveryTrace(delivery_id=delivery.pk, data=b"")
+        if not on_board or not append_fixes(trace, on_board):
+            continue
+        trace.updated_at = now
+        (updated if delivery.pk in traces else created).append(trace)
+    DeliveryTrace.objects.bulk_create(created)
+    DeliveryTrace.objects.bulk_update(updated, ["data", "points", "last_lat", "last_lon", "last_ts", "updated_at"])
+    return len(created) + len(updated)
+
+
+def trace_path(delivery):
+    """The delivery's full trace as [[lat, lon], ...]."""
+    data = DeliveryTrace.objects.filter(delivery=delivery).values_list("data", flat=True).first()
+    lats, lons, _ = decode(data or b"")
+    return [[lat, lon] for lat, lon in zip(lats, lons)]
+
+
+def display_path(delivery):
+    """The trace simplified for drawing (TRACE_DISPLAY_TOLERANCE_KM)."""
+    return simplify(trace_path(delivery), getattr(settings, "TRACE_DISPLAY_TOLERANCE_KM", 0.01))
+
+
+def path_distance_km(path):
+    """Length of a path, ignoring GPS jitter below TRACE_JITTER_KM."""
+    path = simplify(path, getattr(settings, "TRACE_JITTER_KM", 0.005))
+    return sum(haversine_km(*a, *b) for a, b in zip(path, path[1:]))
+
+
+def finish_trace(delivery):
+    """
+    Flush buffered fixes and set ``delivery.distance`` from its trace (km).
+    Called as the delivery is marked delivered; the caller saves.
+    """
+    from .live import fixes
+
+    fixes.flush()
+    path = trace_path(delivery)
+    if len(path) > 1:
+        delivery.distance = round(path_distance_km(path), 2)
+    return delivery.distance
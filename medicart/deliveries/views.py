@@ -1,24 +1,50 @@
-from django.http import HttpResponseForbidden
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
 from django.contrib import messages
 
+from .dispatch import rank_riders
+from .live import fixes, hub, parse_fixes
+from .planner import coords, plan_route
+from .routing import find_route
+from .traces import display_path, finish_trace
+from .exports import DELIVERY_EXPORT_FIELDS
 from .models import Delivery
 from orders.models import Order
+from shop.utils import export_response, keyset_paginate
 from accounts.models import User 
 from django.utils.timezone import now
-from geopy.exc import GeocoderServiceError
-from geopy.geocoders import Nominatim  #type: ignore
 
-from django.core.mail import send_mail
-from django.conf import settings
-import traceback
+from django.db import transaction
+from accounts.mail import queue_email
 
 
 from django.contrib.auth.hashers import make_password
 
 
+@login_required
+def delivery_export(request):
+    """Stream the user's deliveries as CSV/JSONL (``?format=jsonl&gzip=1``)."""
+    user = request.user
+    if user.role == "pharmacist":
+        deliveries = Delivery.objects.filter(order__pharmacy=user)
+    elif user.is_delivery():
+        deliveries = Delivery.objects.filter(assigned_to=user)
+    elif user.is_staff or user.is_superuser:
+        deliveries = Delivery.objects.all()
+    else:
+        messages.error(request, "You are not allowed to export deliveries.")
+        return redirect("delivery_list")
+
+    return export_response(request, deliveries, DELIVERY_EXPORT_FIELDS, "deliveries")
+
+
 @login_required
 def delivery_list(request):
     user = request.user
@@ -65,13 +91,33 @@ def delivery_list(request):
         request,
         "delivery_list.html",
         {
-            "deliveries": deliveries,
+            "deliveries": keyset_paginate(
+                request,
+                deliveries.select_related("order", "assigned_to").only(
+                    "id", "status", "route_sequence", "planned_eta",
+                    "order__id", "assigned_to__username",
+                ),
+            ),
             "delivery_staff": delivery_staff,
         }
     )  
     
 
 
+@login_required
+def plan_my_route(request):
+    """Re-plan the rider's open deliveries into one multi-stop route."""
+    if request.method != "POST" or not request.user.is_delivery():
+        return redirect("delivery_list")
+
+    route = plan_route(request.user)
+    if route:
+        messages.success(request, f"Route planned: {len(route)} stop(s), last drop by {timezone.localtime(route[-1].planned_eta):%H:%M}.")
+    else:
+        messages.error(request, "No open deliveries with a delivery location to plan.")
+    return redirect("delivery_list")
+
+
 @login_required
 def delivery_detail(request, pk):
     """Delivery details page."""
@@ -168,6 +214,7 @@ def assign_delivery(request, order_id):
         delivery.assigned_to = person
         delivery.status = "assigned"
         delivery.save()
+        plan_route(person)
 
         return redirect("delivery_list")
 
@@ -184,6 +231,45 @@ def assign_delivery(request, order_id):
         },
     )
 
+@login_required
+@transaction.atomic
+def auto_assign_delivery(request, order_id):
+    """One-click assignment to the best-ranked rider (distance, open load, on-time record)."""
+    if not (request.user.is_superuser or request.user.role == "pharmacist"):
+        messages.error(request, "You don’t have permission to assign deliveries.")
+        return redirect("delivery_list")
+
+    if request.method != "POST":
+        return redirect("unassigned_orders")
+
+    order = get_object_or_404(Order.objects.select_related("pharmacy"), id=order_id)
+    if request.user.role == "pharmacist" and order.pharmacy != request.user:
+        return HttpResponseForbidden("Access denied")
+
+    # 🔒 Lock the order row so a second click waits, then sees the first one's delivery
+    Order.objects.select_for_update().filter(pk=order.pk).exists()
+    delivery = Delivery.objects.filter(order=order).first()
+    if delivery and (delivery.assigned_to_id or delivery.status != "assigned"):
+        messages.error(request, f"Order #{order.id} is already assigned.")
+        return redirect("unassigned_orders")
+
+    candidates = rank_riders(order.pharmacy, limit=1)
+    if not candidates:
+        messages.error(request, "No delivery person is available near this pharmacy.")
+        return redirect("unassigned_orders")
+
+    best = candidates[0]
+    delivery = delivery or Delivery(order=order)
+    delivery.assigned_to = best["rider"]
+    delivery.status = "assigned"
+    delivery.save()
+    plan_route(best["rider"])
+
+    distance = f" ({best['distance_km']} km away)" if best["distance_km"] is not None else ""
+    messages.success(request, f"Order #{order.id} assigned to {best['rider'].username}{distance}.")
+    return redirect("unassigned_orders")
+
+
 @login_required
 def unassigned_orders(request):
     """List orders that don't have deliveries assigned yet."""
@@ -211,9 +297,10 @@ def unassigned_orders(request):
 
 
 @login_required
+@transaction.atomic
 def mark_picked(request, pk):
     """Mark a delivery as picked up by the delivery person and send verification code."""
-    delivery = get_object_or_404(Delivery, pk=pk, assigned_to=request.user)
+    delivery = get_object_or_404(Delivery.objects.select_related("order__patient"), pk=pk, assigned_to=request.user)
     
     # Update status and timestamp
     delivery.status = "picked"
@@ -223,33 +310,15 @@ def mark_picked(request, pk):
     # ✅ Generate verification code
     delivery.generate_verification_code()  # Make sure this saves the code in the model
 
-    # ✅ Send code to patient via email
-    try:
-        print("📩 DEBUG: Sending verification code email...")
-        print(f"➡️ Recipient: {delivery.order.patient.email}")
-        print(f"➡️ Delivery ID: {delivery.id}")
-        print(f"➡️ Verification Code: {delivery.verification_code}")
-
-        subject = f"Your Order #{delivery.order.id} Verification Code"
-        message = (
+    # ✅ Queue the code for the patient (sent by send_outbox once this commits)
+    queue_email(
+        subject=f"Your Order #{delivery.order.id} Verification Code",
+        message=(
             f"Your verification code for order #{delivery.order.id} is "
             f"{delivery.verification_code}. Please share this only with the delivery agent."
-        )
-
-        sent = send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[delivery.order.patient.email],
-            fail_silently=False,
-        )
-        print(f"✅ Email send attempted. Return value: {sent}")
-
-    except Exception as e:
-        print("🔥 Email send failed!")
-        print("Error type:", type(e).__name__)
-        print("Error message:", str(e))
-        traceback.print_exc()
+        ),
+        recipient_list=[delivery.order.patient.email],
+    )
 
     messages.success(request, "Delivery marked as picked and code sent to patient.")
     return redirect("delivery_list")
@@ -259,6 +328,7 @@ def mark_picked(request, pk):
 def mark_delivered(request, pk):
     """Mark a delivery as delivered by delivery person."""
     delivery = get_object_or_404(Delivery, pk=pk, assigned_to=request.user)
+    finish_trace(delivery)  # 📏 distance from the recorded GPS trace
     delivery.status = "delivered"
     delivery.delivered_at = timezone.now()
     delivery.save()
@@ -271,12 +341,9 @@ def mark_delivered(request, pk):
 def track_route(request, delivery_id):
     delivery = get_object_or_404(Delivery, pk=delivery_id)
 
-    # Pickup coordinates from pharmacy
-    pharmacy = delivery.order.pharmacy
-    pickup = [pharmacy.latitude, pharmacy.longitude] if pharmacy else None
-
-    # Drop coordinates from order
-    drop = [delivery.order.latitude, delivery.order.longitude] if delivery.order.latitude and delivery.order.longitude else None
+    # Pickup coordinates from pharmacy, drop coordinates from order (0.0 is a valid coordinate)
+    pickup = coords(delivery.order.pharmacy)
+    drop = coords(delivery.order)
 
     if not pickup or not drop:
         messages.error(request, "Coordinates missing. Please check the pharmacy and delivery addresses.")
@@ -284,8 +351,10 @@ def track_route(request, delivery_id):
 
     context = {
         "delivery": delivery,
-        "pickup": pickup,
-        "drop": drop,
+        "pickup": list(pickup),  # rendered as JS arrays
+        "drop": list(drop),
+        "route": find_route(pickup, drop),
+        "trace": display_path(delivery),
     }
     return render(request, "track_route.html", context)
 
@@ -353,6 +422,7 @@ def verify_delivery_code(request, delivery_id):
         code_entered = request.POST.get("verification_code")
 
         if code_entered == delivery.verification_code:
+            finish_trace(delivery)  # 📏 distance from the recorded GPS trace
             delivery.status = "delivered"
             delivery.delivered_at = timezone.now()
             delivery.save()
@@ -363,6 +433,7 @@ def verify_delivery_code(request, delivery_id):
     return redirect("delivery_list")
 
 
+@transaction.atomic
 def register_delivery_person(request):
     if request.method == "POST":
         username = request.POST['username']
@@ -378,8 +449,8 @@ def register_delivery_person(request):
             is_active=True
         )
 
-        # Send email with login details
-        send_mail(
+        # Queue email with login details (sent by send_outbox)
+        queue_email(
             subject="Your PharmaCare Delivery Account",
             message=(
                 f"Hello {username},\n\n"
@@ -389,11 +460,123 @@ def register_delivery_person(request):
                 f"Please log in and change your password after first login.\n\n"
                 f"PharmaCare Team"
             ),
-            from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[email],
-            fail_silently=False,
         )
 
         return redirect('delivery_list')
 
-    return render(request, "register_delivery_person.html")
\ No newline at end of file
+    return render(request, "register_delivery_person.html")
+
+
+# ============================
+# LIVE LOCATION (async, served by medicart.asgi)
+# ============================
+@sync_to_async
+def current_user(request):
+    """request.user resolved off the event loop (None when anonymous)."""
+    return request.user if request.user.is_authenticated else None
+
+
+# Deliveries whose rider can be watched live
+LIVE_STATUSES = ("assigned", "picked")
+
+
+@sync_to_async
+def watched_delivery(user, delivery_id):
+    """The delivery if ``user`` may watch it now (it is still under way), else None."""
+    delivery = (
+        Delivery.objects.select_related("order", "assigned_to")
+        .filter(pk=delivery_id, status__in=LIVE_STATUSES)
+        .first()
+    )
+    if delivery is None:
+        return None
+    order = delivery.order
+    if user.is_staff or user.is_superuser or user.pk in (order.patient_id, order.pharmacy_id, delivery.assigned_to_id):
+        return delivery
+    return None
+
+
+async def location_ingest(request):
+    """Riders POST GPS fixes here as JSON (one fix or ``{"fixes": [...]}``)."""
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required."}, status=405)
+
+    user = await current_user(request)
+    if user is None or not user.is_delivery():
+        return JsonResponse({"error": "Only delivery staff can send locations."}, status=403)
+
+    try:
+        batch = parse_fixes(json.loads(request.body))
+    except ValueError as exc:  # includes malformed JSON
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    fixes.add(user.pk, batch)
+    hub.publish(user.pk, batch[-1])
+
+    # 📦 Persist in batches, not per fix
+    if fixes.due():
+        await sync_to_async(fixes.flush)()
+
+    return JsonResponse({"accepted": len(batch)}, status=202)
+
+
+def sse_event(fix):
+    return f"event: location\ndata: {json.dumps(fix)}\n\n"
+
+
+@sync_to_async
+def still_live(delivery_id):
+    return Delivery.objects.filter(pk=delivery_id, status__in=LIVE_STATUSES).exists()
+
+
+async def location_stream(request, delivery_id):
+    """Server-Sent Events with the assigned rider's position for ``delivery_id``."""
+    user = await current_user(request)
+    if user is None:
+        return HttpResponseForbidden("Login required")
+    delivery = await watched_delivery(user, delivery_id)
+    if delivery is None:
+        return HttpResponseForbidden("Access denied")
+    rider = delivery.assigned_to
+
+    keepalive = getattr(settings, "LOCATION_SSE_KEEPALIVE", 15)
+    lifetime = getattr(settings, "LOCATION_SSE_MAX_SECONDS", 300)
+
+    async def events():
+        yield "retry: 3000\n\n"  # EventSource reconnects after ``lifetime``
+        if rider is None:
+            return
+        queue = hub.subscribe(rider.pk)
+        try:
+            latest = fixes.latest(rider.pk)
+            if latest is None and rider.location_updated_at and rider.latitude is not None:
+                latest = {
+                    "lat": rider.latitude, "lon": rider.longitude,
+                    "ts": rider.location_updated_at.timestamp(), "speed": None,
+                }
+            if latest is not None:
+                yield sse_event(latest)
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + lifetime
+            next_check = loop.time() + keepalive
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    fix = await asyncio.wait_for(queue.get(), timeout=min(keepalive, remaining))
+                except asyncio.TimeoutError:
+                    fix = None
+                # 🛑 Stop once the delivery is done (checked at most every ``keepalive`` seconds)
+                if loop.time() >= next_check:
+                    if not await still_live(delivery.pk):
+                        yield "event: end\ndata: {}\n\n"
+                        return
+                    next_check = loop.time() + keepalive
+                yield sse_event(fix) if fix is not None else ": keepalive\n\n"
+        finally:
+            hub.unsubscribe(rider.pk, queue)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let a proxy hold events back
+    return response
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'orders',
     'prescriptions',
     'deliveries',
+    'reports',
     'widget_tweaks',
 
 ]
@@ -145,4 +146,70 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Media files (uploads)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Medicine autocomplete: rebuild the in-memory index this often (seconds)
+MEDICINE_AUTOCOMPLETE_REFRESH = 300
+
+# Rows per page for keyset-paginated list views
+LIST_PAGE_SIZE = 25
+
+# Geocoding: the offline gazetteer answers inline; anything it does not know
+# is queued for `manage.py geocode_worker`, which falls back to Nominatim.
+# Gazetteer CSV columns: name,kind,latitude,longitude,parent
+GEOCODER_BACKEND = 'accounts.geocoding.GazetteerGeocoder'
+GEOCODER_GAZETTEER_PATH = BASE_DIR / 'data' / 'gazetteer.csv'
+GEOCODER_FALLBACK = 'accounts.geocoding.NominatimGeocoder'  # None = fully offline
+GEOCODE_MAX_ATTEMPTS = 5
+GEOCODE_RETRY_BASE_SECONDS = 30
+GEOCODE_LEASE_SECONDS = 300
+GEOCODE_CACHE_SIZE = 10000       # addresses kept in each process' LRU
+GEOCODE_NEGATIVE_TTL = 86400     # seconds a "not found" answer is trusted
+
+# Checkout stock holds expire after this many seconds (`manage.py sweep_stock_holds`)
+STOCK_HOLD_TTL = 900
+
+# Dashboard numbers are cached for this many seconds (dropped early on writes)
+DASHBOARD_STATS_TTL = 60
+
+# Background reports (`manage.py report_worker`): artifacts under MEDIA_ROOT/reports/
+REPORT_RETENTION_DAYS = 7     # finished reports are deleted after this
+REPORT_LEASE_SECONDS = 600    # a running job is retried if its worker goes quiet this long
+REPORT_PROGRESS_EVERY = 5000  # rows between progress updates
+
+# Email outbox (`manage.py send_outbox`)
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 60  # doubles after each failed attempt
+EMAIL_OUTBOX_LEASE_SECONDS = 300
+
+# Rider auto-assign: riders are found through a grid index of their saved
+# locations; lower score wins (km + open deliveries + late-delivery share)
+DISPATCH_GRID_CELL_KM = 2.0
+DISPATCH_MAX_KM = 15          # riders further than this from the pharmacy are ignored
+DISPATCH_CANDIDATES = 50      # nearest riders scored per order
+DISPATCH_INDEX_REFRESH = 60   # seconds before the rider grid is rebuilt
+DISPATCH_WEIGHTS = {"km": 1.0, "open_delivery": 2.0, "late": 5.0}
+
+# Rider route planning (nearest-neighbour + 2-opt)
+DELIVERY_AVERAGE_SPEED_KMH = 25
+DELIVERY_STOP_MINUTES = 5
+
+# Road routing for track_route (`manage.py build_road_graph extract.osm`);
+# falls back to a straight line when the graph file is missing
+ROAD_GRAPH_PATH = BASE_DIR / 'data' / 'roads.graph'
+ROUTE_CACHE_CELL_KM = 0.25    # routes are cached per (pickup cell, drop cell)
+ROUTE_CACHE_TTL = 86400
+ROUTE_SNAP_MAX_KM = 1.0       # furthest a pickup/drop may be from the nearest road
+ROUTE_SIMPLIFY_KM = 0.01      # Douglas-Peucker tolerance for the drawn polyline
+
+# Live rider locations (SSE needs an ASGI server, e.g. `uvicorn medicart.asgi:application`)
+LOCATION_FLUSH_SECONDS = 5        # buffered fixes are written at most this often
+LOCATION_BUFFER_MAX_FIXES = 600   # per rider between flushes
+LOCATION_MAX_BATCH = 500          # fixes accepted in one POST
+LOCATION_SUBSCRIBER_QUEUE = 16    # pending fixes per watcher before the oldest is dropped
+LOCATION_SSE_KEEPALIVE = 15
+LOCATION_SSE_MAX_SECONDS = 300    # streams end after this; EventSource reconnects
+
+# Delivery GPS traces (delta-encoded blobs in DeliveryTrace)
+TRACE_JITTER_KM = 0.005             # wobble ignored when measuring Delivery.distance
+TRACE_DISPLAY_TOLERANCE_KM = 0.01   # Douglas-Peucker tolerance for the map
@@ -26,6 +26,7 @@ urlpatterns = [
     path('deliveries/', include('deliveries.urls')),
     path('prescriptions/', include('prescriptions.urls')),
     path('shop/', include('shop.urls')),
+    path('reports/', include('reports.urls')),
 ]
 
 if settings.DEBUG:
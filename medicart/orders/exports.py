@@ -0,0 +1,7 @@
+# orders/exports.py
+"""Columns of the order export, shared by the export view and report jobs."""
+
+ORDER_EXPORT_FIELDS = (
+    "id", "order_number", "created_at", "status", "payment_status", "payment_method", "total_amount",
+    "patient__username", "pharmacy__pharmacy_name", "delivery_address",
+)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.models import DailySales, Order
+from orders.sales import rebuild_daily_sales
+from shop.utils import local_day_start
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailySales rollup from order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Only rebuild days from this local date (YYYY-MM-DD) on.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Orders fetched per round trip.")
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        rollups = DailySales.objects.all()
+        if options["since"]:
+            start = local_day_start(options["since"])
+            if start is None:
+                raise CommandError("--since must be a date like 2025-01-31.")
+            orders = orders.filter(created_at__gte=start)
+            rollups = rollups.filter(day__gte=start.date())
+
+        scanned, days = rebuild_daily_sales(orders, rollups, chunk_size=options["chunk_size"])
+        self.stdout.write(f"Rolled up {scanned} order(s) into {days} daily row(s).")
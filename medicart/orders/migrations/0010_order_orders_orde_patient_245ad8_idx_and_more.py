@@ -0,0 +1,21 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['patient', 'status', 'payment_status', 'created_at'], name='orders_orde_patient_245ad8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['pharmacy', 'status', 'payment_status', 'created_at'], name='orders_orde_pharmac_cd2c43_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_daily_sales(apps, schema_editor):
+    from orders.sales import rebuild_daily_sales
+
+    Order = apps.get_model("orders", "Order")
+    DailySales = apps.get_model("orders", "DailySales")
+    rebuild_daily_sales(Order.objects.all(), DailySales.objects.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0010_order_orders_orde_patient_245ad8_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('pharmacy', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='orders_dail_day_982878_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('pharmacy', 'day'), name='orders_dailysales_pharmacy_day'),
+        ),
+        migrations.RunPython(backfill_daily_sales, migrations.RunPython.noop),
+    ]
@@ -45,6 +45,15 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     delivery_address = models.TextField(blank=True,null=True)
+    # Issued by checkout; a retried payment_success finds the order by it
+    idempotency_key = models.CharField(max_length=64, unique=True, editable=False, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # order_list filters for patients and pharmacists
+            models.Index(fields=["patient", "status", "payment_status", "created_at"]),
+            models.Index(fields=["pharmacy", "status", "payment_status", "created_at"]),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.order_number:
@@ -68,4 +77,27 @@ class OrderItem(models.Model):
 
 
     def line_total(self):
-        return self.quantity * self.price
\ No newline at end of file
+        return self.quantity * self.price
+
+
+class DailySales(models.Model):
+    """
+    Paid, non-cancelled orders rolled up per pharmacy and local day.
+
+    Filled from the order history when the table is created (migration
+    0011), then kept current by ``orders.signals``; ``manage.py
+    backfill_daily_sales`` rebuilds it. Rows outlive a deleted pharmacy.
+    """
+
+    pharmacy = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL, related_name='daily_sales')
+    day = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["pharmacy", "day"], name="orders_dailysales_pharmacy_day")]
+        indexes = [models.Index(fields=["day"])]  # all-pharmacy reports
+
+    def __str__(self):
+        return f"{self.pharmacy_id} {self.day}: {self.revenue}"
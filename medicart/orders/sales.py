@@ -0,0 +1,115 @@
+# orders/sales.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DailySales, OrderItem
+
+# Orders that count as sales in the DailySales rollup
+SALE_FILTER = Q(payment_status="paid") & ~Q(status="cancelled")
+
+
+def sale_key(order):
+    """
+    ``(pharmacy_id, local day, total_amount)`` if ``order`` (a model
+    instance or a values() dict) counts as a sale, else None.
+    """
+    get = order.get if isinstance(order, dict) else lambda name: getattr(order, name)
+    if get("payment_status") != "paid" or get("status") == "cancelled" or not get("created_at"):
+        return None
+    return get("pharmacy_id"), timezone.localdate(get("created_at")), Decimal(get("total_amount") or 0)
+
+
+def order_item_count(order_id):
+    return OrderItem.objects.filter(order_id=order_id).aggregate(
+        count=Coalesce(Sum("quantity"), 0)
+    )["count"]
+
+
+def apply_sale(pharmacy_id, day, orders, revenue, items):
+    """Add to one DailySales row (negative numbers subtract), creating it if needed."""
+    rows = DailySales.objects.filter(pharmacy_id=pharmacy_id, day=day)
+    changes = {
+        "order_count": F("order_count") + orders,
+        "revenue": F("revenue") + revenue,
+        "item_count": F("item_count") + items,
+    }
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailySales.objects.create(
+                pharmacy_id=pharmacy_id, day=day, order_count=orders, revenue=revenue, item_count=items
+            )
+    except IntegrityError:  # created concurrently
+        rows.update(**changes)
+
+
+def move_sale(order_id, before, after, items=None):
+    """Replace an order's contribution ``before`` with ``after`` (either may be None)."""
+    if before == after:
+        return
+    if items is None:
+        items = order_item_count(order_id)
+    if before:
+        pharmacy_id, day, amount = before
+        apply_sale(pharmacy_id, day, -1, -amount, -items)
+    if after:
+        pharmacy_id, day, amount = after
+        apply_sale(pharmacy_id, day, 1, amount, items)
+
+
+def record_sale_items(order, quantity):
+    """Count items bulk-created after ``order`` was saved (no signals fire for them)."""
+    key = sale_key(order)
+    if key and quantity:
+        pharmacy_id, day, _ = key
+        apply_sale(pharmacy_id, day, 0, 0, quantity)
+
+
+def rebuild_daily_sales(orders, rollups, chunk_size=2000):
+    """
+    Replace ``rollups`` (a DailySales queryset) with totals computed from
+    ``orders``; returns (orders scanned, rows written). Takes querysets so
+    the migration that creates the table can run it on historical models.
+    """
+    rows = (
+        orders.filter(SALE_FILTER)
+        .annotate(item_count=Coalesce(Sum("items__quantity"), 0))
+        .values_list("pharmacy_id", "created_at", "total_amount", "item_count")
+        .order_by()
+    )
+    totals = defaultdict(lambda: [0, Decimal("0.00"), 0])
+    scanned = 0
+    with transaction.atomic():
+        for pharmacy_id, created_at, amount, items in rows.iterator(chunk_size=chunk_size):
+            total = totals[pharmacy_id, timezone.localdate(created_at)]
+            total[0] += 1
+            total[1] += amount
+            total[2] += items
+            scanned += 1
+        rollups.delete()
+        rollups.model.objects.bulk_create(
+            [
+                rollups.model(pharmacy_id=pharmacy_id, day=day, order_count=count, revenue=revenue, item_count=items)
+                for (pharmacy_id, day), (count, revenue, items) in totals.items()
+            ],
+            batch_size=chunk_size,
+        )
+    return scanned, len(totals)
+
+
+def sales_totals(start, end, pharmacy=None):
+    """Orders, revenue and items over the half-open day range [start, end)."""
+    rows = DailySales.objects.filter(day__gte=start, day__lt=end)
+    if pharmacy is not None:
+        rows = rows.filter(pharmacy=pharmacy)
+    return rows.aggregate(
+        orders=Coalesce(Sum("order_count"), 0),
+        revenue=Coalesce(Sum("revenue"), Decimal("0.00")),
+        items=Coalesce(Sum("item_count"), 0),
+    )
@@ -0,0 +1,28 @@
+# orders/signals.py
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Order
+from .sales import move_sale, sale_key
+
+SALE_FIELDS = ("status", "payment_status", "pharmacy_id", "created_at", "total_amount")
+
+
+@receiver(pre_save, sender=Order)
+def remember_sale(sender, instance, **kwargs):
+    before = None
+    if not instance._state.adding:
+        before = Order.objects.filter(pk=instance.pk).values(*SALE_FIELDS).first()
+    instance._sale_before = sale_key(before) if before else None
+
+
+@receiver(post_save, sender=Order)
+def update_daily_sales(sender, instance, **kwargs):
+    move_sale(instance.pk, getattr(instance, "_sale_before", None), sale_key(instance))
+    instance._sale_before = sale_key(instance)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_daily_sales(sender, instance, **kwargs):
+    # pre_delete: the items are still there to be counted before the cascade
+    move_sale(instance.pk, sale_key(instance), None)
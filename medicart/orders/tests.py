@@ -1,3 +1,159 @@
+import os
+from datetime import datetime
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
 
 # Create your tests here.
+from accounts.models import User
+from shop.models import Medicine
+from shop.tests import ListQueryCountMixin, QueryPlanMixin
+from .models import DailySales, Order, OrderItem
+from .sales import rebuild_daily_sales
+
+
+class OrderQueryCountTests(ListQueryCountMixin, TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(
+            username="pharma", password="pass", role="pharmacist", pharmacy_name="City Pharmacy"
+        )
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+
+    def add_items(self, count):
+        for _ in range(count):
+            medicine = Medicine.objects.create(name="Paracetamol", pharmacy=self.pharmacist, price=10)
+            OrderItem.objects.create(
+                order=self.order, medicine=medicine, pharmacy=self.pharmacist, quantity=1, price=10
+            )
+
+    def test_order_list_as_pharmacist(self):
+        self.client.force_login(self.pharmacist)
+        self.assertListQueries("/orders/", self.add_orders, 3)
+
+    def test_order_list_as_patient(self):
+        self.client.force_login(self.patient)
+        self.assertListQueries("/orders/", self.add_orders, 3)
+
+    def test_order_detail(self):
+        self.client.force_login(self.patient)
+        self.assertListQueries(f"/orders/{self.order.pk}/", self.add_items, 4)
+
+
+class OrderQueryPlanTests(QueryPlanMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="pat", password="pass", role="patient")
+
+    def test_order_list_filters(self):
+        for owner, index in (("patient", "orders_orde_patient_245ad8_idx"), ("pharmacy", "orders_orde_pharmac_cd2c43_idx")):
+            with self.subTest(owner=owner):
+                self.assertUsesIndex(
+                    Order.objects.filter(
+                        **{owner: self.user}, status="pending", payment_status="paid", created_at__gte=timezone.now()
+                    ).order_by("-created_at", "-id"),
+                    index,
+                )
+
+    def test_order_list_unfiltered(self):
+        self.assertUsesIndex(Order.objects.filter(patient=self.user).order_by("-created_at", "-id"))
+
+
+class OrderListFilterTests(TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.client.force_login(self.patient)
+
+    def listed(self, **params):
+        response = self.client.get("/orders/", params)
+        return [order.pk for order in response.context["orders"]]
+
+    def make_order(self, local_time):
+        order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(local_time))
+        return order.pk
+
+    def test_date_range_uses_local_days(self):
+        # 00:30 IST on 2 March is still 1 March in UTC
+        early = self.make_order(datetime(2025, 3, 2, 0, 30))
+        late = self.make_order(datetime(2025, 3, 2, 23, 59))
+        self.make_order(datetime(2025, 3, 3, 0, 0))
+
+        self.assertEqual(self.listed(from_date="2025-03-02", to_date="2025-03-02"), [late, early])
+        self.assertEqual(len(self.listed(from_date="2025-03-03")), 1)
+        self.assertEqual(len(self.listed(to_date="not-a-date")), 3)
+
+    def test_full_order_number_is_an_exact_match(self):
+        order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+        Order.objects.create(patient=self.patient, pharmacy=self.pharmacist)
+        suffix = order.order_number.split("-")[1]
+        self.assertEqual(self.listed(order_number=suffix.lower()), [order.pk])
+        self.assertEqual(self.listed(order_number=order.order_number), [order.pk])
+        self.assertEqual(len(self.listed(order_number="ORD-")), 2)
+
+
+class DailySalesTests(TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.medicine = Medicine.objects.create(name="Paracetamol", pharmacy=self.pharmacist, price=5)
+
+    def make_order(self, quantity, **fields):
+        order = Order.objects.create(patient=self.patient, pharmacy=self.pharmacist, total_amount=quantity * 5)
+        OrderItem.objects.create(order=order, medicine=self.medicine, pharmacy=self.pharmacist, quantity=quantity, price=5)
+        for name, value in fields.items():
+            setattr(order, name, value)
+        order.save()
+        return order
+
+    def rollup(self):
+        return list(DailySales.objects.values_list("order_count", "revenue", "item_count"))
+
+    def test_rollup_follows_payment_and_status(self):
+        order = self.make_order(2)
+        self.assertEqual(self.rollup(), [])
+
+        order.payment_status = "paid"
+        order.save()
+        self.make_order(3, payment_status="paid")
+        self.assertEqual(self.rollup(), [(2, 25, 5)])
+
+        order.status = "cancelled"
+        order.save()
+        self.assertEqual(self.rollup(), [(1, 15, 3)])
+
+        Order.objects.filter(status="cancelled").delete()
+        Order.objects.get().delete()
+        self.assertEqual(self.rollup(), [(0, 0, 0)])
+
+    def test_backfill_matches_incremental_rollup(self):
+        self.make_order(2, payment_status="paid")
+        self.make_order(4, payment_status="paid", status="delivered")
+        self.make_order(1)
+        incremental = self.rollup()
+
+        DailySales.objects.all().delete()
+        call_command("backfill_daily_sales", chunk_size=1, stdout=open(os.devnull, "w"))
+        self.assertEqual(self.rollup(), incremental)
+        self.assertEqual(incremental, [(2, 30, 6)])
+
+    def test_taking_back_an_order_from_before_the_rollup(self):
+        old = self.make_order(2, payment_status="paid")
+        DailySales.objects.all().delete()  # placed before the rollup existed
+        rebuild_daily_sales(Order.objects.all(), DailySales.objects.all())  # what migration 0011 runs
+        self.make_order(1, payment_status="paid")
+        self.assertEqual(self.rollup(), [(2, 15, 3)])
+
+        old.status = "cancelled"
+        old.save()
+        self.assertEqual(self.rollup(), [(1, 5, 1)])
+
+    def test_history_outlives_the_pharmacy(self):
+        self.make_order(2, payment_status="paid")
+        self.pharmacist.delete()
+        self.assertEqual(list(DailySales.objects.values_list("pharmacy", "order_count")), [(None, 1)])
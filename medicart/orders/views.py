@@ -4,16 +4,24 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
+from django.db.models import Prefetch
 from decimal import Decimal
+import re
 
 
+from .exports import ORDER_EXPORT_FIELDS
 from .models import Order, OrderItem
 from shop.models import Medicine
+from shop.utils import export_response, keyset_paginate, local_day_start
 from prescriptions.models import Prescription
 from accounts.models import User
 from .forms import OrderStatusForm
 
 
+# A complete order number, with or without the "ORD-" prefix
+ORDER_NUMBER_RE = re.compile(r"^(?:ORD-)?([0-9A-F]{8})$", re.IGNORECASE)
+
+
 @login_required
 def order_list(request):
     patient_id = request.GET.get("user_id")
@@ -56,7 +64,13 @@ def order_list(request):
     to_date = request.GET.get("to_date")
 
     if order_number:
-        orders = orders.filter(order_number__icontains=order_number)
+        order_number = order_number.strip()
+        full_number = ORDER_NUMBER_RE.match(order_number)
+        if full_number:
+            # ⚡ Exact match on the unique index
+            orders = orders.filter(order_number=f"ORD-{full_number.group(1).upper()}")
+        else:
+            orders = orders.filter(order_number__icontains=order_number)
 
     if status:
         orders = orders.filter(status=status)
@@ -64,22 +78,51 @@ def order_list(request):
     if payment_status:
         orders = orders.filter(payment_status=payment_status)
 
-    if from_date:
-        orders = orders.filter(created_at__date__gte=from_date)
-
-    if to_date:
-        orders = orders.filter(created_at__date__lte=to_date)
+    # 📅 Half-open local-day range [from 00:00, day after to 00:00)
+    start = local_day_start(from_date)
+    if start:
+        orders = orders.filter(created_at__gte=start)
 
-    orders = orders.order_by("-created_at")
+    end = local_day_start(to_date, days=1)
+    if end:
+        orders = orders.filter(created_at__lt=end)
 
+    # Only what order_list.html renders: no per-row pharmacy/patient queries
+    orders = orders.select_related("pharmacy", "patient").only(
+        "id", "order_number", "status", "payment_status", "total_amount", "created_at",
+        "pharmacy__username", "pharmacy__pharmacy_name", "patient__username",
+    )
+    orders = keyset_paginate(request, orders, ("-created_at", "-id"))
 
     return render(request, "order_list.html", {"orders": orders})
 
 
+@login_required
+def order_export(request):
+    """Stream the user's orders as CSV/JSONL (``?format=jsonl&gzip=1``)."""
+    user = request.user
+    if user.role == "patient":
+        orders = Order.objects.filter(patient=user)
+    elif user.role == "pharmacist":
+        orders = Order.objects.filter(pharmacy=user)
+    elif user.role == "admin" or user.is_superuser:
+        orders = Order.objects.all()
+    else:
+        messages.error(request, "You are not allowed to export orders.")
+        return redirect("order_list")
+
+    return export_response(request, orders, ORDER_EXPORT_FIELDS, "orders")
+
+
 @login_required
 def order_detail(request, pk):
     """Detailed view of a specific order with items."""
-    order = get_object_or_404(Order, pk=pk)
+    order = get_object_or_404(
+        Order.objects.select_related("patient").prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("medicine__pharmacy"))
+        ),
+        pk=pk,
+    )
     return render(request, "order_detail.html", {"order": order})
 
 
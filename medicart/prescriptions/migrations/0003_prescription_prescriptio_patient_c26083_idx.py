@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prescriptions', '0002_prescription_used'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['patient', 'verified', 'used'], name='prescriptio_patient_c26083_idx'),
+        ),
+    ]
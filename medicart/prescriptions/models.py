@@ -12,6 +12,9 @@ class Prescription(models.Model):
     verified_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='verified_prescriptions')
     notes = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["patient", "verified", "used"])]  # checkout lookup
+
 
     def __str__(self):
         return f"Prescription #{self.id} by {self.patient.username}"
\ No newline at end of file
@@ -1,3 +1,29 @@
 from django.test import TestCase
 
 # Create your tests here.
+from accounts.models import User
+from shop.tests import ListQueryCountMixin, QueryPlanMixin
+from .models import Prescription
+
+
+class PrescriptionQueryCountTests(ListQueryCountMixin, TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="pass")
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+
+    def add_prescriptions(self, count):
+        for _ in range(count):
+            Prescription.objects.create(patient=self.patient, uploaded_file="prescriptions/rx.png")
+
+    def test_prescription_list(self):
+        self.client.force_login(self.admin)
+        self.assertListQueries("/prescriptions/", self.add_prescriptions, 3)
+
+
+class PrescriptionQueryPlanTests(QueryPlanMixin, TestCase):
+    def test_checkout_lookup(self):
+        patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.assertUsesIndex(
+            Prescription.objects.filter(patient=patient, verified=True, used=False),
+            "prescriptio_patient_c26083_idx",
+        )
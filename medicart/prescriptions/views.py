@@ -9,6 +9,7 @@ from django.contrib import messages
 from .models import Prescription
 from .forms import PrescriptionForm  # we'll create a form
 from shop.models import Cart
+from shop.utils import keyset_paginate
 
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
@@ -32,6 +33,10 @@ def prescription_list(request):
     else:
         prescriptions = Prescription.objects.none()
 
+    prescriptions = prescriptions.select_related("patient").only(
+        "id", "uploaded_at", "verified", "patient__username",
+    )
+    prescriptions = keyset_paginate(request, prescriptions, ("-uploaded_at", "-id"))
     return render(request, "prescription_list.html", {"prescriptions": prescriptions})
 
 
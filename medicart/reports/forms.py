@@ -0,0 +1,25 @@
+from django import forms
+
+from .models import ReportJob
+
+
+class ReportJobForm(forms.ModelForm):
+    class Meta:
+        model = ReportJob
+        fields = ["kind", "format", "compress", "from_date", "to_date"]
+        widgets = {
+            "from_date": forms.DateInput(attrs={"type": "date"}),
+            "to_date": forms.DateInput(attrs={"type": "date"}),
+        }
+
+    def __init__(self, *args, kinds=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if kinds is not None:
+            self.fields["kind"].choices = kinds
+
+    def clean(self):
+        cleaned = super().clean()
+        start, end = cleaned.get("from_date"), cleaned.get("to_date")
+        if start and end and start > end:
+            raise forms.ValidationError("The start date must be on or before the end date.")
+        return cleaned
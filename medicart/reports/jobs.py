@@ -0,0 +1,195 @@
+# reports/jobs.py
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import DecimalField, ExpressionWrapper, F, Q
+from django.utils import timezone
+
+from deliveries.exports import DELIVERY_EXPORT_FIELDS
+from deliveries.models import Delivery
+from orders.exports import ORDER_EXPORT_FIELDS
+from orders.models import DailySales, Order
+from shop.models import Stock
+from shop.utils import EXPORT_FORMATS, csv_lines, export_rows, gzip_chunks, jsonl_lines, local_day_start
+
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+SALES_FIELDS = ("day", "pharmacy_id", "pharmacy__pharmacy_name", "order_count", "revenue", "item_count")
+STOCK_VALUATION_FIELDS = (
+    "id", "medicine__name", "medicine__sku", "pharmacy__pharmacy_name", "quantity", "medicine__price", "value",
+)
+
+
+def is_admin(user):
+    return user.is_superuser or user.role == "admin"
+
+
+def available_kinds(user):
+    """Report kinds ``user`` may request, as (value, label) choices."""
+    if is_admin(user) or user.role == "pharmacist":
+        return ReportJob.KIND_CHOICES
+    if user.role == "delivery":
+        return [(ReportJob.DELIVERIES, "Deliveries")]
+    return [(ReportJob.ORDERS, "Orders")]
+
+
+def date_filter(job, field, dates=False):
+    """Q for the job's [from_date, to_date] on a datetime (or, with ``dates``, a date) field."""
+    condition = Q()
+    if job.from_date:
+        start = job.from_date if dates else local_day_start(job.from_date)
+        condition &= Q(**{f"{field}__gte": start})
+    if job.to_date:
+        end = job.to_date + timedelta(days=1) if dates else local_day_start(job.to_date, days=1)
+        condition &= Q(**{f"{field}__lt": end})
+    return condition
+
+
+def report_source(job):
+    """The (queryset, fields) a job exports, scoped to what its user may see."""
+    user = job.user
+    if job.kind == ReportJob.ORDERS:
+        orders = Order.objects.filter(date_filter(job, "created_at"))
+        if user.role == "patient":
+            orders = orders.filter(patient=user)
+        elif not is_admin(user):
+            orders = orders.filter(pharmacy=user)
+        return orders, ORDER_EXPORT_FIELDS
+
+    if job.kind == ReportJob.SALES:
+        sales = DailySales.objects.filter(date_filter(job, "day", dates=True))
+        if not is_admin(user):
+            sales = sales.filter(pharmacy=user)
+        return sales, SALES_FIELDS
+
+    if job.kind == ReportJob.STOCK_VALUATION:
+        stocks = Stock.objects.annotate(
+            value=ExpressionWrapper(
+                F("quantity") * F("medicine__price"), output_field=DecimalField(max_digits=14, decimal_places=2)
+            )
+        )
+        if not is_admin(user):
+            stocks = stocks.filter(pharmacy=user)
+        return stocks, STOCK_VALUATION_FIELDS
+
+    if job.kind == ReportJob.DELIVERIES:
+        deliveries = Delivery.objects.filter(date_filter(job, "order__created_at"))
+        if user.role == "delivery":
+            deliveries = deliveries.filter(assigned_to=user)
+        elif not is_admin(user):
+            deliveries = deliveries.filter(order__pharmacy=user)
+        return deliveries, DELIVERY_EXPORT_FIELDS
+
+    raise ValueError(f"Unknown report kind: {job.kind}")
+
+
+def lease_until():
+    return timezone.now() + timedelta(seconds=getattr(settings, "REPORT_LEASE_SECONDS", 600))
+
+
+def claim_jobs(limit):
+    """
+    Lease up to ``limit`` due jobs to this worker and return them.
+
+    Same scheme as the geocoding queue: a claimed job is marked running with
+    ``run_after`` pushed out, and the lease is renewed as progress is saved,
+    so a job whose worker died becomes due again.
+    """
+    now = timezone.now()
+    due = Q(status__in=[ReportJob.PENDING, ReportJob.RUNNING], run_after__lte=now)
+    candidates = list(
+        ReportJob.objects.filter(due).order_by("run_after", "id").values_list("id", flat=True)[:limit]
+    )
+    claimed = [
+        job_id for job_id in candidates
+        if ReportJob.objects.filter(due, id=job_id).update(
+            status=ReportJob.RUNNING, run_after=lease_until(), rows_written=0
+        )
+    ]
+    return list(ReportJob.objects.filter(id__in=claimed).select_related("user"))
+
+
+def track_progress(job, rows):
+    """Pass ``rows`` through, saving the count (and renewing the lease) every so often."""
+    every = getattr(settings, "REPORT_PROGRESS_EVERY", 5000)
+    written = 0
+    for row in rows:
+        yield row
+        written += 1
+        if written % every == 0:
+            ReportJob.objects.filter(pk=job.pk).update(rows_written=written, run_after=lease_until())
+    job.rows_written = written
+
+
+def write_report(job, fh):
+    """Write the job's export to the binary file ``fh``."""
+    queryset, fields = report_source(job)
+    job.rows_total = queryset.count()
+    ReportJob.objects.filter(pk=job.pk).update(rows_total=job.rows_total)
+
+    rows = track_progress(job, export_rows(queryset, fields))
+    lines = csv_lines(fields, rows) if job.format == "csv" else jsonl_lines(fields, rows)
+    if job.compress:
+        for block in gzip_chunks(lines):
+            fh.write(block)
+    else:
+        for line in lines:
+            fh.write(line.encode("utf-8"))
+
+
+def artifact_name(job):
+    name = f"{job.kind}-{job.pk}.{EXPORT_FORMATS[job.format][1]}"
+    return f"{name}.gz" if job.compress else name
+
+
+def run_job(job):
+    """Build one claimed job's artifact under MEDIA_ROOT."""
+    retention = timedelta(days=getattr(settings, "REPORT_RETENTION_DAYS", 7))
+    try:
+        with tempfile.TemporaryFile() as fh:
+            write_report(job, fh)
+            fh.seek(0)
+            job.file.save(artifact_name(job), File(fh), save=False)
+    except Exception as exc:  # a failed report must not stop the worker
+        logger.exception("Report job %s failed", job.pk)
+        job.status = ReportJob.FAILED
+        job.last_error = str(exc)[:255]
+    else:
+        job.status = ReportJob.DONE
+        job.last_error = ""
+    job.finished_at = timezone.now()
+    job.expires_at = job.finished_at + retention
+    job.save(update_fields=[
+        "status", "file", "rows_total", "rows_written", "last_error", "finished_at", "expires_at",
+    ])
+
+
+def process_jobs(limit=5):
+    """
+    Run up to ``limit`` jobs; returns how many were run. Jobs are claimed
+    one at a time, as the previous one finishes, so a queued job's lease
+    never runs out while this worker is busy with another.
+    """
+    processed = 0
+    for _ in range(limit):
+        jobs = claim_jobs(1)
+        if not jobs:
+            break
+        run_job(jobs[0])
+        processed += 1
+    return processed
+
+
+def collect_garbage():
+    """Delete expired jobs and their files; returns how many were removed."""
+    expired = list(ReportJob.objects.filter(expires_at__lte=timezone.now()))
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+    ReportJob.objects.filter(id__in=[job.id for job in expired]).delete()
+    return len(expired)
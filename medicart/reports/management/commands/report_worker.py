@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reports.jobs import collect_garbage, process_jobs
+
+
+class Command(BaseCommand):
+    help = "Build queued report exports and delete expired ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=5, help="Jobs claimed per batch.")
+        parser.add_argument("--sleep", type=float, default=5, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Process one batch and exit.")
+
+    def handle(self, *args, **options):
+        while True:
+            removed = collect_garbage()
+            if removed:
+                self.stdout.write(f"Deleted {removed} expired report(s).")
+            processed = process_jobs(limit=options["batch"])
+            if processed:
+                self.stdout.write(f"Built {processed} report(s).")
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["sleep"])
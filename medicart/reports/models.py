@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class ReportJob(models.Model):
+    """A large export built in the background by ``manage.py report_worker``."""
+
+    ORDERS = "orders"
+    SALES = "sales"
+    STOCK_VALUATION = "stock_valuation"
+    DELIVERIES = "deliveries"
+    KIND_CHOICES = (
+        (ORDERS, "Orders"),
+        (SALES, "Daily sales"),
+        (STOCK_VALUATION, "Stock valuation"),
+        (DELIVERIES, "Deliveries"),
+    )
+    FORMAT_CHOICES = (
+        ("csv", "CSV"),
+        ("jsonl", "JSON Lines"),
+    )
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='report_jobs')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default="csv")
+    compress = models.BooleanField(default=False)
+    from_date = models.DateField(null=True, blank=True)
+    to_date = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    rows_total = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to='reports/%Y/%m/%d/', blank=True)
+    last_error = models.CharField(max_length=255, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)  # lease while running
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)  # artifact deleted after this
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"]),  # worker queue
+            models.Index(fields=["expires_at"]),           # garbage collection
+        ]
+
+    @property
+    def progress(self):
+        """Percent of rows written (100 once done)."""
+        if self.status == self.DONE:
+            return 100
+        return int(self.rows_written * 100 / self.rows_total) if self.rows_total else 0
+
+    def __str__(self):
+        return f"{self.get_kind_display()} report #{self.pk} ({self.status})"
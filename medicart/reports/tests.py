@@ -0,0 +1,103 @@
+import gzip
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+# Create your tests here.
+from accounts.models import User
+from orders.models import Order
+from shop.models import Medicine, Stock
+from . import jobs
+from .jobs import collect_garbage, process_jobs
+from .models import ReportJob
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media, REPORT_PROGRESS_EVERY=1)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.pharmacist = User.objects.create_user(
+            username="pharma", password="pass", role="pharmacist", pharmacy_name="City Pharmacy"
+        )
+        other = User.objects.create_user(username="other", password="pass", role="pharmacist")
+        for owner, name, quantity in ((self.pharmacist, "Paracetamol", 4), (other, "Aspirin", 9)):
+            medicine = Medicine.objects.create(name=name, pharmacy=owner, price=Decimal("2.50"))
+            Stock.objects.create(medicine=medicine, pharmacy=owner, quantity=quantity)
+        self.client.force_login(self.pharmacist)
+
+    def queue(self, **data):
+        response = self.client.post(reverse("report_list"), {"format": "csv", **data})
+        self.assertRedirects(response, reverse("report_list"))
+        return ReportJob.objects.latest("id")
+
+    def test_stock_valuation_is_built_in_the_background(self):
+        job = self.queue(kind="stock_valuation")
+        self.assertEqual(job.status, ReportJob.PENDING)
+
+        self.assertEqual(process_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_total, job.rows_written, job.progress), ("done", 1, 1, 100))
+        self.assertTrue(job.file.name.startswith("reports/"))
+
+        status = self.client.get(reverse("report_status", args=[job.pk])).json()
+        self.assertEqual(status["progress"], 100)
+
+        response = self.client.get(reverse("report_download", args=[job.pk]))
+        body = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(body[0].split(",")[-1], "value")
+        row = body[1].split(",")
+        self.assertEqual(row[1:5], ["Paracetamol", "", "City Pharmacy", "4"])
+        self.assertEqual(Decimal(row[6]), Decimal("10.00"))
+
+    def test_jobs_are_claimed_one_at_a_time(self):
+        first, second = self.queue(kind="stock_valuation"), self.queue(kind="sales")
+        run_job, seen = jobs.run_job, []
+
+        def run(job):
+            other = second if job.pk == first.pk else first
+            seen.append((job.pk, ReportJob.objects.get(pk=other.pk).status))
+            run_job(job)
+
+        with mock.patch.object(jobs, "run_job", run):
+            self.assertEqual(process_jobs(limit=5), 2)
+        # the second job was still queued (no lease ticking) while the first ran
+        self.assertEqual(seen, [(first.pk, ReportJob.PENDING), (second.pk, ReportJob.DONE)])
+
+    def test_gzipped_orders_report_respects_dates(self):
+        patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        Order.objects.create(patient=patient, pharmacy=self.pharmacist)
+        old = Order.objects.create(patient=patient, pharmacy=self.pharmacist)
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+
+        today = timezone.localdate().isoformat()
+        job = self.queue(kind="orders", format="jsonl", compress="on", from_date=today, to_date=today)
+        process_jobs()
+        job.refresh_from_db()
+        self.assertTrue(job.file.name.endswith(".jsonl.gz"))
+        with job.file.open("rb") as fh:
+            self.assertEqual(len(gzip.decompress(fh.read()).splitlines()), 1)
+
+    def test_other_users_cannot_download_and_expired_reports_are_removed(self):
+        job = self.queue(kind="sales")
+        process_jobs()
+        job.refresh_from_db()
+        path = job.file.path
+
+        self.client.force_login(User.objects.get(username="other"))
+        self.assertEqual(self.client.get(reverse("report_download", args=[job.pk])).status_code, 404)
+
+        ReportJob.objects.filter(pk=job.pk).update(expires_at=timezone.now())
+        self.assertEqual(collect_garbage(), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ReportJob.objects.exists())
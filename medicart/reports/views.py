@@ -0,0 +1,50 @@
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+
+from .forms import ReportJobForm
+from .jobs import available_kinds
+from .models import ReportJob
+
+
+@login_required
+def report_list(request):
+    """Request a report and list the user's queued and finished ones."""
+    kinds = available_kinds(request.user)
+    if request.method == "POST":
+        form = ReportJobForm(request.POST, kinds=kinds)
+        if form.is_valid():
+            job = form.save(commit=False)
+            job.user = request.user
+            job.save()
+            messages.success(request, "Report queued. It will be ready to download shortly.")
+            return redirect("report_list")
+    else:
+        form = ReportJobForm(kinds=kinds)
+
+    jobs = ReportJob.objects.filter(user=request.user).order_by("-created_at")[:50]
+    return render(request, "report_list.html", {"form": form, "jobs": jobs})
+
+
+@login_required
+def report_status(request, pk):
+    """JSON progress for polling from the report list."""
+    job = get_object_or_404(ReportJob, pk=pk, user=request.user)
+    return JsonResponse({
+        "id": job.pk,
+        "status": job.status,
+        "progress": job.progress,
+        "rows_written": job.rows_written,
+        "rows_total": job.rows_total,
+        "error": job.last_error,
+    })
+
+
+@login_required
+def report_download(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk, user=request.user)
+    if job.status != ReportJob.DONE or not job.file:
+        messages.error(request, "This report is not ready for download.")
+        return redirect("report_list")
+    return FileResponse(job.file.open("rb"), as_attachment=True, filename=job.file.name.rsplit("/", 1)[-1])
@@ -0,0 +1,213 @@
+# shop/autocomplete.py
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .search import tokenize
+
+MIN_SIMILARITY = 0.3  # same default cut-off as pg_trgm
+
+
+def trigrams(term):
+    """Character trigrams of a term, padded like pg_trgm ("  ab " style)."""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MedicineAutocompleteIndex:
+    """
+    In-process autocomplete over the medicine names and brands patients can
+    see: active medicines of approved pharmacies.
+
+    Terms live in a character trie for prefix lookups and in a trigram map
+    for typo-tolerant fallback ("paracetmol" -> "paracetamol"). The index is
+    built from the database once, on first use, and then kept current by the
+    Medicine signals in ``shop.signals``; lookups never touch the database.
+    Signals only reach the current process, so the index is also rebuilt
+    every ``MEDICINE_AUTOCOMPLETE_REFRESH`` seconds to pick up changes made
+    by other workers.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ready = False
+        self.built_at = 0.0
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}        # medicine id -> (name, brand)
+        self._doc_terms = {}   # medicine id -> set of terms
+        self._postings = {}    # term -> set of medicine ids
+        self._trie = {}        # nested dicts; key None marks the end of a term
+        self._trigrams = {}    # trigram -> set of terms
+
+    # -------------------- building --------------------
+    def build(self, medicines=None):
+        """(Re)load the index from ``medicines`` or from every active Medicine."""
+        if medicines is None:
+            from .models import Medicine
+            medicines = Medicine.objects.filter(
+                is_active=True, pharmacy__approved=True, pharmacy__role="pharmacist"
+            ).values_list("id", "name", "brand")
+        with self._lock:
+            self._reset()
+            for med_id, name, brand in medicines:
+                self._add(med_id, name, brand)
+            self.ready = True
+            self.built_at = time.monotonic()
+
+    def is_stale(self):
+        refresh = getattr(settings, "MEDICINE_AUTOCOMPLETE_REFRESH", 300)
+        return not self.ready or (refresh and time.monotonic() - self.built_at > refresh)
+
+    def ensure_built(self):
+        if self.is_stale():
+            with self._lock:
+                if self.is_stale():
+                    self.build()
+
+    def invalidate(self):
+        """Rebuild on the next lookup (e.g. after a pharmacy's approval changed)."""
+        with self._lock:
+            self.ready = False
+
+    # -------------------- incremental updates --------------------
+    def update(self, medicine):
+        """Reflect a saved Medicine; hidden ones (inactive or unapproved pharmacy) are dropped."""
+        with self._lock:
+            if not self.ready:
+                return
+            self._remove(medicine.pk)
+            pharmacy = medicine.pharmacy
+            if medicine.is_active and pharmacy and pharmacy.approved and pharmacy.role == "pharmacist":
+                self._add(medicine.pk, medicine.name, medicine.brand)
+
+    def remove(self, medicine_id):
+        with self._lock:
+            if self.ready:
+                self._remove(medicine_id)
+
+    def _add(self, med_id, name, brand):
+        terms = set(tokenize(f"{name} {brand or ''}"))
+        self._docs[med_id] = (name, brand or "")
+        self._doc_terms[med_id] = terms
+        for term in terms:
+            ids = self._postings.get(term)
+            if ids is None:
+                ids = self._postings[term] = set()
+                self._insert_term(term)
+            ids.add(med_id)
+
+    def _remove(self, med_id):
+        self._docs.pop(med_id, None)
+        for term in self._doc_terms.pop(med_id, ()):
+            ids = self._postings.get(term)
+            if ids is None:
+                continue
+            ids.discard(med_id)
+            if not ids:
+                del self._postings[term]
+                self._delete_term(term)
+
+    def _insert_term(self, term):
+        node = self._trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[None] = term
+        for gram in trigrams(term):
+            self._trigrams.setdefault(gram, set()).add(term)
+
+    def _delete_term(self, term):
+        node = self._trie
+        for char in term:
+            node = node.get(char)
+            if node is None:
+                break
+        else:
+            node.pop(None, None)
+        for gram in trigrams(term):
+            terms = self._trigrams.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._trigrams[gram]
+
+    # -------------------- lookups --------------------
+    def _prefix_terms(self, prefix, limit):
+        """Terms starting with ``prefix``, shortest first."""
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        found = []
+        queue = deque([node])
+        while queue and len(found) < limit:
+            node = queue.popleft()
+            for key, child in node.items():
+                if key is None:
+                    found.append(child)
+                else:
+                    queue.append(child)
+        return found
+
+    def _similar_terms(self, token, limit):
+        """Terms sharing enough trigrams with ``token``, best first."""
+        grams = trigrams(token)
+        shared = {}
+        for gram in grams:
+            for term in self._trigrams.get(gram, ()):
+                shared[term] = shared.get(term, 0) + 1
+        scored = []
+        for term, count in shared.items():
+            similarity = count / (len(grams) + len(trigrams(term)) - count)
+            if similarity >= MIN_SIMILARITY:
+                scored.append((similarity, term))
+        scored.sort(reverse=True)
+        return [term for _, term in scored[:limit]]
+
+    def _matching_ids(self, token, fuzzy, limit):
+        terms = self._prefix_terms(token, limit)
+        if not terms and fuzzy:
+            terms = self._similar_terms(token, limit)
+        ids = set()
+        for term in terms:
+            ids |= self._postings[term]
+        return ids
+
+    def lookup(self, query, limit=10, fuzzy=True):
+        """
+        Return up to ``limit`` dicts (id, name, brand) matching ``query``.
+
+        Every token must match a term by prefix, or, when nothing starts
+        with it, by trigram similarity.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self.ensure_built()
+        with self._lock:
+            candidates = None
+            for token in tokens:
+                ids = self._matching_ids(token, fuzzy, limit * 5)
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+            first = tokens[0]
+            ranked = sorted(
+                candidates,
+                key=lambda med_id: (
+                    not self._docs[med_id][0].lower().startswith(first),
+                    len(self._docs[med_id][0]),
+                    self._docs[med_id][0].lower(),
+                ),
+            )
+            return [
+                {"id": med_id, "name": self._docs[med_id][0], "brand": self._docs[med_id][1]}
+                for med_id in ranked[:limit]
+            ]
+
+
+medicine_index = MedicineAutocompleteIndex()
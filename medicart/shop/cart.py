@@ -0,0 +1,68 @@
+# shop/cart.py
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, IntegerField, Max, Sum, Value, When, Window
+
+from .models import Cart, CartItem
+
+CENTS = Decimal("0.01")
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+LINE_SUBTOTAL = ExpressionWrapper(F("quantity") * F("medicine__price"), output_field=MONEY)
+
+
+class CartSummary:
+    """
+    A cart's lines plus its totals, all from one query.
+
+    Each line carries ``line_subtotal``; window aggregates over the same rows
+    give the cart total, unit count and whether any line needs a
+    prescription, so nothing is recomputed per line or per template access.
+    """
+
+    def __init__(self, cart, items):
+        self.cart = cart
+        self.items = items
+        first = items[0] if items else None
+        # SQLite hands back computed decimals unrounded; money has 2 places.
+        self.total = first.cart_total.quantize(CENTS) if first else CENTS * 0
+        self.item_count = first.cart_units if first else 0
+        self.line_count = len(items)
+        self.rx_required = bool(first and first.cart_rx)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return self.line_count
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def summarize_cart(cart):
+    items = list(
+        CartItem.objects.filter(cart=cart)
+        .select_related("medicine")
+        .annotate(
+            line_subtotal=LINE_SUBTOTAL,
+            cart_total=Window(expression=Sum(LINE_SUBTOTAL), output_field=MONEY),
+            cart_units=Window(expression=Sum("quantity")),
+            cart_rx=Window(
+                expression=Max(
+                    Case(When(medicine__prescription_required=True, then=Value(1)), default=Value(0),
+                         output_field=IntegerField())
+                )
+            ),
+        )
+        .order_by("id")
+    )
+    return CartSummary(cart, items)
+
+
+def get_cart_summary(request):
+    """The current user's cart summary, evaluated at most once per request."""
+    summary = getattr(request, "_cart_summary", None)
+    if summary is None:
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        summary = request._cart_summary = summarize_cart(cart)
+    return summary
@@ -1,6 +1,5 @@
 from django import forms
 from .models import *
-from geopy.geocoders import Nominatim  #type: ignore
 
 class CategoryForm(forms.ModelForm):
     class Meta:
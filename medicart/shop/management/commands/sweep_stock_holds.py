@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.reservations import sweep_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Delete expired checkout stock holds."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Keep running, sweeping every INTERVAL seconds (default: sweep once and exit).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = sweep_expired_holds()
+            if deleted:
+                self.stdout.write(f"Released {deleted} expired stock hold(s).")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
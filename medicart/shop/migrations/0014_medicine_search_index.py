@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS shop_medicine_fts USING fts5("
+            "name, brand, sku, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            "INSERT INTO shop_medicine_fts (rowid, name, brand, sku) "
+            "SELECT id, name, brand, sku FROM shop_medicine"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS shop_medicine_search_idx ON shop_medicine USING GIN ("
+            "to_tsvector('simple', coalesce(\"shop_medicine\".\"name\", '') || ' ' || "
+            "coalesce(\"shop_medicine\".\"brand\", '') || ' ' || "
+            "coalesce(\"shop_medicine\".\"sku\", '')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS shop_medicine_fts")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS shop_medicine_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_medicine_is_active'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-17 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['pharmacy', 'is_active'], name='shop_medici_pharmac_e2482e_idx'),
+        ),
+    ]
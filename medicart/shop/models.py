@@ -1,9 +1,10 @@
 from django.db import models
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 # Create your models here.
 from django.conf import settings
-from geopy.geocoders import Nominatim  #type: ignore
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError  #type: ignore
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -26,17 +27,41 @@ class Medicine(models.Model):
     image = models.ImageField(upload_to='medicine_images/', null=True, blank=True)
     is_active = models.BooleanField(default=True)  # ✅ NEW
 
+    class Meta:
+        indexes = [models.Index(fields=["pharmacy", "is_active"])]  # medicine_list per role
 
     def __str__(self):
         return f"{self.name} ({self.brand})" if self.brand else self.name
 
 
+def held_quantity(stock_ref="pk", exclude_user=None):
+    """
+    Subquery: units of a Stock row held by unexpired checkout reservations,
+    optionally ignoring one user's own holds.
+    """
+    holds = StockReservation.objects.filter(stock=OuterRef(stock_ref), expires_at__gt=timezone.now())
+    if exclude_user is not None:
+        holds = holds.exclude(user=exclude_user)
+    total = holds.values("stock").annotate(total=Sum("quantity")).values("total")[:1]
+    return Coalesce(Subquery(total, output_field=models.IntegerField()), Value(0))
+
+
+class StockQuerySet(models.QuerySet):
+    def with_available(self, exclude_user=None):
+        """Annotate ``held`` and ``available`` (= quantity - active holds)."""
+        return self.annotate(
+            held=held_quantity("pk", exclude_user)
+        ).annotate(available=F("quantity") - F("held"))
+
+
 class Stock(models.Model):
     medicine = models.ForeignKey(Medicine, related_name='stocks', on_delete=models.CASCADE)
     pharmacy = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='stocks', on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=0)
     low_stock_threshold = models.PositiveIntegerField(default=10)
 
+    objects = StockQuerySet.as_manager()
+
     @property
     def price(self):
         return self.medicine.price
@@ -51,6 +76,28 @@ class Stock(models.Model):
     def is_low(self):
         return self.quantity <= self.low_stock_threshold
 
+    @classmethod
+    def decrement(cls, quantities, user=None):
+        """
+        Take ``quantities`` ({stock id: units}) off in one conditional UPDATE.
+
+        A row is only touched while it still has enough units beyond what
+        other customers hold in active reservations (``user``'s own holds are
+        the ones being converted), so concurrent checkouts can never drive
+        stock negative or eat someone else's hold. Returns False when some
+        row was short; the caller must then roll back the rows that did update.
+        """
+        if not quantities:
+            return True
+        needed = Case(
+            *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+            output_field=models.PositiveIntegerField(),
+        )
+        updated = cls.objects.filter(
+            pk__in=list(quantities), quantity__gte=needed + held_quantity("pk", exclude_user=user)
+        ).update(quantity=F("quantity") - needed)
+        return updated == len(quantities)
+
     def save(self, *args, **kwargs):
         # price is a computed property backed by medicine.price — do not assign to it.
         super().save(*args, **kwargs)
@@ -60,7 +107,13 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def total_price(self):
-        return sum(item.subtotal() for item in self.items.all())
+        total = self.items.aggregate(
+            total=Sum(
+                F("quantity") * F("medicine__price"),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+        )["total"]
+        return total or 0
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name="items", on_delete=models.CASCADE)
@@ -69,3 +122,22 @@ class CartItem(models.Model):
 
     def subtotal(self):
         return self.medicine.price * self.quantity
+
+
+class StockReservation(models.Model):
+    """Units set aside for a customer between checkout and payment."""
+
+    stock = models.ForeignKey(Stock, related_name="reservations", on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="stock_reservations", on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["stock", "expires_at"]),  # active holds per stock row
+            models.Index(fields=["expires_at"]),           # sweeper
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.stock.medicine} for {self.user}"
@@ -0,0 +1,58 @@
+# shop/reservations.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Stock, StockReservation
+
+
+def hold_ttl():
+    return timedelta(seconds=getattr(settings, "STOCK_HOLD_TTL", 900))
+
+
+def reserve_cart(user, summary):
+    """
+    Replace ``user``'s holds with one hold per line of their cart summary.
+
+    Returns the names of medicines that cannot be held (no stock row, or
+    not enough units left once other customers' holds are subtracted); in
+    that case the user's existing holds are kept as they are.
+    """
+    lines = {item.medicine_id: item for item in summary}
+    with transaction.atomic():
+        if not lines:
+            StockReservation.objects.filter(user=user).delete()
+            return []
+        stocks = {
+            stock.medicine_id: stock
+            for stock in Stock.objects.select_for_update()
+            .filter(medicine_id__in=list(lines))
+            .with_available(exclude_user=user)
+            if stock.pharmacy_id == lines[stock.medicine_id].medicine.pharmacy_id
+        }
+        short = [
+            item.medicine.name for med_id, item in lines.items()
+            if med_id not in stocks or stocks[med_id].available < item.quantity
+        ]
+        if short:
+            return short
+        expires_at = timezone.now() + hold_ttl()
+        StockReservation.objects.filter(user=user).delete()
+        StockReservation.objects.bulk_create([
+            StockReservation(stock=stocks[med_id], user=user, quantity=item.quantity, expires_at=expires_at)
+            for med_id, item in lines.items()
+        ])
+    return []
+
+
+def release_holds(user):
+    """Drop ``user``'s holds, e.g. once payment has turned them into decrements."""
+    StockReservation.objects.filter(user=user).delete()
+
+
+def sweep_expired_holds():
+    """Delete lapsed holds; returns how many were removed."""
+    deleted, _ = StockReservation.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,88 @@
+# shop/search.py
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "shop_medicine_fts"
+
+# Same text that is indexed on PostgreSQL (see migration 0014).
+PG_DOCUMENT = (
+    "to_tsvector('simple', coalesce(\"shop_medicine\".\"name\", '') || ' ' || "
+    "coalesce(\"shop_medicine\".\"brand\", '') || ' ' || "
+    "coalesce(\"shop_medicine\".\"sku\", ''))"
+)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query):
+    """Split a search box string into lowercase word tokens."""
+    return _TOKEN_RE.findall(query.lower())
+
+
+def index_medicine(medicine):
+    """Insert or refresh one medicine in the SQLite FTS table."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [medicine.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, brand, sku) VALUES (%s, %s, %s, %s)",
+            [medicine.pk, medicine.name, medicine.brand or "", medicine.sku or ""],
+        )
+
+
+def unindex_medicine(medicine_id):
+    """Drop one medicine from the SQLite FTS table."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [medicine_id])
+
+
+def search_medicines(queryset, query):
+    """
+    Filter a Medicine queryset by full-text match on name/brand/sku.
+
+    Every token is prefix-matched, so "para 500" finds "Paracetamol 500mg".
+    The result is annotated with ``search_rank`` (lower is better) and
+    ordered by it; the caller can still chain further filters.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{token}"*' for token in tokens)
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = \"shop_medicine\".\"id\"",
+                [match],
+                output_field=FloatField(),
+            )
+        ).order_by("search_rank", "-id")
+
+    if connection.vendor == "postgresql":
+        tsquery = " & ".join(f"{token}:*" for token in tokens)
+        return queryset.filter(
+            RawSQL(f"{PG_DOCUMENT} @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                f"-ts_rank({PG_DOCUMENT}, to_tsquery('simple', %s))",
+                [tsquery],
+                output_field=FloatField(),
+            )
+        ).order_by("search_rank", "-id")
+
+    # Other backends: plain substring match, no ranking.
+    condition = Q()
+    for token in tokens:
+        condition &= Q(name__icontains=token) | Q(brand__icontains=token) | Q(sku__icontains=token)
+    return queryset.filter(condition).annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    ).order_by("search_rank", "-id")
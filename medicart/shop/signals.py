@@ -0,0 +1,40 @@
+# shop/signals.py
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import medicine_index
+from .models import Medicine
+from .search import index_medicine, unindex_medicine
+
+
+@receiver(post_save, sender=Medicine)
+def medicine_saved(sender, instance, **kwargs):
+    index_medicine(instance)
+    transaction.on_commit(lambda: medicine_index.update(instance))
+
+
+@receiver(post_delete, sender=Medicine)
+def medicine_deleted(sender, instance, **kwargs):
+    unindex_medicine(instance.pk)
+    medicine_id = instance.pk
+    transaction.on_commit(lambda: medicine_index.remove(medicine_id))
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def pharmacy_approval_before(sender, instance, update_fields=None, **kwargs):
+    skip = update_fields is not None and "approved" not in update_fields
+    if instance.pk is None or instance.role != "pharmacist" or skip:
+        instance._approved_before = instance.approved
+        return
+    instance._approved_before = (
+        sender.objects.filter(pk=instance.pk).values_list("approved", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def pharmacy_approval_changed(sender, instance, created, **kwargs):
+    # Their medicines appear in (or vanish from) autocomplete
+    if not created and getattr(instance, "_approved_before", instance.approved) != instance.approved:
+        transaction.on_commit(medicine_index.invalidate)
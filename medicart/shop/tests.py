@@ -1,3 +1,494 @@
-from django.test import TestCase
+import gzip
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
 
 # Create your tests here.
+from accounts.models import User
+from orders.models import DailySales, Order
+from .autocomplete import medicine_index
+from .cart import summarize_cart
+from .models import Cart, CartItem, Category, Medicine, Stock, StockReservation
+from .reservations import sweep_expired_holds
+from .search import FTS_TABLE, search_medicines
+from .utils import keyset_paginate
+
+
+class ListQueryCountMixin:
+    """
+    Render a list page at two different sizes and check the query count is
+    the same fixed number both times, i.e. no per-row queries.
+    """
+
+    def assertListQueries(self, url, add_rows, expected):
+        for rows in (2, 8):
+            add_rows(rows)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class QueryPlanMixin:
+    """
+    Run EXPLAIN QUERY PLAN for a hot query and fail if SQLite would scan
+    the whole table instead of searching one of its indexes.
+    """
+
+    def assertUsesIndex(self, queryset, index=None):
+        if connection.vendor != "sqlite":
+            self.skipTest("query plan checks are written for SQLite")
+        plan = queryset.explain()
+        table = queryset.model._meta.db_table
+        for line in plan.splitlines():
+            self.assertNotRegex(line, rf"\bSCAN {table}\b(?!.*\bINDEX\b)", f"full table scan:\n{plan}")
+        self.assertIn(f"SEARCH {table} USING", plan)
+        if index:
+            self.assertIn(index, plan)
+
+
+class ListQueryCountTests(ListQueryCountMixin, TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(
+            username="pharma", password="pass", role="pharmacist", pharmacy_name="City Pharmacy"
+        )
+        self.category = Category.objects.create(name="Pain relief")
+        self.client.force_login(self.pharmacist)
+
+    def add_medicines(self, count):
+        for _ in range(count):
+            medicine = Medicine.objects.create(
+                name=f"Medicine {Medicine.objects.count()}",
+                category=self.category,
+                pharmacy=self.pharmacist,
+            )
+            Stock.objects.create(medicine=medicine, pharmacy=self.pharmacist, quantity=5)
+
+    def test_medicine_list(self):
+        self.assertListQueries("/shop/medicines/", self.add_medicines, 3)
+
+    def test_medicine_search(self):
+        self.assertListQueries("/shop/medicines/?q=medicine", self.add_medicines, 3)
+
+    def test_stock_list(self):
+        self.assertListQueries("/shop/stocks/", self.add_medicines, 3)
+
+
+class CartSummaryTests(ListQueryCountMixin, TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.cart = Cart.objects.create(user=self.patient)
+        self.client.force_login(self.patient)
+
+    def add_lines(self, count, price="12.50", rx=False):
+        for _ in range(count):
+            medicine = Medicine.objects.create(
+                name="Amoxicillin", pharmacy=self.pharmacist, price=price, prescription_required=rx
+            )
+            CartItem.objects.create(cart=self.cart, medicine=medicine, quantity=2)
+
+    def test_totals(self):
+        self.add_lines(2)
+        self.add_lines(1, price="0.10", rx=True)
+        with self.assertNumQueries(1):
+            summary = summarize_cart(self.cart)
+        self.assertEqual(str(summary.total), "50.20")
+        self.assertEqual((summary.item_count, summary.line_count, summary.rx_required), (6, 3, True))
+        self.assertEqual(summary.items[0].line_subtotal, Decimal("25.00"))
+        self.assertEqual(self.cart.total_price(), summary.total)
+
+    def test_empty_cart(self):
+        summary = summarize_cart(self.cart)
+        self.assertEqual((summary.total, summary.item_count, summary.rx_required), (0, 0, False))
+
+    def test_view_cart(self):
+        self.assertListQueries("/shop/cart/", self.add_lines, 4)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.medicine = Medicine.objects.create(name="Paracetamol", pharmacy=self.pharmacist, price=Decimal("5.00"))
+        self.stock = Stock.objects.create(medicine=self.medicine, pharmacy=self.pharmacist, quantity=3)
+        self.first = self.make_customer("first")
+        self.second = self.make_customer("second")
+
+    def make_customer(self, username):
+        user = User.objects.create_user(username=username, password="pass", role="patient")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, medicine=self.medicine, quantity=2)
+        return user
+
+    def checkout(self):
+        return self.client.post(reverse("checkout"), {"payment_method": "cod", "delivery_address": "12 Main St"})
+
+    def test_hold_blocks_other_customers(self):
+        self.client.force_login(self.first)
+        self.assertRedirects(self.checkout(), reverse("payment_success"), fetch_redirect_response=False)
+
+        self.client.force_login(self.second)
+        self.assertRedirects(self.checkout(), reverse("view_cart"), fetch_redirect_response=False)
+        self.assertEqual(Stock.objects.with_available().get().available, 1)
+        self.assertEqual(Stock.objects.with_available(exclude_user=self.first).get().available, 3)
+        self.assertFalse(Stock.decrement({self.stock.id: 2}, user=self.second))
+        self.assertTrue(Stock.decrement({self.stock.id: 2}, user=self.first))
+
+    def test_viewing_checkout_does_not_hold_stock(self):
+        self.client.force_login(self.first)
+        self.assertEqual(self.client.get(reverse("checkout")).status_code, 200)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_short_cart_keeps_the_existing_holds(self):
+        self.client.force_login(self.first)
+        self.checkout()
+        hold = StockReservation.objects.get()
+
+        CartItem.objects.filter(cart__user=self.first).update(quantity=4)
+        self.assertRedirects(self.checkout(), reverse("view_cart"), fetch_redirect_response=False)
+        self.assertEqual(list(StockReservation.objects.values_list("id", "quantity", "expires_at")),
+                         [(hold.id, 2, hold.expires_at)])
+
+    def test_expired_holds_are_ignored_and_swept(self):
+        StockReservation.objects.create(
+            stock=self.stock, user=self.first, quantity=3, expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(Stock.objects.with_available().get().available, 3)
+        self.assertEqual(sweep_expired_holds(), 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class IdempotentPaymentTests(TestCase):
+    def setUp(self):
+        pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.patient = User.objects.create_user(username="patient", password="pass", role="patient")
+        medicine = Medicine.objects.create(name="Paracetamol", pharmacy=pharmacist, price=Decimal("5.00"))
+        self.stock = Stock.objects.create(medicine=medicine, pharmacy=pharmacist, quantity=10)
+        CartItem.objects.create(cart=Cart.objects.create(user=self.patient), medicine=medicine, quantity=2)
+        self.client.force_login(self.patient)
+
+    def test_repeated_payment_returns_the_same_order(self):
+        self.client.post(reverse("checkout"), {"payment_method": "cod", "delivery_address": "12 Main St"})
+        key = self.client.session["checkout_data"]["idempotency_key"]
+
+        first = self.client.get(reverse("payment_success"))
+        with self.assertNumQueries(5):  # session, user, order lookup + atomic savepoint pair
+            second = self.client.get(reverse("payment_success"))
+
+        self.assertEqual(first.context["order"].pk, second.context["order"].pk)
+        self.assertEqual(Order.objects.get().idempotency_key, key)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 8)
+        self.assertEqual(
+            list(DailySales.objects.values_list("order_count", "revenue", "item_count")), [(1, 10, 2)]
+        )
+
+    def test_resubmitted_checkout_keeps_its_key(self):
+        data = {"payment_method": "cod", "delivery_address": "12 Main St"}
+        self.client.post(reverse("checkout"), data)
+        key = self.client.session["checkout_data"]["idempotency_key"]
+        self.client.post(reverse("checkout"), data)
+        self.assertEqual(self.client.session["checkout_data"]["idempotency_key"], key)
+
+
+class MedicineQueryPlanTests(QueryPlanMixin, TestCase):
+    def test_medicine_list_filter(self):
+        pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.assertUsesIndex(
+            Medicine.objects.filter(pharmacy=pharmacist, is_active=True), "shop_medici_pharmac_e2482e_idx"
+        )
+
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(
+            username="pharma", password="pass", role="pharmacist", pharmacy_name="City Pharmacy"
+        )
+        other = User.objects.create_user(username="other", password="pass", role="pharmacist")
+        for owner, name in ((self.pharmacist, "Paracetamol"), (self.pharmacist, "Ibuprofen"), (other, "Aspirin")):
+            medicine = Medicine.objects.create(name=name, pharmacy=owner, price=Decimal("2.50"))
+            Stock.objects.create(medicine=medicine, pharmacy=owner, quantity=7)
+        self.client.force_login(self.pharmacist)
+
+    def download(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content), response
+
+    def test_csv_follows_related_paths_and_role_scope(self):
+        body, response = self.download(reverse("stock_export"))
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = body.decode().splitlines()
+        self.assertEqual(lines[0], "id,medicine__name,medicine__sku,pharmacy__pharmacy_name,quantity,low_stock_threshold")
+        self.assertEqual([line.split(",")[1] for line in lines[1:]], ["Paracetamol", "Ibuprofen"])
+        self.assertIn("City Pharmacy", lines[1])
+
+    def test_gzipped_jsonl(self):
+        body, response = self.download(reverse("medicine_export"), format="jsonl", gzip="1")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn('.jsonl.gz"', response["Content-Disposition"])
+        rows = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual([row["name"] for row in rows], ["Paracetamol", "Ibuprofen"])
+        self.assertEqual(rows[0]["price"], "2.50")
+
+    def test_patients_cannot_export_stock(self):
+        self.client.force_login(User.objects.create_user(username="pat", password="pass", role="patient"))
+        self.assertRedirects(self.client.get(reverse("stock_export")), reverse("stock_list"), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse("stock_export"), {"format": "xml"}).status_code, 302)
+
+
+class MedicineSearchTests(TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.tablet = Medicine.objects.create(name="Paracetamol", brand="Paracetamol", pharmacy=self.pharmacist)
+        self.syrup = Medicine.objects.create(name="Cough Syrup", brand="Paracetamol free formula", pharmacy=self.pharmacist)
+        Medicine.objects.create(name="Ibuprofen", pharmacy=self.pharmacist)
+
+    def search(self, query, queryset=None):
+        return list(search_medicines(Medicine.objects.all() if queryset is None else queryset, query))
+
+    def indexed_ids(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("FTS5 table exists on SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid FROM {FTS_TABLE}")
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_prefix_match_ranked_by_bm25(self):
+        results = self.search("para")
+        self.assertEqual(results, [self.tablet, self.syrup])
+        self.assertLess(results[0].search_rank, results[1].search_rank)
+        self.assertEqual(self.search("para syrup"), [self.syrup])
+        self.assertEqual(self.search("aspirin"), [])
+
+    def test_saved_medicine_is_reindexed(self):
+        self.tablet.name = "Acetaminophen"
+        self.tablet.brand = ""
+        self.tablet.save()
+        self.assertEqual(self.search("acetamin"), [self.tablet])
+        self.assertEqual(self.search("paracetamol"), [self.syrup])
+
+    def test_deleted_medicine_leaves_the_index(self):
+        tablet_id = self.tablet.pk
+        self.tablet.delete()
+        self.assertNotIn(tablet_id, self.indexed_ids())
+        self.assertEqual(self.search("paracetamol"), [self.syrup])
+
+    def test_is_active_toggle(self):
+        self.tablet.is_active = False
+        self.tablet.save()
+        # Still indexed for pharmacists/admins, who list inactive medicines too
+        self.assertIn(self.tablet.pk, self.indexed_ids())
+        self.assertEqual(self.search("paracetamol", Medicine.objects.filter(is_active=True)), [self.syrup])
+        self.tablet.is_active = True
+        self.tablet.save()
+        self.assertEqual(self.search("paracetamol", Medicine.objects.filter(is_active=True)), [self.tablet, self.syrup])
+
+
+class MedicineAutocompleteTests(TestCase):
+    def setUp(self):
+        medicine_index.invalidate()
+        self.approved = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        User.objects.filter(pk=self.approved.pk).update(approved=True)
+        self.pending = User.objects.create_user(username="newpharma", password="pass", role="pharmacist")
+        self.tablet = Medicine.objects.create(name="Paracetamol", brand="Calpol", pharmacy=self.approved)
+        Medicine.objects.create(name="Paracip", pharmacy=self.pending)
+        Medicine.objects.create(name="Panadol", pharmacy=self.approved, is_active=False)
+        self.client.force_login(User.objects.create_user(username="pat", password="pass", role="patient"))
+
+    def names(self, **params):
+        response = self.client.get(reverse("medicine_autocomplete"), params)
+        return [row["name"] for row in response.json()["results"]]
+
+    def test_prefix_and_typo_matches(self):
+        self.assertEqual(self.names(q="para"), ["Paracetamol"])
+        self.assertEqual(self.names(q="paracetmol"), ["Paracetamol"])
+        self.assertEqual(self.names(q="calp"), ["Paracetamol"])
+
+    def test_unapproved_pharmacies_are_hidden_until_approved(self):
+        self.assertNotIn("Paracip", self.names(q="para"))
+        self.client.force_login(User.objects.create_superuser(username="root", password="pass", email="r@x.com"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("pharmacy_approve_toggle", args=[self.pending.id]), {"action": "approve"})
+        self.assertEqual(sorted(self.names(q="para")), ["Paracetamol", "Paracip"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("pharmacy_approve_toggle", args=[self.pending.id]), {"action": "reject"})
+        self.assertEqual(self.names(q="para"), ["Paracetamol"])
+
+    def test_saving_into_a_hidden_state_drops_the_medicine(self):
+        self.assertEqual(self.names(q="para"), ["Paracetamol"])  # index built
+        self.tablet.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tablet.save()
+        self.assertEqual(self.names(q="para"), [])
+
+    def test_limit_is_clamped(self):
+        Medicine.objects.create(name="Paracetamol Forte", pharmacy=self.approved)
+        self.assertEqual(len(self.names(q="para", limit=0)), 1)
+        self.assertEqual(len(self.names(q="para", limit=-5)), 1)
+        self.assertEqual(len(self.names(q="para", limit=500)), 2)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        # Identical names tie on search_rank, so -id has to break the ties
+        for i in range(5):
+            Medicine.objects.create(name="Paracetamol", pharmacy=pharmacist)
+            Medicine.objects.create(name="Paracetamol Extra Strength", pharmacy=pharmacist)
+            Medicine.objects.create(name=f"Ibuprofen {i}", pharmacy=pharmacist)
+
+    def walk(self, queryset, ordering, page_size=4):
+        """Ids page by page following next cursors, then back again following previous cursors."""
+        factory = RequestFactory()
+        page = keyset_paginate(factory.get("/"), queryset, ordering, page_size)
+        self.assertFalse(page.has_previous)
+        forward = [[m.id for m in page]]
+        while page.has_next:
+            page = keyset_paginate(factory.get(f"/?{page.next_query}"), queryset, ordering, page_size)
+            forward.append([m.id for m in page])
+        backward = [[m.id for m in page]]
+        while page.has_previous:
+            page = keyset_paginate(factory.get(f"/?{page.previous_query}"), queryset, ordering, page_size)
+            backward.append([m.id for m in page])
+        return forward, backward[::-1]
+
+    def assertPagesCover(self, queryset, ordering):
+        expected = [m.id for m in queryset.order_by(*ordering)]
+        forward, backward = self.walk(queryset, ordering)
+        self.assertEqual(sum(forward, []), expected)  # no duplicates or gaps
+        self.assertEqual(backward, forward)           # previous pages are the same pages
+        self.assertTrue(all(len(page) == 4 for page in forward[:-1]))
+
+    def test_id_ordering(self):
+        self.assertPagesCover(Medicine.objects.all(), ("-id",))
+
+    def test_search_rank_ordering_with_ties(self):
+        results = search_medicines(Medicine.objects.all(), "paracetamol")
+        self.assertEqual(results.count(), 10)
+        self.assertPagesCover(results, ("search_rank", "-id"))
+
+    def test_malformed_cursor_starts_over(self):
+        page = keyset_paginate(RequestFactory().get("/?after=!!!"), Medicine.objects.all(), ("-id",), 4)
+        self.assertEqual([m.id for m in page], list(Medicine.objects.order_by("-id").values_list("id", flat=True)[:4]))
+
+
+class PaymentStockTests(TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.stocks = []
+        for i in range(4):
+            medicine = Medicine.objects.create(name=f"Medicine {i}", pharmacy=self.pharmacist, price=Decimal("3.00"))
+            self.stocks.append(Stock.objects.create(medicine=medicine, pharmacy=self.pharmacist, quantity=10))
+
+    def check_out(self, username, lines):
+        patient = User.objects.create_user(username=username, password="pass", role="patient")
+        cart = Cart.objects.create(user=patient)
+        for stock in self.stocks[:lines]:
+            CartItem.objects.create(cart=cart, medicine=stock.medicine, quantity=2)
+        self.client.force_login(patient)
+        self.client.post(reverse("checkout"), {"payment_method": "cod", "delivery_address": "12 Main St"})
+        return patient
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        # Warm-up: creates today's DailySales row and caches the content type
+        self.check_out("warmup", 1)
+        self.client.get(reverse("payment_success"))
+
+        for username, lines in (("one", 1), ("four", 4)):
+            self.check_out(username, lines)
+            with self.assertNumQueries(20):
+                self.client.get(reverse("payment_success"))
+        self.assertEqual(
+            list(Stock.objects.order_by("id").values_list("quantity", flat=True)), [4, 8, 8, 8]
+        )
+
+    def test_short_stock_rolls_back_the_whole_order(self):
+        self.check_out("pat", 2)
+        Stock.objects.filter(pk=self.stocks[1].pk).update(quantity=1)  # sold elsewhere meanwhile
+
+        response = self.client.get(reverse("payment_success"))
+
+        self.assertRedirects(response, reverse("view_cart"), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(list(Stock.objects.order_by("id").values_list("quantity", flat=True)[:2]), [10, 1])
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_conditional_decrement_never_goes_negative(self):
+        stock = self.stocks[0]
+        results = [Stock.decrement({stock.id: 4}) for _ in range(4)]
+        self.assertEqual(results, [True, True, False, False])
+        stock.refresh_from_db()
+        self.assertEqual(stock.quantity, 2)
+        self.assertFalse(Stock.decrement({stock.id: 3, self.stocks[1].id: 1}))
+        self.assertGreaterEqual(Stock.objects.get(pk=stock.pk).quantity, 0)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.pharmacist = User.objects.create_user(username="pharma", password="pass", role="pharmacist")
+        self.patient = User.objects.create_user(username="pat", password="pass", role="patient")
+        self.cart = Cart.objects.create(user=self.patient)
+        self.client.force_login(self.patient)
+
+    def medicines(self, count, quantity=5):
+        made = []
+        for _ in range(count):
+            medicine = Medicine.objects.create(name=f"Medicine {Medicine.objects.count()}", pharmacy=self.pharmacist)
+            Stock.objects.create(medicine=medicine, pharmacy=self.pharmacist, quantity=quantity)
+            made.append(medicine)
+        return made
+
+    def quantities(self):
+        return dict(CartItem.objects.values_list("medicine__name", "quantity"))
+
+    def test_add_multiple_query_count_is_independent_of_selection(self):
+        for size in (2, 6):
+            selected = self.medicines(size)
+            # half already in the cart (incremented), half new (inserted)
+            for medicine in selected[: size // 2]:
+                CartItem.objects.create(cart=self.cart, medicine=medicine, quantity=1)
+            with self.assertNumQueries(7):
+                self.client.post(reverse("add_multiple_to_cart"), {"selected_medicines": [m.id for m in selected]})
+            self.assertEqual({self.quantities()[m.name] for m in selected}, {1, 2})
+
+    def test_add_multiple_rejects_beyond_stock(self):
+        scarce, plenty = self.medicines(1, quantity=1) + self.medicines(1)
+        CartItem.objects.create(cart=self.cart, medicine=scarce, quantity=1)
+        response = self.client.post(reverse("add_multiple_to_cart"), {"selected_medicines": [scarce.id, plenty.id]})
+        self.assertEqual(self.quantities(), {scarce.name: 1, plenty.name: 1})
+        self.assertIn(f"Not enough stock for {scarce.name}.", [str(m) for m in response.wsgi_request._messages])
+
+    def test_update_cart_query_count_is_independent_of_line_count(self):
+        for size in (2, 6):
+            CartItem.objects.all().delete()
+            items = [CartItem.objects.create(cart=self.cart, medicine=m, quantity=1) for m in self.medicines(size)]
+            with self.assertNumQueries(5):
+                self.client.post(reverse("update_cart"), {f"quantity_{item.id}": 3 for item in items})
+            self.assertEqual(set(self.quantities().values()), {3})
+
+    def test_update_cart_caps_at_available_stock(self):
+        capped, fine = self.medicines(1, quantity=4) + self.medicines(1)
+        first = CartItem.objects.create(cart=self.cart, medicine=capped, quantity=1)
+        second = CartItem.objects.create(cart=self.cart, medicine=fine, quantity=1)
+        response = self.client.post(reverse("update_cart"), {f"quantity_{first.id}": 50, f"quantity_{second.id}": 2})
+        self.assertEqual(self.quantities(), {capped.name: 4, fine.name: 2})
+        self.assertIn(
+            f"Quantity limited to available stock for {capped.name}.",
+            [str(m) for m in response.wsgi_request._messages],
+        )
+
+    def test_update_cart_removes_sold_out_lines(self):
+        sold_out, fine = self.medicines(1, quantity=0) + self.medicines(1)
+        first = CartItem.objects.create(cart=self.cart, medicine=sold_out, quantity=2)
+        second = CartItem.objects.create(cart=self.cart, medicine=fine, quantity=1)
+        response = self.client.post(reverse("update_cart"), {f"quantity_{first.id}": 2, f"quantity_{second.id}": 3})
+        self.assertEqual(self.quantities(), {fine.name: 3})
+        self.assertIn(
+            f"Removed out-of-stock items from your cart: {sold_out.name}.",
+            [str(m) for m in response.wsgi_request._messages],
+        )
@@ -16,6 +16,8 @@ urlpatterns = [
 
     # Medicines
     path("medicines/", views.medicine_list, name="medicine_list"),
+    path("medicines/autocomplete/", views.medicine_autocomplete, name="medicine_autocomplete"),
+    path("medicines/export/", views.medicine_export, name="medicine_export"),
     path("medicines/create/", views.medicine_create, name="medicine_create"),
     path("medicines/<int:pk>/update/", views.medicine_update, name="medicine_update"),
     path("medicines/<int:pk>/", views.medicine_detail, name="medicine_detail"),
@@ -27,6 +29,7 @@ urlpatterns = [
     # Stocks
     path("stocks/", views.stock_list, name="stock_list"),
     path("stocks/create/", views.stock_create, name="stock_create"),
+    path("stocks/export/", views.stock_export, name="stock_export"),
     path("stocks/<int:pk>/", views.stock_detail, name="stock_detail"),
     path("stocks/<int:pk>/update/", views.stock_update, name="stock_update"),
     path("stocks/<int:pk>/delete/", views.stock_delete, name="stock_delete"),
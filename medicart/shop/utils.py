@@ -1,22 +1,233 @@
 # shop/utils.py
+import base64
+import binascii
 import csv
-from django.http import HttpResponse
+import datetime
+import json
+import zlib
 
-def export_as_csv(queryset, fields, filename="export.csv"):
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+# -------------------- STREAMING EXPORT --------------------
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+EXPORT_CHUNK_SIZE = 2000
+GZIP_FLUSH_BYTES = 64 * 1024
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream ``fields`` (paths like ``order__patient__username``) as tuples."""
+    return queryset.order_by("pk").values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def csv_lines(fields, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(fields, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def gzip_chunks(lines):
+    """Gzip a stream of text lines on the fly, yielding ~64 KB blocks."""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    pending = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= GZIP_FLUSH_BYTES:
+            block = compressor.compress(b"".join(pending))
+            pending, size = [], 0
+            if block:
+                yield block
+    yield compressor.compress(b"".join(pending)) + compressor.flush()
+
+
+def stream_export(queryset, fields, filename, fmt="csv", compress=False, chunk_size=EXPORT_CHUNK_SIZE):
     """
-    Generic CSV exporter.
-    queryset: Django queryset
-    fields: list of model fields to include
-    filename: downloaded file name
+    StreamingHttpResponse exporting ``fields`` of ``queryset`` as CSV or
+    JSON Lines, optionally gzipped. Rows are read with values_list() in
+    chunks, so memory use does not grow with the table.
     """
-    response = HttpResponse(content_type="text/csv")
+    content_type, extension = EXPORT_FORMATS[fmt]
+    rows = export_rows(queryset, fields, chunk_size)
+    lines = csv_lines(fields, rows) if fmt == "csv" else jsonl_lines(fields, rows)
+    filename = f"{filename}.{extension}"
+    if compress:
+        lines, content_type, filename = gzip_chunks(lines), "application/gzip", f"{filename}.gz"
+    response = StreamingHttpResponse(lines, content_type=content_type)
     response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
 
-    writer = csv.writer(response)
-    writer.writerow(fields)
 
-    for obj in queryset:
-        row = [getattr(obj, field) for field in fields]
-        writer.writerow(row)
+def export_response(request, queryset, fields, name):
+    """stream_export() driven by ``?format=csv|jsonl&gzip=1``."""
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown export format: {fmt}")
+    filename = f"{name}-{timezone.localdate():%Y%m%d}"
+    return stream_export(queryset, fields, filename, fmt, compress=request.GET.get("gzip") == "1")
 
-    return response
+
+def export_as_csv(queryset, fields, filename="export.csv"):
+    """Streaming CSV of ``fields`` (related paths allowed) for ``queryset``."""
+    return stream_export(queryset, fields, filename.removesuffix(".csv"))
+
+
+# -------------------- DATES --------------------
+def local_day_start(value, days=0):
+    """
+    Aware datetime for the start of a ``YYYY-MM-DD`` day (shifted by ``days``)
+    in the current time zone (TIME_ZONE), or None for a blank or invalid value.
+
+    Filtering ``created_at__gte=local_day_start(from)`` and ``created_at__lt=
+    local_day_start(to, days=1)`` compares the raw column, so an index on it is usable,
+    unlike ``created_at__date`` which wraps the column in a cast.
+    """
+    if isinstance(value, str):
+        try:
+            value = parse_date(value.strip())
+        except ValueError:
+            return None
+    if not value:
+        return None
+    day = value + datetime.timedelta(days=days)
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+# -------------------- KEYSET PAGINATION --------------------
+def _cursor_default(value):
+    # Full precision: DjangoJSONEncoder would cut datetimes to milliseconds.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=_cursor_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, model, fields):
+    """Turn a cursor back into typed values, or None if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != len(fields):
+        return None
+    typed = []
+    for name, value in zip(fields, values):
+        try:
+            value = model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            pass  # annotation such as search_rank: JSON type is good enough
+        except ValidationError:
+            return None
+        typed.append(value)
+    return typed
+
+
+def keyset_filter(ordering, values, forward=True):
+    """
+    Q selecting rows strictly after ``values`` in ``ordering``
+    (or strictly before them when ``forward`` is False).
+    """
+    condition = Q()
+    equal = Q()
+    for key, value in zip(ordering, values):
+        name = key.lstrip("-")
+        descending = key.startswith("-")
+        lookup = "lt" if descending == forward else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset, iterable like a list."""
+
+    def __init__(self, request, object_list, ordering, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.has_other_pages = has_next or has_previous
+        self._request = request
+        self._fields = [key.lstrip("-") for key in ordering]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def _cursor(self, obj):
+        return encode_cursor([getattr(obj, name) for name in self._fields])
+
+    def _query(self, param, obj):
+        query = self._request.GET.copy()
+        query.pop("after", None)
+        query.pop("before", None)
+        query[param] = self._cursor(obj)
+        return query.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query("after", self.object_list[-1]) if self.has_next else ""
+
+    @property
+    def previous_query(self):
+        return self._query("before", self.object_list[0]) if self.has_previous else ""
+
+
+def keyset_paginate(request, queryset, ordering=("-id",), page_size=None):
+    """
+    Paginate ``queryset`` by ``ordering`` using ``?after=`` / ``?before=`` cursors.
+
+    Each page is one ``LIMIT page_size + 1`` query seeking past the cursor,
+    so its cost does not grow with how deep the user has paged. The last
+    ordering key must be unique (``id``) to keep cursors stable.
+    """
+    page_size = page_size or getattr(settings, "LIST_PAGE_SIZE", 25)
+    fields = [key.lstrip("-") for key in ordering]
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+    cursor = decode_cursor(after or before or "", queryset.model, fields)
+
+    if cursor is not None and before and not after:
+        reverse = [key[1:] if key.startswith("-") else f"-{key}" for key in ordering]
+        rows = list(queryset.filter(keyset_filter(ordering, cursor, forward=False)).order_by(*reverse)[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        return KeysetPage(request, rows, ordering, has_next=True, has_previous=has_previous)
+
+    if cursor is not None:
+        queryset = queryset.filter(keyset_filter(ordering, cursor))
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    has_next = len(rows) > page_size
+    return KeysetPage(request, rows[:page_size], ordering, has_next=has_next, has_previous=cursor is not None)
@@ -1,22 +1,39 @@
 from django import forms
+from django.http import JsonResponse
 from django.shortcuts import render
 
 # Create your views here.
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from orders.models import Order, OrderItem
+from orders.sales import record_sale_items
 from prescriptions.models import Prescription
 from .models import *
 from .forms import *
+from .search import search_medicines
+from .utils import export_response, keyset_paginate
+from .autocomplete import medicine_index
+from .cart import get_cart_summary
+from .reservations import release_holds, reserve_cart
 from accounts.models import *
 from datetime import date, timedelta
 from decimal import Decimal
+import uuid
 from django.utils import timezone
-from django.db.models import ProtectedError, Q
-from geopy.exc import GeocoderTimedOut 
-from geopy.geocoders import Nominatim  #type: ignore
+from django.db.models import F, OuterRef, ProtectedError, Q, Subquery
+from accounts.geocoding import enqueue_geocode
+
+
+# Columns for the CSV/JSONL exports (related paths are followed in SQL)
+MEDICINE_EXPORT_FIELDS = (
+    "id", "name", "brand", "sku", "category__name", "pharmacy__pharmacy_name",
+    "price", "expiry_date", "prescription_required", "is_active",
+)
+STOCK_EXPORT_FIELDS = (
+    "id", "medicine__name", "medicine__sku", "pharmacy__pharmacy_name", "quantity", "low_stock_threshold",
+)
 
 
 # -------------------- PHARMACY --------------------
@@ -133,13 +150,12 @@ def medicine_list(request):
         'category', 'pharmacy'
     )
 
-    # 🔍 Search filter (all roles)
+    # 🔍 Search filter (all roles) — full-text index, best matches first
     if query:
-        medicines = medicines.filter(
-            Q(name__icontains=query) |
-            Q(brand__icontains=query) |
-            Q(sku__icontains=query)
-        )
+        medicines = search_medicines(medicines, query)
+        ordering = ("search_rank", "-id")
+    else:
+        ordering = ("-id",)
 
     # 🔐 Role-based filtering
     if request.user.role == "pharmacist":
@@ -180,7 +196,7 @@ def medicine_list(request):
         ).only("id", "pharmacy_name", "username")
 
     context = {
-        "medicines": medicines.order_by("-id"),
+        "medicines": keyset_paginate(request, medicines, ordering),
         "pharmacies": pharmacies,
         "query": query,
         "pharmacy_id": pharmacy_id,
@@ -189,6 +205,32 @@ def medicine_list(request):
     }
 
     return render(request, "medicine_list.html", context)
+
+@login_required
+def medicine_autocomplete(request):
+    """JSON suggestions for the search box, served from the in-memory index."""
+    query = request.GET.get("q", "").strip()
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 10)), 50))
+    except ValueError:
+        limit = 10
+    return JsonResponse({"query": query, "results": medicine_index.lookup(query, limit=limit)})
+
+
+@login_required
+def medicine_export(request):
+    """Stream the medicines the user can see as CSV/JSONL."""
+    user = request.user
+    if user.is_superuser or user.role == "admin":
+        medicines = Medicine.objects.all()
+    elif user.role == "pharmacist":
+        medicines = Medicine.objects.filter(pharmacy=user)
+    else:
+        medicines = Medicine.objects.filter(is_active=True, pharmacy__approved=True)
+
+    return export_response(request, medicines, MEDICINE_EXPORT_FIELDS, "medicines")
+
+
 @login_required
 def medicine_detail(request, pk):
     medicine = get_object_or_404(Medicine, pk=pk)
@@ -259,7 +301,25 @@ def stock_list(request):
     else:
         stocks = Stock.objects.none()
 
-    return render(request, "stock_list.html", {"stocks": stocks})
+    stocks = stocks.select_related("medicine", "pharmacy").only(
+        "id", "quantity", "low_stock_threshold", "medicine__name", "pharmacy__pharmacy_name",
+    )
+    return render(request, "stock_list.html", {"stocks": keyset_paginate(request, stocks)})
+
+
+@login_required
+def stock_export(request):
+    """Stream the user's stock as CSV/JSONL (``?format=jsonl&gzip=1``)."""
+    user = request.user
+    if user.role == "pharmacist":
+        stocks = Stock.objects.filter(pharmacy=user)
+    elif user.is_superuser:
+        stocks = Stock.objects.all()
+    else:
+        messages.error(request, "You are not allowed to export stock.")
+        return redirect("stock_list")
+
+    return export_response(request, stocks, STOCK_EXPORT_FIELDS, "stock")
 
 
 @login_required
@@ -320,18 +380,51 @@ def stock_delete(request, pk):
     return render(request, "stock_confirm_delete.html", {"stock": stock})
 
 # -------------------- CART & CHECKOUT --------------------
+def stock_quantity(medicine_ref, pharmacy_ref, user=None):
+    """
+    Subquery: units of a medicine its own pharmacy can still sell, i.e. stock
+    minus other customers' active holds (None = no stock row).
+    """
+    return Subquery(
+        Stock.objects.filter(medicine=OuterRef(medicine_ref), pharmacy=OuterRef(pharmacy_ref))
+        .with_available(exclude_user=user)
+        .values("available")[:1]
+    )
+
+
 @login_required
 def add_multiple_to_cart(request):
     if request.method == "POST":
-        selected_ids = request.POST.getlist("selected_medicines")
+        selected_ids = {int(med_id) for med_id in request.POST.getlist("selected_medicines") if med_id.isdigit()}
         if selected_ids:
             cart, _ = Cart.objects.get_or_create(user=request.user)
-            for med_id in selected_ids:
-                medicine = get_object_or_404(Medicine, id=med_id)
-                item, created = CartItem.objects.get_or_create(cart=cart, medicine=medicine)
-                if not created:
-                    item.quantity += 1
-                    item.save()
+
+            # One query: the selected medicines with their stock on hand
+            medicines = Medicine.objects.filter(id__in=selected_ids).annotate(
+                available=stock_quantity("pk", "pharmacy", request.user)
+            ).only("id", "name")
+            # One query: how many of each are already in the cart
+            in_cart = dict(
+                CartItem.objects.filter(cart=cart, medicine_id__in=selected_ids).values_list("medicine_id", "quantity")
+            )
+
+            new_items, increment_ids, out_of_stock = [], [], []
+            for medicine in medicines:
+                wanted = in_cart.get(medicine.id, 0) + 1
+                if (medicine.available or 0) < wanted:
+                    out_of_stock.append(medicine.name)
+                elif medicine.id in in_cart:
+                    increment_ids.append(medicine.id)
+                else:
+                    new_items.append(CartItem(cart=cart, medicine=medicine, quantity=1))
+
+            CartItem.objects.bulk_create(new_items)
+            if increment_ids:
+                CartItem.objects.filter(cart=cart, medicine_id__in=increment_ids).update(
+                    quantity=F("quantity") + 1
+                )
+            if out_of_stock:
+                messages.warning(request, f"Not enough stock for {', '.join(out_of_stock)}.")
         return redirect("view_cart")
     return redirect("medicine_list")
 
@@ -346,31 +439,53 @@ def remove_cart_item(request, item_id):
 def update_cart(request):
     if request.method == "POST":
         cart = get_user_cart(request.user)
-        for item in cart.items.all():
-            qty = request.POST.get(f"quantity_{item.id}")
-            if qty:
-                item.quantity = int(qty)
-                item.save()
+        items = cart.items.select_related("medicine").annotate(
+            available=stock_quantity("medicine", "medicine__pharmacy", request.user)
+        ).only("id", "cart", "quantity", "medicine__name")  # cart_id: the related manager reads it per row
+
+        changed, capped, sold_out = [], [], []
+        for item in items:
+            try:
+                qty = int(request.POST.get(f"quantity_{item.id}", ""))
+            except ValueError:
+                continue
+            if qty < 1:
+                continue
+            available = item.available or 0
+            if not available:
+                sold_out.append(item)
+                continue
+            if qty > available:
+                capped.append(item.medicine.name)
+                qty = available
+            if qty != item.quantity:
+                item.quantity = qty
+                changed.append(item)
+
+        CartItem.objects.bulk_update(changed, ["quantity"])
+        if sold_out:
+            # 🚫 Nothing left to buy: drop the line rather than keep an unbuyable quantity
+            CartItem.objects.filter(id__in=[item.id for item in sold_out]).delete()
+            names = ", ".join(item.medicine.name for item in sold_out)
+            messages.error(request, f"Removed out-of-stock items from your cart: {names}.")
+        if capped:
+            messages.warning(request, f"Quantity limited to available stock for {', '.join(capped)}.")
         messages.success(request, "Cart updated successfully.")
     return redirect("view_cart")
 
 
 @login_required
 def view_cart(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    return render(request, "cart.html", {"cart": cart})
+    summary = get_cart_summary(request)
+    return render(request, "cart.html", {"cart": summary.cart, "summary": summary})
 
 @login_required
 def checkout(request):
-    cart = get_user_cart(request.user)
-
-    # ✅ STEP 1: Check if cart has prescription-required medicines
-    rx_items = cart.items.filter(
-        medicine__prescription_required=True
-    )
+    summary = get_cart_summary(request)
+    prescription = None
 
-    # ✅ STEP 2: If patient + Rx items → require VERIFIED prescription
-    if rx_items.exists() and request.user.role == "patient":
+    # ✅ STEP 1 + 2: If patient + Rx items in cart → require VERIFIED prescription
+    if summary.rx_required and request.user.role == "patient":
         prescription = Prescription.objects.filter(
             patient=request.user,
             verified=True,
@@ -388,21 +503,35 @@ def checkout(request):
     # Continue checkout normally
     # -----------------------------------------
     if request.method == "POST":
+        # 🔒 Hold the cart's stock for STOCK_HOLD_TTL while the customer pays
+        short = reserve_cart(request.user, summary)
+        if short:
+            messages.error(request, f"Not enough stock for: {', '.join(short)}")
+            return redirect("view_cart")
+
         payment_method = request.POST.get("payment_method")
         delivery_address = request.POST.get("delivery_address")
 
         medicines_data = [
             {
-                "id": item.medicine.id,
+                "id": item.medicine_id,
                 "quantity": item.quantity,
             }
-            for item in cart.items.all()
+            for item in summary
         ]
 
 
 
 
+        # 🔑 One key per checkout attempt; a re-submitted form keeps the
+        # key as long as it has not produced an order yet
+        previous = request.session.get('checkout_data') or {}
+        idempotency_key = previous.get("idempotency_key")
+        if not idempotency_key or Order.objects.filter(idempotency_key=idempotency_key).exists():
+            idempotency_key = uuid.uuid4().hex
+
         request.session['checkout_data'] = {
+            "idempotency_key": idempotency_key,
             "medicines": medicines_data,
             "delivery_address": delivery_address,
             "payment_method": payment_method,
@@ -411,7 +540,7 @@ def checkout(request):
 
         return redirect("payment_success")
 
-    return render(request, "checkout.html", {"cart": cart})
+    return render(request, "checkout.html", {"cart": summary.cart, "summary": summary})
 
 
 def get_user_cart(user):
@@ -426,6 +555,13 @@ def payment_success(request):
         messages.error(request, "No checkout data found.")
         return redirect("medicine_list")
 
+    # 🔑 Retry / refresh of a checkout that already produced an order
+    idempotency_key = checkout_data.get('idempotency_key')
+    if idempotency_key:
+        order = Order.objects.filter(idempotency_key=idempotency_key, patient=request.user).first()
+        if order:
+            return render(request, "payment_success.html", {"order": order})
+
     prescription = None
     if checkout_data.get('prescription_id'):
         prescription = Prescription.objects.filter(id=checkout_data['prescription_id']).first()
@@ -441,75 +577,85 @@ def payment_success(request):
             used=False
         ).first()
 
-     # 🟢 Determine pharmacy from first medicine
-    first_medicine = get_object_or_404(Medicine, id=checkout_data['medicines'][0]['id'])
-    pharmacy = first_medicine.pharmacy
-    
-    # ✅ Create Order
-    order = Order.objects.create(
-        patient=request.user,
-        prescription=prescription,
-        pharmacy=pharmacy,
-        delivery_address=delivery_address,
-        status='pending',
-        payment_status='paid'
-    )
-
-    # ✅ Try geocoding the delivery address
-    try:
-        geolocator = Nominatim(user_agent="pharmacy_app")
-        location = geolocator.geocode(delivery_address, timeout=10)
-        if location:
-            order.latitude = location.latitude
-            order.longitude = location.longitude
-            order.save(update_fields=["latitude", "longitude"])
-    except GeocoderTimedOut:
-        print("⚠️ Geocoding timed out; skipping coordinate assignment.")
-
-    total_amount = Decimal("0.00")
-
+    # 🟢 One query for every medicine in the cart (duplicate lines merged)
+    quantities = {}
     for med in checkout_data['medicines']:
-        medicine = get_object_or_404(Medicine, id=med['id'])
-        qty = med.get('quantity', 1)
+        med_id = int(med['id'])
+        quantities[med_id] = quantities.get(med_id, 0) + int(med.get('quantity', 1))
+    medicines = Medicine.objects.in_bulk(list(quantities))
+    if len(medicines) != len(quantities):
+        messages.error(request, "Some medicines in your cart are no longer available.")
+        return redirect("view_cart")
 
-        # ✅ Reduce stock
-        try:
-            stock = Stock.objects.get(medicine=medicine, pharmacy=medicine.pharmacy)
-            if stock.quantity >= qty:
-                stock.quantity -= qty
-                stock.save()
-            else:
-                transaction.set_rollback(True)
-                messages.error(request, f"Not enough stock for {medicine.name}.")
-                return redirect("view_cart")
-        except Stock.DoesNotExist:
-            transaction.set_rollback(True)
+    # 🟢 One query for the matching stock rows
+    stocks = {
+        stock.medicine_id: stock
+        for stock in Stock.objects.filter(medicine_id__in=list(quantities)).only("id", "medicine_id", "pharmacy_id")
+        if stock.pharmacy_id == medicines[stock.medicine_id].pharmacy_id
+    }
+    for med_id, medicine in medicines.items():
+        if med_id not in stocks:
             messages.error(request, f"No stock available for {medicine.name}.")
             return redirect("view_cart")
 
-        # ✅ Create order item
-        OrderItem.objects.create(
+    # 🟢 Determine pharmacy from first medicine
+    first_id = int(checkout_data['medicines'][0]['id'])
+    total_amount = sum(
+        (qty * medicines[med_id].price for med_id, qty in quantities.items()), Decimal("0.00")
+    )
+
+    # ✅ Create Order first: its unique idempotency key makes a concurrent
+    # duplicate wait here and then fail, instead of touching stock twice
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(
+                patient=request.user,
+                prescription=prescription,
+                pharmacy_id=medicines[first_id].pharmacy_id,
+                delivery_address=delivery_address,
+                status='pending',
+                payment_status='paid',
+                total_amount=total_amount,
+                idempotency_key=idempotency_key,
+            )
+    except IntegrityError:
+        order = get_object_or_404(Order, idempotency_key=idempotency_key, patient=request.user)
+        return render(request, "payment_success.html", {"order": order})
+
+    # ✅ Reduce stock: a single conditional UPDATE, safe under concurrent checkouts
+    if not Stock.decrement({stocks[med_id].id: qty for med_id, qty in quantities.items()}, user=request.user):
+        short = Stock.objects.filter(
+            id__in=[stock.id for stock in stocks.values()]
+        ).values_list("medicine_id", "quantity")
+        names = [medicines[med_id].name for med_id, qty in short if qty < quantities[med_id]]
+        transaction.set_rollback(True)
+        messages.error(request, f"Not enough stock for {', '.join(names) or 'some items'}.")
+        return redirect("view_cart")
+
+    # ✅ Geocode the delivery address in the background (geocode_worker)
+    enqueue_geocode(order, delivery_address)
+
+    # ✅ Create order items in one INSERT
+    OrderItem.objects.bulk_create([
+        OrderItem(
             order=order,
-            medicine=medicine,
-            pharmacy=medicine.pharmacy,
+            medicine=medicines[med_id],
+            pharmacy_id=medicines[med_id].pharmacy_id,
             quantity=qty,
-            price=medicine.price
+            price=medicines[med_id].price,
         )
-
-        total_amount += qty * medicine.price
-
-    order.total_amount = total_amount
-    order.save()
+        for med_id, qty in quantities.items()
+    ])
+    record_sale_items(order, sum(quantities.values()))
 
     if prescription:
         prescription.used = True
         prescription.save(update_fields=["used"])
 
-    # ✅ Clear cart
-    cart = get_user_cart(request.user)
-    cart.items.all().delete()
+    # ✅ Clear cart; the stock holds have become real decrements
+    CartItem.objects.filter(cart__user=request.user).delete()
+    release_holds(request.user)
 
-    # ✅ Clear session
-    request.session.pop('checkout_data', None)
+    # ✅ Session keeps checkout_data so a refresh is answered from the key above
 
     return render(request, "payment_success.html", {"order": order})
\ No newline at end of file